@@ -0,0 +1,68 @@
+"""Memory per Entity singleton, including its entry in the registry
+
+    python -m benchmarks.bench_entity_memory --entities 1000000
+
+"before" reproduces the previous layout: a __dict__ with all fields,
+an eagerly created _WikidataAttributes and a registry keyed by id strings.
+"""
+import argparse
+import gc
+import tracemalloc
+
+from pywikidata import Entity
+from pywikidata.attributes import _WikidataAttributes
+
+
+class LegacyEntity:
+    """entity layout before __slots__, only the memory relevant part"""
+
+    _instances = {}
+
+    def __new__(cls, entity_identifier):
+        obj = cls._instances.get(entity_identifier)
+        if obj is None:
+            obj = cls._instances[entity_identifier] = super().__new__(cls)
+        return obj
+
+    def __init__(self, entity_identifier):
+        if not hasattr(self, "idx"):
+            self.idx = entity_identifier
+            self._label = None
+            self._description = None
+            self._image = None
+            self._forward_one_hop_neighbours = None
+            self._backward_one_hop_neighbours = None
+            self._instance_of = None
+            self._subclass_of = None
+            self.is_property = self.idx[0] == "P"
+            self.attributes = _WikidataAttributes(self.idx)
+            self._aliases = None
+            self._hydrated = False
+
+
+def bytes_per_entity(factory, numbers) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for number in numbers:
+        # like ids parsed from responses, every id is a new string
+        factory(f"Q{number}")
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(numbers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    numbers = range(1_000_000_000, 1_000_000_000 + args.entities)
+    print(f"{'layout':>8} {'entities':>9} {'bytes per entity':>17}")
+    for name, factory in (("before", LegacyEntity), ("after", Entity)):
+        size = bytes_per_entity(factory, numbers)
+        print(f"{name:>8} {args.entities:>9} {size:17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Per-entity latency of loading all scalar fields with every hydration source
+
+    python -m benchmarks.bench_hydration --entities 20 --latency 50
+    python -m benchmarks.bench_hydration --live Q90 Q64 Q1055
+
+By default requests go to a local stand-in of the SPARQL endpoint and
+Special:EntityData which answers after --latency milliseconds, so the numbers
+show the cost of round trips. With --live real Wikidata is requested.
+Every source starts with an empty query cache and unloaded entities.
+"""
+import argparse
+import os
+import time
+
+from .mock_server import FIELDS, MockWikidataServer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=50, help="milliseconds")
+    parser.add_argument("--live", nargs="*", help="ids of real entities")
+    args = parser.parse_args(argv)
+
+    if args.live is None:
+        server = MockWikidataServer(latency=args.latency / 1000).start()
+        os.environ["SPARQL_ENDPOINT"] = server.sparql_endpoint
+        os.environ["WIKIDATA_URI"] = server.url
+
+    # endpoints are read from the environment on import
+    from pywikidata import Entity
+    from pywikidata.cache import MemoryQueryCache, set_cache
+    from pywikidata.executor import configure_executor
+
+    configure_executor(requests_per_second=0)
+    print(f"{'source':>12} {'entities':>9} {'ms per entity':>14}")
+    ids = args.live or [f"Q{990000 + i}" for i in range(args.entities)]
+    for source in Entity.HYDRATION_SOURCES:
+        set_cache(MemoryQueryCache())
+        Entity.configure_hydration(source)
+
+        entities = [Entity(idx) for idx in ids]
+        for entity in entities:
+            # entities are shared by all sources, drop what the previous one loaded
+            for field in FIELDS:
+                setattr(entity, f"_{field}", None)
+            entity._hydrated = False
+            entity.attributes._attributes = None
+
+        started_at = time.perf_counter()
+        for entity in entities:
+            for field in FIELDS:
+                getattr(entity, field)
+        seconds = time.perf_counter() - started_at
+        print(f"{source:>12} {len(ids):>9} {seconds / len(ids) * 1000:14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Time of `import pywikidata` in a fresh interpreter and its side effects
+
+    python -m benchmarks.bench_import --runs 20
+
+Every run is a new process in an empty working directory, the median
+of -X importtime totals is reported together with the slowest imported
+modules, heavy modules loaded by the import and files it created.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("requests", "urllib3", "asyncio", "aiohttp", "multiprocessing")
+CHECK = (
+    "import sys, pywikidata; "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def run_import(directory: str):
+    """run_import - (module -> cumulative microseconds, heavy modules) of one import"""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHECK],
+        cwd=directory,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative)
+    return times, [m for m in completed.stdout.strip().split(",") if m]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    totals, modules = [], {}
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(args.runs):
+            times, heavy = run_import(directory)
+            totals.append(times["pywikidata"] / 1000)
+            for module, microseconds in times.items():
+                if module.startswith("pywikidata"):
+                    modules.setdefault(module, []).append(microseconds / 1000)
+        created = sorted(os.listdir(directory))
+
+    print(f"import pywikidata: {statistics.median(totals):.1f} ms median")
+    slowest = sorted(modules.items(), key=lambda item: -statistics.median(item[1]))
+    for module, times in slowest[: args.top]:
+        print(f"{module:>28} {statistics.median(times):8.1f} ms")
+    print(f"heavy modules imported: {', '.join(heavy) or 'none'}")
+    print(f"files created: {', '.join(created) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
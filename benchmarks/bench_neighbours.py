@@ -0,0 +1,92 @@
+"""Scaling of one-hop neighbour post-processing on large SPARQL bindings
+
+    python -m benchmarks.bench_neighbours --sizes 1000 10000 100000
+
+Bindings imitate a hub entity: every neighbour has a few instance_of values
+and a part of the rows are duplicates. Every implementation gets its own
+entity ids, so none of them reuses singletons created by another.
+The quadratic list-based implementation is run as a reference
+only up to --reference-limit rows.
+"""
+import argparse
+import random
+import time
+
+from pywikidata import Entity
+
+ENTITY_URI = "http://www.wikidata.org/entity/"
+PROPERTY_URI = "http://www.wikidata.org/prop/direct/"
+
+
+def make_bindings(size: int, offset: int = 0, seed: int = 0) -> list:
+    """make_bindings - synthetic bindings, offset keeps entities of runs apart"""
+    rng = random.Random(seed)
+    bindings = []
+    for _ in range(size):
+        bindings.append(
+            {
+                "property": {"value": f"{PROPERTY_URI}P{rng.randint(1, 50)}"},
+                "object": {
+                    "value": f"{ENTITY_URI}Q{offset + rng.randint(1, size // 2)}"
+                },
+                "instance_of": {"value": f"{ENTITY_URI}Q{rng.randint(1, 20)}"},
+            }
+        )
+    return bindings
+
+
+def reference(responce):
+    """list-based implementation used before, O(n^2) in number of rows"""
+    _one_hop_neighbours = []
+    for r in responce:
+        try:
+            property = Entity(r["property"]["value"])
+            neighbor = Entity(r["object"]["value"])
+        except ValueError:
+            continue
+
+        try:
+            neighbor_instance_of = Entity(r["instance_of"]["value"])
+            if neighbor._instance_of is None:
+                neighbor._instance_of = []
+            if neighbor_instance_of not in neighbor._instance_of:
+                neighbor._instance_of.append(neighbor_instance_of)
+        except ValueError:
+            continue
+
+        if (property, neighbor) not in _one_hop_neighbours:
+            _one_hop_neighbours.append((property, neighbor))
+    return _one_hop_neighbours
+
+
+def timed(function, *args) -> float:
+    started_at = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started_at
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--reference-limit", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>8} {'reference, s':>13} {'entities, s':>12} {'columns, s':>11}")
+    offset = 10**8
+    for size in args.sizes:
+        reference_time = f"{'-':>13}"
+        if size <= args.reference_limit:
+            reference_time = f"{timed(reference, make_bindings(size, offset)):13.3f}"
+        objects_time = timed(
+            Entity._process_one_hop_neighbours_with_instance_of,
+            make_bindings(size, 2 * offset),
+        )
+        columns_time = timed(
+            Entity._process_one_hop_neighbour_columns, make_bindings(size, 3 * offset)
+        )
+        offset *= 10
+        print(f"{size:>8} {reference_time} {objects_time:12.3f} {columns_time:11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Local stand-in of the Wikidata SPARQL endpoint, Special:EntityData and wbgetentities
+
+    python -m benchmarks.mock_server --port 8000 --latency 50 --throttle-every 10
+
+Recorded responses are replayed when a recordings file is given:
+    {"sparql": {"<query>": [bindings]}, "entities": {"Q90": {entity JSON}}}
+Queries are matched with whitespace collapsed. Other requests get synthetic
+answers shaped after the query: one row per VALUES entity for batch queries,
+--rows neighbours for neighbour queries, one row otherwise.
+
+Point pywikidata to it before importing it:
+    SPARQL_ENDPOINT=http://127.0.0.1:8000/sparql WIKIDATA_URI=http://127.0.0.1:8000/
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ENTITY_URI = "http://www.wikidata.org/entity/"
+PROPERTY_URI = "http://www.wikidata.org/prop/direct/"
+FIELDS = ("label", "description", "image", "aliases", "instance_of", "subclass_of")
+
+_SELECT = re.compile(r"SELECT\s+(?:DISTINCT\s+)?((?:\?\w+\s*)+)", re.IGNORECASE)
+_VALUES = re.compile(r"VALUES\s+\?entity\s*\{([^}]*)\}")
+_ENTITY_IDS = re.compile(r"\b[QPL][0-9]+\b")
+_ENTITY_VARIABLES = ("entity", "item", "object", "instance_of", "subclass_of", "class")
+
+
+def _normalize(query: str) -> str:
+    return " ".join(query.split())
+
+
+def _sparql_value(variable: str, rng=None) -> dict:
+    if variable in _ENTITY_VARIABLES:
+        top = 50 if variable == "instance_of" else 10**6
+        idx = "Q5" if rng is None else f"Q{rng.randrange(1, top)}"
+        return {"type": "uri", "value": ENTITY_URI + idx}
+    if variable == "property":
+        idx = "P31" if rng is None else f"P{rng.randrange(1, 300)}"
+        return {"type": "uri", "value": PROPERTY_URI + idx}
+    if variable == "image":
+        return {"type": "uri", "value": "http://commons.wikimedia.org/a.jpg"}
+    return {"type": "literal", "xml:lang": "en", "value": variable}
+
+
+def entity_data(idx: str) -> dict:
+    """entity_data - synthetic entity JSON with a label, an alias, P31 and P279"""
+    statement = {
+        "mainsnak": {
+            "snaktype": "value",
+            "datavalue": {"type": "wikibase-entityid", "value": {"id": "Q5"}},
+        },
+        "rank": "normal",
+    }
+    return {
+        "id": idx,
+        "labels": {"en": {"language": "en", "value": "label"}},
+        "descriptions": {"en": {"language": "en", "value": "description"}},
+        "aliases": {"en": [{"language": "en", "value": "alias"}]},
+        "claims": {"P31": [statement], "P279": [statement]},
+    }
+
+
+def sparql_bindings(query: str, rows: int = 100) -> list:
+    """sparql_bindings - synthetic bindings in the shape query asks for"""
+    if "?field" in query:
+        return [{"field": {"value": f}, "value": _sparql_value(f)} for f in FIELDS]
+
+    select = _SELECT.search(query)
+    variables = select[1].replace("?", " ").split() if select else ["value"]
+    values = _VALUES.search(query)
+    if values is not None:
+        return [
+            dict(
+                {v: _sparql_value(v) for v in variables},
+                entity={"type": "uri", "value": ENTITY_URI + idx},
+            )
+            for idx in _ENTITY_IDS.findall(values[1])
+        ]
+    if "property" in variables and "object" in variables:
+        # a hub: many neighbours, a few instance_of values and some duplicates
+        rng = random.Random(zlib.crc32(query.encode("utf-8")))
+        bindings = []
+        for _ in range(rows):
+            if bindings and rng.random() < 0.1:
+                bindings.append(rng.choice(bindings))
+                continue
+            bindings.append({v: _sparql_value(v, rng) for v in variables})
+        return bindings
+    return [{v: _sparql_value(v) for v in variables}]
+
+
+class MockWikidataServer:
+    """MockWikidataServer - threaded HTTP server answering like Wikidata
+
+    Args:
+        latency: float - seconds before every answer
+        throttle_every: int - every n-th request gets HTTP 429, 0 for never
+        rows: int - number of bindings of neighbour queries
+        recordings: str - JSON file with recorded responses, see module docstring
+        port: int - port to listen on, 0 for any free one
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        throttle_every: int = 0,
+        rows: int = 100,
+        recordings: str = None,
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.rows = rows
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self.sparql, self.entities = {}, {}
+        if recordings is not None:
+            with open(recordings) as f:
+                recorded = json.load(f)
+            self.sparql = {
+                _normalize(query): bindings
+                for query, bindings in recorded.get("sparql", {}).items()
+            }
+            self.entities = recorded.get("entities", {})
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/"
+
+    @property
+    def sparql_endpoint(self) -> str:
+        return self.url + "sparql"
+
+    def _throttle(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self.throttle_every and self.requests % self.throttle_every == 0:
+                self.throttled += 1
+                return True
+            return False
+
+    def _entity(self, idx: str) -> dict:
+        return self.entities.get(idx) or entity_data(idx)
+
+    def respond(self, path: str):
+        """respond - (status, payload) of GET path"""
+        if self._throttle():
+            return 429, None
+        url = urlparse(path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if url.path.startswith("/wiki/Special:EntityData/"):
+            idx = url.path.rsplit("/", 1)[-1][: -len(".json")]
+            return 200, {"entities": {idx: self._entity(idx)}}
+        if url.path == "/w/api.php" and params.get("action") == "wbgetentities":
+            ids = params["ids"].split("|")
+            return 200, {"entities": {idx: self._entity(idx) for idx in ids}}
+        if url.path == "/w/api.php" and params.get("action") == "wbsearchentities":
+            return 200, {"success": 1, "search": [{"id": "Q5"}]}
+        if "query" in params:
+            bindings = self.sparql.get(_normalize(params["query"]))
+            if bindings is None:
+                bindings = sparql_bindings(params["query"], self.rows)
+            return 200, {"results": {"bindings": bindings}}
+        return 404, {"error": f"Unknown request {path}"}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(server.latency)
+                status, payload = server.respond(self.path)
+                body = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "MockWikidataServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds")
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--recordings")
+    args = parser.parse_args(argv)
+
+    server = MockWikidataServer(
+        args.latency / 1000, args.throttle_every, args.rows, args.recordings, args.port
+    )
+    print(f"Serving on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""Reproducible benchmark suite against a local stand-in of Wikidata
+
+    python -m benchmarks.suite --save-baseline
+    python -m benchmarks.suite --latency 20 --throttle-every 50
+    python -m benchmarks.suite --only bulk_fetch concurrent_access --tolerance 0.1
+
+Network cases talk to benchmarks.mock_server, so results depend only on
+the code and the machine. Every case is run --repeat times for timing
+(the best run is kept) and once more under tracemalloc for peak memory,
+every run on entities not created before.
+Results are compared with the stored baseline: a case regresses when its
+throughput drops or its peak memory grows by more than --tolerance,
+then the exit status is 1. Save the baseline on the main branch and
+compare a change against it on the same machine.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from .mock_server import MockWikidataServer
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+CASES = {}
+
+
+def case(name: str):
+    """case - register fn(args, offset) -> (ops, latencies in seconds) as a case"""
+
+    def decorator(fn):
+        CASES[name] = fn
+        return fn
+
+    return decorator
+
+
+def _ids(args, offset: int, count: int) -> list:
+    # every run and every case gets its own ids, singletons are never reused
+    return [f"Q{args.first_id + offset + i}" for i in range(count)]
+
+
+@case("entity_construction")
+def entity_construction(args, offset):
+    from pywikidata import Entity
+
+    ids = _ids(args, offset, args.entities)
+    for idx in ids:
+        Entity(idx)
+    for idx in ids:
+        Entity(idx)
+    return 2 * len(ids), []
+
+
+@case("neighbour_processing")
+def neighbour_processing(args, offset):
+    from pywikidata import Entity
+
+    from .bench_neighbours import make_bindings
+
+    bindings = make_bindings(args.rows, offset=args.first_id + offset)
+    Entity._process_one_hop_neighbours_with_instance_of(bindings)
+    return len(bindings), []
+
+
+def _cache_lookups(args, offset, cache):
+    from pywikidata.cache import set_cache
+    from pywikidata.utils import request_to_wikidata
+
+    set_cache(cache)
+    queries = [
+        f"SELECT ?label WHERE {{ wd:{idx} ?p ?label }}"
+        for idx in _ids(args, offset, args.lookups)
+    ]
+    cache.put_many(
+        {request_to_wikidata.key(q): [{"label": {"value": q}}] for q in queries}
+    )
+    latencies = []
+    for query in queries:
+        started_at = time.perf_counter()
+        request_to_wikidata(query)
+        latencies.append(time.perf_counter() - started_at)
+    return len(queries), latencies
+
+
+@case("cache_lookup_memory")
+def cache_lookup_memory(args, offset):
+    from pywikidata.cache import MemoryQueryCache
+
+    return _cache_lookups(args, offset, MemoryQueryCache())
+
+
+@case("cache_lookup_sqlite")
+def cache_lookup_sqlite(args, offset):
+    from pywikidata.cache import SQLiteQueryCache
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = SQLiteQueryCache(Path(directory) / "cache.sqlite")
+        try:
+            return _cache_lookups(args, offset, cache)
+        finally:
+            cache.close()
+
+
+@case("bulk_fetch")
+def bulk_fetch(args, offset):
+    from pywikidata import Entity
+
+    entities = Entity.prefetch(
+        _ids(args, offset, args.bulk), fields=["label", "instance_of"], chunk_size=50
+    )
+    Entity.load_attributes(entities)
+    return len(entities), []
+
+
+@case("concurrent_access")
+def concurrent_access(args, offset):
+    from pywikidata import Entity
+
+    # every thread reads its own entities and a hot set shared by all threads
+    hot = _ids(args, offset, args.threads)
+    own = _ids(args, offset + args.threads, args.threads * args.reads)
+    latencies, lock = [], threading.Lock()
+
+    def read(number):
+        ids = hot + own[number * args.reads : (number + 1) * args.reads]
+        for idx in ids:
+            started_at = time.perf_counter()
+            Entity(idx).label
+            with lock:
+                latencies.append(time.perf_counter() - started_at)
+
+    threads = [threading.Thread(target=read, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies), latencies
+
+
+def _percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(name: str, args, server, offset: int) -> dict:
+    """measure - throughput, latency, peak memory and requests of one case"""
+    from pywikidata.cache import MemoryQueryCache, set_cache
+
+    best = None
+    requests, throttled = server.requests, server.throttled
+    for _ in range(args.repeat):
+        set_cache(MemoryQueryCache())
+        gc.collect()
+        started_at = time.perf_counter()
+        ops, latencies = CASES[name](args, offset)
+        seconds = time.perf_counter() - started_at
+        offset += args.id_stride
+        if best is None or seconds < best[0]:
+            best = (seconds, ops, latencies)
+    requests = (server.requests - requests) // args.repeat
+    throttled = (server.throttled - throttled) // args.repeat
+
+    set_cache(MemoryQueryCache())
+    tracemalloc.start()
+    CASES[name](args, offset)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    seconds, ops, latencies = best
+    result = {
+        "ops": ops,
+        "seconds": seconds,
+        "ops_per_second": ops / seconds,
+        "peak_kib": peak / 1024,
+        "requests": requests,
+        "throttled": throttled,
+    }
+    if latencies:
+        result["p50_ms"] = _percentile(latencies, 0.5) * 1000
+        result["p95_ms"] = _percentile(latencies, 0.95) * 1000
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """compare - messages about cases worse than baseline by more than tolerance"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["ops_per_second"] < base["ops_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['ops_per_second']:.0f} ops/s, "
+                f"baseline {base['ops_per_second']:.0f}"
+            )
+        if result["peak_kib"] > base["peak_kib"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak {result['peak_kib']:.0f} KiB, "
+                f"baseline {base['peak_kib']:.0f}"
+            )
+    return regressions
+
+
+def _print(results: dict, baseline: dict):
+    print(
+        f"{'case':>22} {'ops/s':>11} {'vs base':>8} {'p50 ms':>8} {'p95 ms':>8}"
+        f" {'peak KiB':>9} {'requests':>8} {'429':>5}"
+    )
+    for name, r in results.items():
+        base = baseline.get(name)
+        change = (
+            f"{r['ops_per_second'] / base['ops_per_second'] - 1:+8.0%}"
+            if base
+            else f"{'-':>8}"
+        )
+        p50 = f"{r['p50_ms']:8.2f}" if "p50_ms" in r else f"{'-':>8}"
+        p95 = f"{r['p95_ms']:8.2f}" if "p95_ms" in r else f"{'-':>8}"
+        print(
+            f"{name:>22} {r['ops_per_second']:11.0f} {change} {p50} {p95}"
+            f" {r['peak_kib']:9.0f} {r['requests']:8} {r['throttled']:5}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), metavar="CASE")
+    parser.add_argument("--latency", type=float, default=5, help="milliseconds")
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--recordings", help="JSON file of recorded responses")
+    parser.add_argument("--entities", type=int, default=100_000)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=5_000)
+    parser.add_argument("--bulk", type=int, default=1_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--reads", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args(argv)
+    args.first_id = 10**9
+    args.id_stride = 10 * max(args.entities, args.rows, args.lookups, args.bulk)
+
+    server = MockWikidataServer(
+        latency=args.latency / 1000,
+        throttle_every=args.throttle_every,
+        rows=args.rows,
+        recordings=args.recordings,
+    ).start()
+    os.environ["SPARQL_ENDPOINT"] = server.sparql_endpoint
+    os.environ["WIKIDATA_URI"] = server.url
+
+    # endpoints are read from the environment on import
+    from pywikidata.executor import configure_executor
+
+    configure_executor(requests_per_second=0)
+    # injected 429 responses are expected, do not print a warning for each
+    logging.getLogger("main").setLevel(logging.ERROR)
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+
+    results = {}
+    for number, name in enumerate(args.only or CASES):
+        offset = number * (args.repeat + 1) * args.id_stride
+        results[name] = measure(name, args, server, offset)
+    server.stop()
+
+    _print(results, baseline)
+    report = {
+        "python": sys.version.split()[0],
+        "latency_ms": args.latency,
+        "throttle_every": args.throttle_every,
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,2 @@
+from .config import configure
 from .entity import Entity
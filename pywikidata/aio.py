@@ -0,0 +1,562 @@
+import asyncio
+import time
+import weakref
+
+from . import config
+from .config import SPARQL_PAGE_SIZE, SPARQL_VALUES_CHUNK_SIZE
+from .backends import get_endpoint_pool
+from .cache import get_cache
+from .labels import get_label_index
+from .entity import _NEIGHBOUR_ORDER, Entity, _answered_locally, _unshared
+from .executor import get_rate_limiter
+from .logger import get_logger
+from .metrics import get_metrics, query_template
+from .session import RETRY_STATUSES
+from .utils import (
+    SPARQL_HEADERS,
+    _request_wd_search_results,
+    _retry_after_seconds,
+    keyset_query,
+    last_key,
+    request_to_wikidata,
+    sparql_endpoint_or_default,
+)
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+logger = get_logger()
+
+
+class AsyncClient:
+    """AsyncClient - asyncio HTTP client for Wikidata endpoints
+
+    Keeps one aiohttp session per event loop, bounds the number of requests
+    in flight with a semaphore and shares the process-wide RateLimiter
+    with the synchronous code, so HTTP 429 pauses both of them.
+    The session is closed when its loop shuts down async generators
+    (asyncio.run does) or on `async with AsyncClient()` exit.
+
+    Args:
+        max_concurrency: int - maximal number of requests in flight,
+            default config.MAX_WORKERS
+        timeout: float - total timeout of one request in seconds,
+            default config.HTTP_TIMEOUT
+        retries: int - number of retries for 5xx and connection errors,
+            default config.HTTP_RETRIES
+        backoff_factor: float - backoff factor between those retries
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        timeout: float = None,
+        retries: int = None,
+        backoff_factor: float = 0.5,
+    ):
+        if aiohttp is None:
+            raise ImportError(
+                "aiohttp is required for async client, install it with `pip install pywikidata[async]`"
+            )
+        self.max_concurrency = max_concurrency or config.MAX_WORKERS
+        self.timeout = config.HTTP_TIMEOUT if timeout is None else timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+        self._closing = None
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _bind_to_running_loop(self):
+        loop = asyncio.get_running_loop()
+        if (
+            self._loop is loop
+            and self._session is not None
+            and not self._session.closed
+        ):
+            return
+        self._forget_session()
+        self._loop = loop
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # the loop finalizes its async generators before it is closed,
+        # the session of the loop is closed with this one
+        self._closing = _close_on_shutdown(self._session)
+        await self._closing.__anext__()
+
+    def _forget_session(self):
+        session, loop = self._session, self._loop
+        if session is None or session.closed:
+            return
+        if loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            # connections of a closed loop can not be closed gracefully
+            session.detach()
+
+    async def get_json(self, url, params=None, headers=None, template=None):
+        """get_json - GET request with rate limiting and retries
+
+        HTTP 429 is retried like in utils.get_with_retry, HTTP 5xx, connection
+        errors and timeouts like in session.create_session.
+        Every attempt is recorded in metrics like in utils.get_with_retry.
+
+        Returns:
+            decoded JSON body of the response
+        """
+        await self._bind_to_running_loop()
+        if template is None:
+            template = (params or {}).get("action", url)
+        metrics = get_metrics()
+        rate_limiter = get_rate_limiter()
+        retries = config.HTTP_RETRIES if self.retries is None else self.retries
+        backoff = 0.5
+        failures = 0
+        async with self._semaphore:
+            while True:
+                await rate_limiter.acquire_async()
+                status = error = None
+                with metrics.track_in_flight():
+                    started_at = time.perf_counter()
+                    try:
+                        async with self._session.get(
+                            url, params=params, headers=headers
+                        ) as response:
+                            body = await response.read()
+                            seconds = time.perf_counter() - started_at
+                            status = response.status
+                            metrics.observe_request(
+                                template, seconds, status, len(body)
+                            )
+                            if status != 429 and (
+                                status not in RETRY_STATUSES or failures >= retries
+                            ):
+                                response.raise_for_status()
+                                return await response.json(content_type=None)
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                        if failures >= retries:
+                            raise
+                        error = e
+
+                if status == 429:
+                    to_sleep = _retry_after_seconds(response, default=backoff)
+                    metrics.observe_throttle(to_sleep)
+                    rate_limiter.pause(to_sleep)
+                    backoff = min(backoff * 2, config.MAX_RETRY_AFTER)
+                else:
+                    failures += 1
+                    to_sleep = self.backoff_factor * 2 ** (failures - 1)
+                logger.warning(
+                    {
+                        "msg": f"Request to wikidata endpoint failed. Retry.",
+                        "params": params,
+                        "endpoint": url,
+                        "response": {
+                            "status_code": status,
+                            "headers": dict(response.headers) if status else None,
+                        },
+                        "error": None if error is None else repr(error),
+                        "retry_after": to_sleep,
+                    }
+                )
+                if status != 429:
+                    await asyncio.sleep(to_sleep)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+async def _close_on_shutdown(session):
+    try:
+        yield
+    finally:
+        await session.close()
+
+
+_client = None
+
+
+def get_async_client() -> AsyncClient:
+    global _client
+    if _client is None:
+        _client = AsyncClient()
+    return _client
+
+
+def set_async_client(client: AsyncClient):
+    """set_async_client - replace process-wide async client, None to recreate default one"""
+    global _client
+    _client = client
+
+
+# event loop -> {cache key: task}
+_in_flight = weakref.WeakKeyDictionary()
+
+
+async def _single_flight(key: bytes, load):
+    """_single_flight - concurrent calls of one event loop with the same key await one load()
+
+    Like cache.SingleFlight, but for coroutines: the first caller starts
+    load() as a task, the others await it. A cancelled caller does not
+    cancel the task of the others.
+    """
+    tasks = _in_flight.setdefault(asyncio.get_running_loop(), {})
+    task = tasks.get(key)
+    if task is None:
+        task = asyncio.ensure_future(load())
+        tasks[key] = task
+        task.add_done_callback(lambda _: tasks.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def _send_sparql(query, sparql_endpoint):
+    pool = get_endpoint_pool(sparql_endpoint)
+    if pool is None:
+        return await _send_sparql_to(sparql_endpoint, query)
+
+    # failover like utils._send_sparql_to_pool
+    error = None
+    for endpoint in pool.candidates():
+        with pool.track(endpoint):
+            try:
+                return_value = await _send_sparql_to(endpoint, query)
+            except aiohttp.ClientResponseError as e:
+                if e.status < 500:
+                    pool.succeeded(endpoint)
+                    raise
+                error = e
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+            else:
+                pool.succeeded(endpoint)
+                return return_value
+        pool.failed(endpoint)
+    raise error
+
+
+async def _send_sparql_to(sparql_endpoint, query):
+    logger.info(
+        {
+            "msg": "Send async request to Wikidata",
+            "params": {"query": query},
+            "endpoint": sparql_endpoint,
+        }
+    )
+    return await get_async_client().get_json(
+        sparql_endpoint,
+        params={"format": "json", "query": query},
+        headers=SPARQL_HEADERS,
+        template=query_template(query),
+    )
+
+
+async def async_request_to_wikidata(query, sparql_endpoint=None):
+    """async_request_to_wikidata - awaitable request_to_wikidata
+
+    Uses the same cache keys as request_to_wikidata,
+    so sync and async code do not repeat each other's queries.
+    Requests are balanced across mirrors of the endpoint (see backends.EndpointPool)
+    and concurrent coroutines with the same query send it once.
+
+    Returns:
+        list of bindings
+    """
+    cache = get_cache()
+    sparql_endpoint = sparql_endpoint_or_default(sparql_endpoint)
+    key = request_to_wikidata.key(query, sparql_endpoint)
+    bindings = cache.get(key)
+    hit = bindings is not None
+    get_metrics().observe_cache("sparql", hits=int(hit), misses=int(not hit))
+    if hit:
+        return bindings
+
+    async def load():
+        # a call which finished after our cache miss has already stored it
+        bindings = cache.get(key, count=False)
+        if bindings is None:
+            responce = await _send_sparql(query, sparql_endpoint)
+            bindings = responce["results"]["bindings"]
+            get_metrics().observe_rows(query_template(query), len(bindings))
+            cache.put(key, bindings)
+        return bindings
+
+    return await _single_flight(key, load)
+
+
+async def async_paged_request_to_wikidata(
+    query,
+    order_by,
+    page_size: int = SPARQL_PAGE_SIZE,
+    sparql_endpoint=None,
+) -> list:
+    """async_paged_request_to_wikidata - awaitable list(iter_request_to_wikidata(...))
+
+    Keyset pages (see utils.keyset_query) are requested one after another
+    and share cache keys with the pages of iter_request_to_wikidata.
+
+    Args:
+        query: str - SELECT query without solution modifiers
+        order_by: variables bound in every row which together identify it
+        page_size: int - rows in one page, None for one request
+        sparql_endpoint: str - endpoint URL
+
+    Returns:
+        list of bindings
+    """
+    if page_size is None:
+        return await async_request_to_wikidata(query, sparql_endpoint)
+
+    bindings = []
+    after = None
+    while True:
+        page = await async_request_to_wikidata(
+            keyset_query(query, page_size, order_by, after), sparql_endpoint
+        )
+        bindings.extend(page)
+        if len(page) < page_size:
+            return bindings
+        after = last_key(page, order_by)
+
+
+async def async_get_wd_search_results(
+    search_string: str,
+    max_results: int = 500,
+    language: str = "en",
+    mediawiki_api_url: str = "https://www.wikidata.org/w/api.php",
+    user_agent: str = None,
+) -> list:
+    """async_get_wd_search_results - awaitable get_wd_search_results"""
+    index = get_label_index()
+    if index is not None:
+        return index.search(search_string, language, max_results)
+
+    cache = get_cache()
+    key = _request_wd_search_results.key(
+        search_string, max_results, language, mediawiki_api_url, user_agent
+    )
+    results = cache.get(key)
+    hit = results is not None
+    get_metrics().observe_cache("wbsearchentities", hits=int(hit), misses=int(not hit))
+    if hit:
+        return results
+
+    params = {
+        "action": "wbsearchentities",
+        "language": language,
+        "search": search_string,
+        "format": "json",
+        "limit": 50,
+    }
+    headers = {"User-Agent": "pywikidata" if user_agent is None else user_agent}
+
+    async def load():
+        results = cache.get(key, count=False)
+        if results is not None:
+            return results
+
+        cont_count = 1
+        results = []
+        while cont_count > 0:
+            params.update({"continue": 0 if cont_count == 1 else cont_count})
+            search_results = await get_async_client().get_json(
+                mediawiki_api_url, params=params, headers=headers
+            )
+
+            if search_results["success"] != 1:
+                raise Exception("WD search failed")
+            results.extend(i["id"] for i in search_results["search"])
+
+            cont_count = search_results.get("search-continue", 0)
+            if cont_count > max_results:
+                break
+
+        cache.put(key, results)
+        return results
+
+    return await _single_flight(key, load)
+
+
+class AsyncEntity:
+    """AsyncEntity - asyncio view of Entity
+
+    Wraps the Entity singleton with the same identifier, so values loaded
+    by async code are visible to sync code and vice versa.
+    Properties return awaitables: `await AsyncEntity("Q90").label`.
+
+    Args:
+        entity_identifier: str or Entity - URI or ID of entity or property, for example: Q90
+    """
+
+    # async field -> query builder of Entity
+    _NEIGHBOURS = {
+        "forward_one_hop_neighbours": "_query_forward_one_hop_neighbours_with_instance_of",
+        "backward_one_hop_neighbours": "_query_backward_one_hop_neighbours_with_instance_of",
+    }
+
+    def __init__(self, entity_identifier):
+        if isinstance(entity_identifier, AsyncEntity):
+            entity_identifier = entity_identifier.entity
+        if not isinstance(entity_identifier, Entity):
+            entity_identifier = Entity(entity_identifier)
+        self.entity = entity_identifier
+
+    @property
+    def idx(self) -> str:
+        return self.entity.idx
+
+    @property
+    def is_property(self) -> bool:
+        return self.entity.is_property
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, AsyncEntity) and other.entity is self.entity
+
+    def __hash__(self) -> int:
+        return hash(self.entity.idx)
+
+    def __repr__(self):
+        return f"<AsyncEntity: {self.idx}>"
+
+    async def aload(self, *fields) -> "AsyncEntity":
+        """aload - load fields concurrently
+
+        Args:
+            fields: names of fields, all scalar fields of Entity when empty
+
+        Returns:
+            AsyncEntity - self
+        """
+        fields = fields or tuple(Entity._FIELDS)
+        await asyncio.gather(*(self._load(field) for field in fields))
+        return self
+
+    async def _load(self, field):
+        if field not in Entity._FIELDS and field not in self._NEIGHBOURS:
+            raise ValueError(f"Wrong field {field}")
+        if getattr(self.entity, f"_{field}") is not None:
+            return
+        if self.entity._restore(field):
+            return
+        name = f"_request_{field}"
+        if field in self._NEIGHBOURS:
+            name += "_with_instance_of"
+        if _answered_locally(name):
+            getattr(self.entity, field)
+            return
+
+        if field in Entity._FIELDS:
+            query = getattr(Entity, f"_query_{field}")(self.idx)
+            responce = await async_request_to_wikidata(query)
+            value = Entity._parse_field(field, responce)
+        else:
+            query = getattr(Entity, self._NEIGHBOURS[field])(self.idx)
+            responce = await async_paged_request_to_wikidata(query, _NEIGHBOUR_ORDER)
+            value = Entity._process_one_hop_neighbours_with_instance_of(responce)
+
+        if value is not None:
+            self.entity._set_field(field, value)
+
+    async def _get(self, field):
+        await self._load(field)
+        return _unshared(getattr(self.entity, f"_{field}"))
+
+    @property
+    def label(self):
+        return self._get("label")
+
+    @property
+    def description(self):
+        return self._get("description")
+
+    @property
+    def image(self):
+        return self._get("image")
+
+    @property
+    def aliases(self):
+        return self._get("aliases")
+
+    @property
+    def instance_of(self):
+        return self._get("instance_of")
+
+    @property
+    def subclass_of(self):
+        return self._get("subclass_of")
+
+    @property
+    def forward_one_hop_neighbours(self):
+        return self._get("forward_one_hop_neighbours")
+
+    @property
+    def backward_one_hop_neighbours(self):
+        return self._get("backward_one_hop_neighbours")
+
+    @classmethod
+    async def from_label(cls, label: str):
+        """
+        Returns list of entities with corresponding label
+        """
+        if _answered_locally("_request_entity_by_label"):
+            return [cls(entity.idx) for entity in Entity.from_label(label)]
+
+        responce = await async_request_to_wikidata(Entity._query_entity_by_label(label))
+        if len(responce) == 0:
+            label = label[:1].lower() + label[1:]
+            responce = await async_request_to_wikidata(
+                Entity._query_entity_by_label(label)
+            )
+        if len(responce) == 0:
+            raise ValueError(
+                f"Wrong label, no one entity with label {label} was found. Attention: Supported only English labels"
+            )
+        return [cls(r["item"]["value"]) for r in responce]
+
+    @classmethod
+    async def prefetch(
+        cls,
+        entities,
+        fields=tuple(Entity._FIELDS),
+        chunk_size: int = SPARQL_VALUES_CHUNK_SIZE,
+    ):
+        """prefetch - async Entity.prefetch, chunk queries are gathered concurrently
+
+        Returns:
+            list of AsyncEntity - requested entities in the same order
+        """
+        entities = [cls(e) for e in entities]
+        Entity._validate_fields(fields)
+        local = [f for f in fields if _answered_locally(f"_request_{f}_batch")]
+        if local:
+            Entity.prefetch([e.entity for e in entities], local, chunk_size)
+            fields = [f for f in fields if f not in local]
+
+        async def fetch(field, chunk):
+            query = getattr(Entity, f"_query_{field}_batch")([e.idx for e in chunk])
+            Entity._fill_prefetched(
+                chunk, field, await async_request_to_wikidata(query)
+            )
+
+        await asyncio.gather(
+            *(
+                fetch(field, chunk)
+                for field in fields
+                for chunk in Entity._pending_chunks(
+                    [e.entity for e in entities], field, chunk_size
+                )
+            )
+        )
+        return entities
@@ -1,12 +1,348 @@
+import re
+import sys
 from collections.abc import Hashable, Mapping
 from typing import ItemsView, Iterator, KeysView, ValuesView
-from .config import WIKIDATA_URI
-import requests
-from requests.compat import urljoin
+from urllib.parse import urljoin
+from . import config
+from .cache import cache_key, get_cache
+from .config import WBGETENTITIES_BATCH_SIZE
+from .executor import get_executor
+from .offline import get_offline_index
+from .utils import get_with_retry
 
+# https://www.wikidata.org/w/api.php?action=wbgetentities&ids=Q189|Q90&format=json
+# returns the same entity JSON as
 # https://www.wikidata.org/wiki/Special:EntityData/Q189.json
 
 
+def _request_wbgetentities(ids, props=None, languages=None) -> dict:
+    params = {"action": "wbgetentities", "ids": "|".join(ids), "format": "json"}
+    if props is not None:
+        params["props"] = "|".join(props)
+    if languages is not None:
+        params["languages"] = "|".join(languages)
+
+    response = get_with_retry(
+        urljoin(config.WIKIDATA_URI, "/w/api.php"),
+        params=params,
+        headers={"User-Agent": "pywikidata"},
+    )
+    response.raise_for_status()
+    payload = response.json()
+    if "error" in payload:
+        raise ValueError(f"wbgetentities failed: {payload['error']}")
+
+    entities = {}
+    for entity_id, entity in payload["entities"].items():
+        entities[entity_id] = entity
+        if "redirects" in entity:
+            entities[entity["redirects"]["from"]] = entity
+    return {idx: entities.get(idx) for idx in ids}
+
+
+def load_entity_data(
+    ids, props=None, languages=None, batch_size: int = WBGETENTITIES_BATCH_SIZE
+) -> dict:
+    """load_entity_data - entity JSON for many ids with wbgetentities
+
+    Entities are cached one by one in the shared cache backend, missing ones
+    are requested in batches of batch_size ids (50 is the API limit),
+    batches are sent concurrently by the process-wide RequestExecutor.
+    With offline index configured the JSON is built from the index.
+
+    Args:
+        ids: iterable of entity ids
+        props: collection of wbgetentities props, e.g. ["labels", "claims"]
+        languages: collection of language codes of labels, descriptions and aliases
+        batch_size: int - number of ids in one wbgetentities request
+
+    Returns:
+        dict - entity id -> entity JSON, {"id": ..., "missing": ""} for unknown ids
+    """
+    ids = list(dict.fromkeys(ids))
+    props = sorted(props) if props is not None else None
+    languages = sorted(languages) if languages is not None else None
+
+    index = get_offline_index()
+    if index is not None:
+        return {idx: index.entity_data(idx) or {} for idx in ids}
+
+    cache = get_cache()
+    keys = {idx: cache_key("entitydata", idx, props, languages) for idx in ids}
+    cached = cache.get_many(keys.values())
+    result = {idx: cached[key] for idx, key in keys.items() if key in cached}
+
+    missing = [idx for idx in ids if idx not in result]
+    executor = get_executor()
+    futures = [
+        executor.submit(
+            _request_wbgetentities,
+            missing[start : start + batch_size],
+            props,
+            languages,
+        )
+        for start in range(0, len(missing), batch_size)
+    ]
+    fetched = {}
+    for future in futures:
+        fetched.update(future.result())
+    cache.put_many(
+        {keys[idx]: entity for idx, entity in fetched.items() if entity is not None}
+    )
+
+    result.update(fetched)
+    return result
+
+
+_ENTITY_ID = re.compile(r"([PQ])([0-9]+)")
+_ENTITY_TYPES = {"Q": "item", "P": "property"}
+
+
+class Claim(Mapping):
+    """Claim - compact statement that reads like a Wikibase JSON statement
+
+    Main snak is kept in slots, item and property values only as ids,
+    the statement id and snak hashes are dropped. claim["mainsnak"] and
+    other keys build the JSON structure on access.
+
+    Args:
+        prop_id: str - property id
+        snaktype: str - value, somevalue or novalue
+        datatype: str - property datatype, e.g. wikibase-item
+        value_type: str - datavalue type, e.g. wikibase-entityid
+        value: value of the datavalue, entity id for items and properties
+        rank: str - preferred, normal or deprecated
+        qualifiers: dict - qualifiers in JSON format or None
+        references: list - references in JSON format or None
+    """
+
+    __slots__ = (
+        "property",
+        "snaktype",
+        "datatype",
+        "value_type",
+        "value",
+        "rank",
+        "qualifiers",
+        "references",
+    )
+
+    def __init__(
+        self,
+        prop_id,
+        snaktype,
+        datatype,
+        value_type,
+        value,
+        rank,
+        qualifiers=None,
+        references=None,
+    ):
+        self.property = prop_id
+        self.snaktype = snaktype
+        self.datatype = datatype
+        self.value_type = value_type
+        self.value = value
+        self.rank = rank
+        self.qualifiers = qualifiers
+        self.references = references
+
+    @classmethod
+    def from_json(
+        cls, statement: dict, keep_qualifiers: bool = True, keep_references: bool = True
+    ) -> "Claim":
+        mainsnak = statement["mainsnak"]
+        datavalue = mainsnak.get("datavalue")
+        value_type = value = None
+        if datavalue is not None:
+            value_type = sys.intern(datavalue["type"])
+            value = datavalue["value"]
+            if value_type == "wikibase-entityid" and _ENTITY_ID.fullmatch(
+                value.get("id", "")
+            ):
+                value = sys.intern(value["id"])
+        datatype = mainsnak.get("datatype")
+        return cls(
+            sys.intern(mainsnak["property"]),
+            sys.intern(mainsnak["snaktype"]),
+            sys.intern(datatype) if datatype is not None else None,
+            value_type,
+            value,
+            sys.intern(statement.get("rank", "normal")),
+            statement.get("qualifiers") if keep_qualifiers else None,
+            statement.get("references") if keep_references else None,
+        )
+
+    def _datavalue(self) -> dict:
+        value = self.value
+        if isinstance(value, str) and self.value_type == "wikibase-entityid":
+            match = _ENTITY_ID.fullmatch(value)
+            value = {
+                "entity-type": _ENTITY_TYPES[match[1]],
+                "numeric-id": int(match[2]),
+                "id": value,
+            }
+        return {"value": value, "type": self.value_type}
+
+    def _mainsnak(self) -> dict:
+        mainsnak = {"snaktype": self.snaktype, "property": self.property}
+        if self.value_type is not None:
+            mainsnak["datavalue"] = self._datavalue()
+        if self.datatype is not None:
+            mainsnak["datatype"] = self.datatype
+        return mainsnak
+
+    def __getitem__(self, key: str):
+        if key == "mainsnak":
+            return self._mainsnak()
+        if key == "type":
+            return "statement"
+        if key == "rank":
+            return self.rank
+        if key == "qualifiers" and self.qualifiers is not None:
+            return self.qualifiers
+        if key == "references" and self.references is not None:
+            return self.references
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator:
+        yield from ("mainsnak", "type", "rank")
+        if self.qualifiers is not None:
+            yield "qualifiers"
+        if self.references is not None:
+            yield "references"
+
+    def __len__(self) -> int:
+        return 3 + (self.qualifiers is not None) + (self.references is not None)
+
+    def __repr__(self):
+        return f"<Claim: {self.property} {self.value!r}>"
+
+
+# None is a valid keys and languages, so defaults are marked by _CONFIG
+_CONFIG = object()
+
+
+class AttributesProjection:
+    """AttributesProjection - which part of entity JSON is kept in memory
+
+    Applied to every loaded entity JSON, the cached JSON is not affected.
+
+    Arguments which are not given are read from config.ATTRIBUTES_* settings.
+
+    Args:
+        keys: collection of top-level keys to keep, None for all,
+            id and type are always kept
+        languages: collection of language codes of labels, descriptions and aliases,
+            None for all
+        keep_qualifiers: bool - keep qualifiers of statements
+        keep_references: bool - keep references of statements
+        compact_claims: bool - store statements as Claim objects
+    """
+
+    # top-level keys of entity JSON which can be requested by wbgetentities props
+    WBGETENTITIES_PROPS = ("labels", "descriptions", "aliases", "claims", "sitelinks")
+
+    def __init__(
+        self,
+        keys=_CONFIG,
+        languages=_CONFIG,
+        keep_qualifiers: bool = _CONFIG,
+        keep_references: bool = _CONFIG,
+        compact_claims: bool = _CONFIG,
+    ):
+        keys = config.ATTRIBUTES_KEYS if keys is _CONFIG else keys
+        languages = config.ATTRIBUTES_LANGUAGES if languages is _CONFIG else languages
+        if keep_qualifiers is _CONFIG:
+            keep_qualifiers = config.ATTRIBUTES_KEEP_QUALIFIERS
+        if keep_references is _CONFIG:
+            keep_references = config.ATTRIBUTES_KEEP_REFERENCES
+        if compact_claims is _CONFIG:
+            compact_claims = config.ATTRIBUTES_COMPACT_CLAIMS
+        self.keys = set(keys) | {"id", "type"} if keys is not None else None
+        self.languages = set(languages) if languages is not None else None
+        self.keep_qualifiers = keep_qualifiers
+        self.keep_references = keep_references
+        self.compact_claims = compact_claims
+
+    @property
+    def is_identity(self) -> bool:
+        return (
+            self.keys is None
+            and self.languages is None
+            and self.keep_qualifiers
+            and self.keep_references
+            and not self.compact_claims
+        )
+
+    def props(self):
+        """props - wbgetentities props covering projected keys, None for all"""
+        if self.keys is None:
+            return None
+        props = {key for key in self.keys if key in self.WBGETENTITIES_PROPS}
+        if self.keys - props - {"id", "type"}:
+            props.add("info")
+        return sorted(props)
+
+    def _statement(self, statement: dict):
+        if self.compact_claims:
+            return Claim.from_json(
+                statement, self.keep_qualifiers, self.keep_references
+            )
+        statement = dict(statement)
+        if not self.keep_qualifiers:
+            statement.pop("qualifiers", None)
+            statement.pop("qualifiers-order", None)
+        if not self.keep_references:
+            statement.pop("references", None)
+        return statement
+
+    def apply(self, entity: dict) -> dict:
+        if not entity or self.is_identity:
+            return entity
+
+        projected = {}
+        for key, value in entity.items():
+            if self.keys is not None and key not in self.keys:
+                continue
+            if key in ("labels", "descriptions", "aliases") and self.languages:
+                value = {lang: v for lang, v in value.items() if lang in self.languages}
+            elif key == "claims":
+                value = {
+                    sys.intern(prop_id): [self._statement(s) for s in statements]
+                    for prop_id, statements in value.items()
+                }
+            projected[key] = value
+        return projected
+
+
+_projection = None
+
+
+def get_projection() -> AttributesProjection:
+    """get_projection - projection of loaded attributes, from config settings until set_projection"""
+    global _projection
+    if _projection is None:
+        _projection = AttributesProjection()
+    return _projection
+
+
+def set_projection(projection: AttributesProjection):
+    """set_projection - change projection of attributes loaded from now on
+
+    Args:
+        projection: AttributesProjection - projection, None for full entity JSON
+    """
+    global _projection
+    _projection = projection or AttributesProjection(
+        keys=None,
+        languages=None,
+        keep_qualifiers=True,
+        keep_references=True,
+        compact_claims=False,
+    )
+
+
 class _WikidataAttributes(Mapping, Hashable):
     """_WikidataAttributes - Object for storing Wikidata Entities attributes"""
 
@@ -16,10 +352,30 @@ class _WikidataAttributes(Mapping, Hashable):
         self._attributes = None
 
     def _load(self):
-        r = requests.get(
-            urljoin(WIKIDATA_URI, f"/wiki/Special:EntityData/{self.idx}.json"),
-        )
-        self._attributes = r.json()["entities"][self.idx]
+        self.load_many([self])
+
+    @classmethod
+    def load_many(cls, attributes, props=None, languages=None):
+        """load_many - fill not loaded attributes with batched wbgetentities requests
+
+        Loaded JSON is reduced by the current AttributesProjection,
+        by default props and languages are taken from it.
+
+        Args:
+            attributes: iterable of _WikidataAttributes
+            props: collection of top-level keys to keep, None for all
+            languages: collection of language codes to keep, None for all
+        """
+        projection = get_projection()
+        if props is None:
+            props = projection.props()
+        if languages is None and projection.languages is not None:
+            languages = sorted(projection.languages)
+
+        pending = [a for a in attributes if a._attributes is None]
+        entities = load_entity_data([a.idx for a in pending], props, languages)
+        for a in pending:
+            a._attributes = projection.apply(entities[a.idx] or {})
 
     def __hash__(self) -> int:
         return hash(self.idx)
@@ -0,0 +1,675 @@
+"""Query backends Entity requests are dispatched through
+
+A backend answers _WikiDataSPARQLBase requests by their method names
+(_request_label, _request_instance_of_batch, ...) with bindings in SPARQL
+JSON results format. The process-wide chain of backends (see set_backends)
+is asked in order, the first available backend with the capabilities
+a request needs answers it:
+
+    LabelIndexBackend - label lookups from labels.LabelIndex
+    OfflineIndexBackend - everything but label lookups from offline.OfflineIndex
+    TripleStoreBackend - in-process triple index of a subset of Wikidata
+    HDTBackend - TripleStoreBackend over an HDT file (needs the hdt package)
+    SPARQLBackend - SPARQL endpoint and its mirrors
+
+The default chain is the label index, the offline index and the
+configured SPARQL endpoint, so indexes set with set_label_index and
+set_offline_index take part without further configuration.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from . import config
+from .dump import entity_edges, snak_value, truthy_statements
+from .labels import get_label_index
+from .logger import get_logger
+from .offline import COMMONS_FILE_URI, DIRECT_PROPERTY_URI, ENTITY_URI
+from .offline import get_offline_index
+
+logger = get_logger()
+
+# capability flags
+SPARQL = "sparql"  # arbitrary SPARQL queries, paging and concurrent batches
+FIELDS = "fields"  # label, description, aliases, image, instance_of, subclass_of
+BATCH = "batch"  # _batch variants of requests for many entities at once
+HIERARCHY = "hierarchy"  # superclasses and type closures
+NEIGHBOURS = "neighbours"  # one-hop neighbours
+LABEL_LOOKUP = "label_lookup"  # entities by their labels
+
+_REQUEST_CAPABILITIES = {
+    "label": FIELDS,
+    "description": FIELDS,
+    "image": FIELDS,
+    "aliases": FIELDS,
+    "instance_of": FIELDS,
+    "subclass_of": FIELDS,
+    "superclasses": HIERARCHY,
+    "type_closure": HIERARCHY,
+    "one_hop_neighbours": NEIGHBOURS,
+    "one_hop_neighbours_with_instance_of": NEIGHBOURS,
+    "forward_one_hop_neighbours_with_instance_of": NEIGHBOURS,
+    "backward_one_hop_neighbours_with_instance_of": NEIGHBOURS,
+    "entity_by_label": LABEL_LOOKUP,
+}
+
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+SCHEMA_DESCRIPTION = "http://schema.org/description"
+SKOS_ALT_LABEL = "http://www.w3.org/2004/02/skos/core#altLabel"
+
+_LITERAL = re.compile(r'"(.*)"(?:@([A-Za-z0-9-]+)|\^\^<?[^>]*>?)?', re.DOTALL)
+_NTRIPLE_TERM = re.compile(
+    r'<([^>]*)>|(_:\S+)|("(?:[^"\\]|\\.)*"(?:@[\w-]+|\^\^<[^>]*>)?)'
+)
+
+_ESCAPE = re.compile(r"\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))", re.DOTALL)
+_ECHAR = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f"}
+
+
+def _unescape(value: str) -> str:
+    """_unescape - N-Triples string or IRI with UCHAR and ECHAR escapes decoded"""
+    if "\\" not in value:
+        return value
+
+    def replace(match):
+        code = match[1] or match[2]
+        if code is not None:
+            return chr(int(code, 16))
+        return _ECHAR.get(match[3], match[3])
+
+    return _ESCAPE.sub(replace, value)
+
+
+def required_capabilities(name: str) -> frozenset:
+    """required_capabilities - capability flags a request method needs
+
+    Requests without a structured equivalent need SPARQL.
+    """
+    request = name[len("_request_") :] if name.startswith("_request_") else name
+    batch = request.endswith("_batch")
+    if batch:
+        request = request[: -len("_batch")]
+    capability = _REQUEST_CAPABILITIES.get(request, SPARQL)
+    return frozenset((capability, BATCH) if batch else (capability,))
+
+
+class QueryBackend:
+    """QueryBackend - source of bindings for Entity requests
+
+    Attributes:
+        name: str - name in logs and errors
+        capabilities: frozenset of capability flags, see module constants
+        exclusive: bool - requests the backend can not answer fail
+            instead of going to the next backend of the chain
+    """
+
+    name = "backend"
+    capabilities = frozenset()
+    exclusive = False
+
+    @property
+    def available(self) -> bool:
+        """available - False when the backend is skipped, e.g. index is not set"""
+        return True
+
+    def supports(self, name: str) -> bool:
+        return required_capabilities(name) <= self.capabilities
+
+    def request(self, name: str, *args) -> list:
+        """request - bindings of _WikiDataSPARQLBase request by its method name"""
+        raise NotImplementedError(f"{name} is not supported by {self.name}")
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class LabelIndexBackend(QueryBackend):
+    """LabelIndexBackend - label lookups answered by labels.LabelIndex
+
+    Args:
+        index: LabelIndex, None for the process-wide one (see set_label_index)
+    """
+
+    name = "label index"
+    capabilities = frozenset((LABEL_LOOKUP, BATCH))
+
+    def __init__(self, index=None):
+        self._index = index
+
+    @property
+    def index(self):
+        return self._index if self._index is not None else get_label_index()
+
+    @property
+    def available(self) -> bool:
+        return self.index is not None
+
+    def request(self, name: str, *args) -> list:
+        if not self.supports(name):
+            return super().request(name, *args)
+        return getattr(self.index, name)(*args)
+
+
+class OfflineIndexBackend(QueryBackend):
+    """OfflineIndexBackend - requests answered by offline.OfflineIndex
+
+    The backend is exclusive: with an offline index nothing is requested online.
+
+    Args:
+        index: OfflineIndex, None for the process-wide one (see set_offline_index)
+    """
+
+    name = "offline index"
+    capabilities = frozenset((FIELDS, BATCH, HIERARCHY, NEIGHBOURS))
+    exclusive = True
+
+    def __init__(self, index=None):
+        self._index = index
+
+    @property
+    def index(self):
+        return self._index if self._index is not None else get_offline_index()
+
+    @property
+    def available(self) -> bool:
+        return self.index is not None
+
+    def request(self, name: str, *args) -> list:
+        return self.index.request(name, *args)
+
+
+def literal(value: str, language: str = "en") -> str:
+    """literal - triple store term of language-tagged string, as HDT returns it"""
+    return f'"{value}"@{language}'
+
+
+def _parse_literal(term: str):
+    """_parse_literal - (value, language) of literal term, None for IRIs"""
+    if not term.startswith('"'):
+        return None
+    match = _LITERAL.fullmatch(term)
+    if match is None:
+        return None
+    return match[1], match[2]
+
+
+def _uri(value: str) -> dict:
+    return {"type": "uri", "value": value}
+
+
+def _entity_id(term: str):
+    if term.startswith(ENTITY_URI):
+        return term[len(ENTITY_URI) :]
+    return None
+
+
+class TripleStoreBackend(QueryBackend):
+    """TripleStoreBackend - requests answered by in-process triple index
+
+    Terms are strings: IRIs without angle brackets and literals
+    in N-Triples form with unescaped value ("Paris"@en).
+    Edges between entities are the truthy wdt: statements, labels are
+    rdfs:label, descriptions schema:description, aliases skos:altLabel,
+    like in the Wikidata RDF dump. Suited for subsets which fit in memory.
+
+    Args:
+        triples: iterable of (subject, predicate, object) terms
+        language: str - language of labels, descriptions and aliases
+    """
+
+    name = "triple store"
+    capabilities = frozenset((FIELDS, BATCH, HIERARCHY, NEIGHBOURS, LABEL_LOOKUP))
+
+    def __init__(self, triples=(), language: str = "en"):
+        self.language = language
+        self._by_subject = {}
+        self._by_object = {}
+        for subject, predicate, obj in triples:
+            self.add(subject, predicate, obj)
+
+    def add(self, subject: str, predicate: str, obj: str):
+        self._by_subject.setdefault(subject, {}).setdefault(predicate, []).append(obj)
+        self._by_object.setdefault(obj, {}).setdefault(predicate, []).append(subject)
+
+    def __len__(self) -> int:
+        return sum(
+            len(objects)
+            for predicates in self._by_subject.values()
+            for objects in predicates.values()
+        )
+
+    def triples(self, subject: str = None, predicate: str = None, obj: str = None):
+        """triples - iterate (subject, predicate, object) matching the pattern
+
+        None matches any term, subject or object should be given.
+        """
+        if subject is not None:
+            for p, objects in self._by_subject.get(subject, {}).items():
+                if predicate is None or p == predicate:
+                    for o in objects:
+                        if obj is None or o == obj:
+                            yield subject, p, o
+        elif obj is not None:
+            for p, subjects in self._by_object.get(obj, {}).items():
+                if predicate is None or p == predicate:
+                    for s in subjects:
+                        yield s, p, obj
+        else:
+            for s in list(self._by_subject):
+                yield from self.triples(s, predicate)
+
+    @classmethod
+    def from_ntriples(cls, path: str, language: str = "en") -> "TripleStoreBackend":
+        """from_ntriples - load N-Triples file, e.g. a filtered part of the RDF dump"""
+        store = cls(language=language)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                terms = []
+                for iri, blank, value in _NTRIPLE_TERM.findall(line):
+                    if value:
+                        end = value.rindex('"')
+                        value = '"' + _unescape(value[1:end]) + value[end:]
+                    terms.append(_unescape(iri) or blank or value)
+                if len(terms) == 3:
+                    store.add(*terms)
+        return store
+
+    @classmethod
+    def from_records(cls, records, language: str = "en") -> "TripleStoreBackend":
+        """from_records - index compact records (see dump.compact_record)"""
+        store = cls(language=language)
+        for record in records:
+            subject = ENTITY_URI + record["id"]
+            if language in record["labels"]:
+                store.add(
+                    subject, RDFS_LABEL, literal(record["labels"][language], language)
+                )
+            if language in record["descriptions"]:
+                description = literal(record["descriptions"][language], language)
+                store.add(subject, SCHEMA_DESCRIPTION, description)
+            for alias in record["aliases"].get(language, []):
+                store.add(subject, SKOS_ALT_LABEL, literal(alias, language))
+            for statement in truthy_statements(record["claims"].get("P18", [])):
+                value = snak_value(statement.get("mainsnak") or {})
+                if value is not None:
+                    image = COMMONS_FILE_URI + quote(value[1])
+                    store.add(subject, DIRECT_PROPERTY_URI + "P18", image)
+            for prop_id, target in entity_edges(record):
+                store.add(subject, DIRECT_PROPERTY_URI + prop_id, ENTITY_URI + target)
+        return store
+
+    def _objects(self, entity_id: str, predicate: str) -> list:
+        return [o for _, _, o in self.triples(ENTITY_URI + entity_id, predicate)]
+
+    def _literals(self, entity_id: str, predicate: str) -> list:
+        values = []
+        for term in self._objects(entity_id, predicate):
+            parsed = _parse_literal(term)
+            if parsed is not None and parsed[1] == self.language:
+                values.append(parsed[0])
+        return values
+
+    def _literal_bindings(self, variable, values) -> list:
+        return [
+            {variable: {"type": "literal", "xml:lang": self.language, "value": v}}
+            for v in values
+        ]
+
+    def _targets(self, entity_id: str, prop_id: str) -> list:
+        return [
+            target
+            for target in map(
+                _entity_id, self._objects(entity_id, DIRECT_PROPERTY_URI + prop_id)
+            )
+            if target is not None
+        ]
+
+    def request(self, name: str, *args) -> list:
+        """request - like OfflineIndex.request, batches add ?entity binding"""
+        if not self.supports(name):
+            return super().request(name, *args)
+        if name.endswith("_batch") and not hasattr(self, name):
+            single = getattr(self, name[: -len("_batch")])
+            bindings = []
+            for entity_id in args[0]:
+                entity = _uri(ENTITY_URI + entity_id)
+                bindings.extend(dict(b, entity=entity) for b in single(entity_id))
+            return bindings
+        return getattr(self, name)(*args)
+
+    def _request_label(self, entity_id):
+        return self._literal_bindings("label", self._literals(entity_id, RDFS_LABEL))
+
+    def _request_description(self, entity_id):
+        descriptions = self._literals(entity_id, SCHEMA_DESCRIPTION)
+        return self._literal_bindings("description", descriptions)
+
+    def _request_aliases(self, entity_id):
+        aliases = self._literals(entity_id, SKOS_ALT_LABEL)
+        return self._literal_bindings("label", aliases)
+
+    def _request_image(self, entity_id):
+        images = self._objects(entity_id, DIRECT_PROPERTY_URI + "P18")
+        return [{"image": _uri(image)} for image in images]
+
+    def _request_instance_of(self, entity_id):
+        targets = self._targets(entity_id, "P31")
+        return [{"instance_of": _uri(ENTITY_URI + t)} for t in targets]
+
+    def _request_subclass_of(self, entity_id):
+        targets = self._targets(entity_id, "P279")
+        return [{"subclass_of": _uri(ENTITY_URI + t)} for t in targets]
+
+    def _closure_bindings(self, class_ids) -> list:
+        closure = dict.fromkeys(class_ids)
+        queue = list(closure)
+        while queue:
+            for parent in self._targets(queue.pop(), "P279"):
+                if parent not in closure:
+                    closure[parent] = None
+                    queue.append(parent)
+        return [{"class": _uri(ENTITY_URI + class_id)} for class_id in closure]
+
+    def _request_superclasses(self, entity_id):
+        return self._closure_bindings([entity_id])
+
+    def _request_type_closure(self, entity_id):
+        return self._closure_bindings(self._targets(entity_id, "P31"))
+
+    def _edges(self, entity_id: str, direction: str) -> list:
+        """_edges - (property id, neighbour id) of wdt: statements between entities"""
+        entity = ENTITY_URI + entity_id
+        if direction == "forward":
+            matches = ((p, o) for _, p, o in self.triples(subject=entity))
+        else:
+            matches = ((p, s) for s, p, _ in self.triples(obj=entity))
+        edges = []
+        for predicate, neighbour in matches:
+            neighbour_id = _entity_id(neighbour)
+            if predicate.startswith(DIRECT_PROPERTY_URI) and neighbour_id is not None:
+                edges.append((predicate[len(DIRECT_PROPERTY_URI) :], neighbour_id))
+        return edges
+
+    def _neighbours_with_instance_of(self, edges) -> list:
+        return [
+            {
+                "property": _uri(DIRECT_PROPERTY_URI + prop_id),
+                "object": _uri(ENTITY_URI + neighbour_id),
+                "instance_of": _uri(ENTITY_URI + instance_of),
+            }
+            for prop_id, neighbour_id in edges
+            for instance_of in self._targets(neighbour_id, "P31")
+        ]
+
+    def _request_forward_one_hop_neighbours_with_instance_of(self, entity_id):
+        return self._neighbours_with_instance_of(self._edges(entity_id, "forward"))
+
+    def _request_backward_one_hop_neighbours_with_instance_of(self, entity_id):
+        return self._neighbours_with_instance_of(self._edges(entity_id, "backward"))
+
+    def _request_one_hop_neighbours_with_instance_of(self, entity_id):
+        return self._neighbours_with_instance_of(
+            self._edges(entity_id, "forward") + self._edges(entity_id, "backward")
+        )
+
+    def _request_one_hop_neighbours(self, entity_id):
+        return [
+            {
+                "property": _uri(DIRECT_PROPERTY_URI + prop_id),
+                "object": _uri(ENTITY_URI + neighbour_id),
+            }
+            for prop_id, neighbour_id in self._edges(entity_id, "forward")
+            + self._edges(entity_id, "backward")
+        ]
+
+    def _request_entity_by_label(self, label, language="en"):
+        return [
+            {
+                "item": _uri(subject),
+                "label": {"type": "literal", "xml:lang": language, "value": label},
+            }
+            for subject, _, _ in self.triples(
+                predicate=RDFS_LABEL, obj=literal(label, language)
+            )
+            if _entity_id(subject) is not None
+        ]
+
+    def _request_entity_by_label_batch(self, labels, language="en"):
+        bindings = []
+        for label in labels:
+            bindings.extend(self._request_entity_by_label(label, language))
+        return bindings
+
+
+class HDTBackend(TripleStoreBackend):
+    """HDTBackend - TripleStoreBackend over an HDT file, e.g. a partial Wikidata dump
+
+    The file is memory-mapped by the hdt package (pip install hdt),
+    nothing is loaded into Python objects in advance.
+
+    Args:
+        path: str - .hdt file, its .index file is created next to it when missing
+        language: str - language of labels, descriptions and aliases
+    """
+
+    name = "hdt"
+
+    def __init__(self, path: str, language: str = "en"):
+        try:
+            from hdt import HDTDocument
+        except ImportError:
+            raise ImportError("HDTBackend requires hdt: pip install hdt")
+        super().__init__(language=language)
+        self.path = path
+        self._document = HDTDocument(str(path))
+
+    def add(self, subject: str, predicate: str, obj: str):
+        raise TypeError("HDT file is read-only")
+
+    def __len__(self) -> int:
+        return self._document.total_triples
+
+    def triples(self, subject: str = None, predicate: str = None, obj: str = None):
+        matches, _ = self._document.search_triples(
+            subject or "", predicate or "", obj or ""
+        )
+        return matches
+
+
+class EndpointPool:
+    """EndpointPool - load balancing and failover across SPARQL endpoint mirrors
+
+    Every request goes to the healthy endpoint with the fewest requests
+    in flight, ties are broken round-robin. An endpoint which fails with
+    a connection error or HTTP 5xx is skipped for cooldown seconds,
+    when all endpoints are failing the least recently failed one is tried.
+
+    Args:
+        endpoints: list of str - URLs of endpoints serving the same data
+        cooldown: float - seconds a failed endpoint is skipped
+    """
+
+    def __init__(self, endpoints, cooldown: float = 30.0):
+        self.endpoints = list(endpoints)
+        if not self.endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._in_flight = dict.fromkeys(self.endpoints, 0)
+        self._failed_at = dict.fromkeys(self.endpoints, None)
+        self._requests = dict.fromkeys(self.endpoints, 0)
+        self._failures = dict.fromkeys(self.endpoints, 0)
+        self._turn = 0
+
+    def __contains__(self, endpoint: str) -> bool:
+        return endpoint in self._in_flight
+
+    def _healthy(self, endpoint: str, now: float) -> bool:
+        failed_at = self._failed_at[endpoint]
+        return failed_at is None or now - failed_at >= self.cooldown
+
+    def candidates(self) -> list:
+        """candidates - endpoints in the order they should be tried"""
+        with self._lock:
+            now = time.monotonic()
+            self._turn = (self._turn + 1) % len(self.endpoints)
+            rotated = self.endpoints[self._turn :] + self.endpoints[: self._turn]
+            healthy = [e for e in rotated if self._healthy(e, now)]
+            failing = sorted(
+                (e for e in rotated if not self._healthy(e, now)),
+                key=self._failed_at.__getitem__,
+            )
+        healthy.sort(key=self._in_flight.__getitem__)
+        return healthy + failing
+
+    @contextmanager
+    def track(self, endpoint: str):
+        """track - count request to endpoint as in flight"""
+        with self._lock:
+            self._in_flight[endpoint] += 1
+            self._requests[endpoint] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[endpoint] -= 1
+
+    def failed(self, endpoint: str):
+        with self._lock:
+            self._failed_at[endpoint] = time.monotonic()
+            self._failures[endpoint] += 1
+        logger.warning({"msg": "SPARQL endpoint failed over", "endpoint": endpoint})
+
+    def succeeded(self, endpoint: str):
+        with self._lock:
+            self._failed_at[endpoint] = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                endpoint: {
+                    "requests": self._requests[endpoint],
+                    "failures": self._failures[endpoint],
+                    "in_flight": self._in_flight[endpoint],
+                    "healthy": self._healthy(endpoint, now),
+                }
+                for endpoint in self.endpoints
+            }
+
+
+class SPARQLBackend(QueryBackend):
+    """SPARQLBackend - requests sent to a SPARQL endpoint
+
+    The first SPARQLBackend of the chain is the endpoint of all SPARQL
+    requests without an explicit one. Several endpoints are mirrors
+    of the same data, e.g. Wikidata Query Service and a local QLever
+    or Blazegraph: requests are balanced across them and fail over
+    (see EndpointPool), results are cached under the first one.
+
+    Args:
+        endpoints: list of str - endpoint URLs, None for config.SPARQL_ENDPOINT
+            and config.SPARQL_MIRRORS
+        cooldown: float - seconds a failed mirror is skipped
+    """
+
+    name = "sparql"
+    capabilities = frozenset(
+        (SPARQL, FIELDS, BATCH, HIERARCHY, NEIGHBOURS, LABEL_LOOKUP)
+    )
+
+    def __init__(self, endpoints=None, cooldown: float = 30.0):
+        if isinstance(endpoints, str):
+            endpoints = [endpoints]
+        self.endpoints = list(endpoints) if endpoints else None
+        self.pool = None
+        if self.endpoints is not None and len(self.endpoints) > 1:
+            self.pool = EndpointPool(self.endpoints, cooldown)
+
+    @property
+    def endpoint(self) -> str:
+        """endpoint - URL results are cached under"""
+        return self.endpoints[0] if self.endpoints else config.SPARQL_ENDPOINT
+
+    def query(self, query: str) -> list:
+        """query - bindings of arbitrary SPARQL query"""
+        from .utils import request_to_wikidata
+
+        return request_to_wikidata(query, self.endpoint)
+
+    def __repr__(self):
+        return f"SPARQLBackend({self.endpoints!r})"
+
+
+def _default_backends() -> list:
+    mirrors = config.SPARQL_MIRRORS
+    endpoints = [config.SPARQL_ENDPOINT] + mirrors if mirrors else None
+    return [LabelIndexBackend(), OfflineIndexBackend(), SPARQLBackend(endpoints)]
+
+
+_lock = threading.Lock()
+_backends = None
+
+
+def get_backends() -> list:
+    """get_backends - process-wide chain of query backends"""
+    global _backends
+    if _backends is not None:
+        return _backends
+    with _lock:
+        if _backends is None:
+            _backends = _default_backends()
+        return _backends
+
+
+def set_backends(backends):
+    """set_backends - dispatch Entity requests through backends in order
+
+    Example:
+        set_backends([
+            TripleStoreBackend.from_ntriples("subset.nt"),
+            SPARQLBackend(["http://localhost:7001/sparql", config.SPARQL_ENDPOINT]),
+        ])
+
+    Args:
+        backends: list of QueryBackend, None for the default chain
+    """
+    global _backends
+    with _lock:
+        _backends = list(backends) if backends is not None else None
+
+
+def route(name: str) -> QueryBackend:
+    """route - backend which answers request method name
+
+    Raises:
+        NotImplementedError - no backend can answer, or an exclusive one can not
+    """
+    required = required_capabilities(name)
+    for backend in get_backends():
+        if not backend.available:
+            continue
+        if required <= backend.capabilities:
+            return backend
+        if backend.exclusive:
+            raise NotImplementedError(f"{name} is not supported by {backend.name}")
+    raise NotImplementedError(f"{name} is not supported by any query backend")
+
+
+def get_sparql_backend():
+    """get_sparql_backend - first SPARQLBackend of the chain, None when there is none"""
+    for backend in get_backends():
+        if isinstance(backend, SPARQLBackend):
+            return backend
+    return None
+
+
+def get_endpoint_pool(sparql_endpoint: str):
+    """get_endpoint_pool - EndpointPool requests to sparql_endpoint are balanced by"""
+    backend = get_sparql_backend()
+    if backend is None or backend.pool is None or sparql_endpoint not in backend.pool:
+        return None
+    return backend.pool
@@ -0,0 +1,489 @@
+import functools
+import hashlib
+import heapq
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+from . import config
+from .executor import SingleFlight
+from .metrics import get_metrics
+
+
+def normalize_query(query: str) -> str:
+    """normalize_query - collapse whitespace, so differently indented queries share cache"""
+    return " ".join(query.split())
+
+
+def cache_key(namespace: str, *parts) -> bytes:
+    """cache_key - stable binary key for namespace and JSON-serializable parts"""
+    payload = json.dumps([namespace, *parts], ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+
+class QueryCache:
+    """QueryCache - interface of cache backends
+
+    Keys are bytes from cache_key, values are JSON-serializable objects.
+    None is never stored and means a miss.
+
+    Args:
+        ttl: float - seconds after which entry expires, None to keep forever
+        max_entries: int - maximal number of entries, None for unbounded cache
+        eviction: str - "lru" (least recently used) or "lfu" (least frequently used)
+    """
+
+    EVICTION_POLICIES = ("lru", "lfu")
+
+    def __init__(
+        self, ttl: float = None, max_entries: int = None, eviction: str = "lru"
+    ):
+        if eviction not in self.EVICTION_POLICIES:
+            raise ValueError(
+                f"Wrong eviction policy {eviction}, supported: {self.EVICTION_POLICIES}"
+            )
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.eviction = eviction
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, **counters):
+        with self._stats_lock:
+            self._stats.update(counters)
+
+    def stats(self) -> dict:
+        """stats - hits, misses, evictions and expirations since creation, and current size"""
+        with self._stats_lock:
+            stats = {
+                name: self._stats[name]
+                for name in ("hits", "misses", "evictions", "expirations")
+            }
+        stats["size"] = len(self)
+        return stats
+
+    def _expired_before(self) -> float:
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+    def _evict_to(self) -> int:
+        # evict a tenth at once to not pay eviction cost on every put
+        return int(self.max_entries * 0.9)
+
+    def get(self, key: bytes, count: bool = True):
+        return self.get_many([key], count=count).get(key)
+
+    def put(self, key: bytes, value):
+        self.put_many({key: value})
+
+    def get_many(self, keys, count: bool = True) -> dict:
+        """get_many - stored values of keys, misses are left out
+
+        Args:
+            keys: iterable of bytes
+            count: bool - count hits and misses in stats
+        """
+        raise NotImplementedError
+
+    def put_many(self, items: dict):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class _MemoryEntry:
+    __slots__ = ("value", "created_at", "hits")
+
+    def __init__(self, value, created_at):
+        self.value = value
+        self.created_at = created_at
+        self.hits = 0
+
+
+class MemoryQueryCache(QueryCache):
+    """MemoryQueryCache - process-local cache, mostly for tests and short jobs
+
+    Entries are kept in recency order, so LRU eviction is O(1) per entry.
+    """
+
+    def __init__(
+        self, ttl: float = None, max_entries: int = None, eviction: str = "lru"
+    ):
+        super().__init__(ttl=ttl, max_entries=max_entries, eviction=eviction)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys, count: bool = True) -> dict:
+        keys = list(keys)
+        expired_before = self._expired_before()
+        result = {}
+        expired = 0
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                if entry.created_at < expired_before:
+                    del self._data[key]
+                    expired += 1
+                    continue
+                entry.hits += 1
+                self._data.move_to_end(key)
+                result[key] = entry.value
+        if count:
+            self._count(hits=len(result), misses=len(keys) - len(result))
+        self._count(expirations=expired)
+        return result
+
+    def put_many(self, items: dict):
+        now = time.time()
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = _MemoryEntry(value, now)
+                self._data.move_to_end(key)
+            evicted = self._evict()
+        self._count(evictions=evicted)
+
+    def _evict(self) -> int:
+        if self.max_entries is None or len(self._data) <= self.max_entries:
+            return 0
+
+        to_evict = len(self._data) - self._evict_to()
+        if self.eviction == "lru":
+            keys = [key for key, _ in zip(self._data, range(to_evict))]
+        else:
+            keys = heapq.nsmallest(
+                to_evict, self._data, key=lambda key: self._data[key].hits
+            )
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteQueryCache(QueryCache):
+    """SQLiteQueryCache - single-file indexed cache
+
+    Values are stored as zlib-compressed JSON in one SQLite table in WAL mode,
+    so many threads and processes can read and write it concurrently.
+    Every thread of every process keeps its own connection.
+    get_many and put_many run in one transaction.
+    Access time and hit count are tracked only for bounded caches,
+    unbounded ones do not pay for writes on reads.
+
+    Args:
+        path: str - path to the database file
+        compression_level: int - zlib compression level
+        ttl, max_entries, eviction - see QueryCache, default config.CACHE_TTL,
+            config.CACHE_MAX_ENTRIES and config.CACHE_EVICTION
+    """
+
+    _SQLITE_MAX_VARIABLES = 900
+    _EVICTION_CHECK_INTERVAL = 1000
+
+    def __init__(
+        self,
+        path: str,
+        compression_level: int = 6,
+        ttl: float = None,
+        max_entries: int = None,
+        eviction: str = "lru",
+    ):
+        super().__init__(ttl=ttl, max_entries=max_entries, eviction=eviction)
+        self.path = str(path)
+        self.compression_level = compression_level
+        self._local = threading.local()
+        self._puts_since_eviction_check = 0
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._create_schema(self._connection())
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _create_schema(connection):
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key BLOB PRIMARY KEY, value BLOB NOT NULL)"
+        )
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(cache)")}
+        for column, definition in (
+            ("created_at", "REAL NOT NULL DEFAULT 0"),
+            ("accessed_at", "REAL NOT NULL DEFAULT 0"),
+            ("hits", "INTEGER NOT NULL DEFAULT 0"),
+        ):
+            if column not in columns:
+                connection.execute(
+                    f"ALTER TABLE cache ADD COLUMN {column} {definition}"
+                )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS cache_hits ON cache (hits)")
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_created_at ON cache (created_at)"
+        )
+
+    def _dumps(self, value) -> bytes:
+        return zlib.compress(
+            json.dumps(value, ensure_ascii=False).encode("utf-8"),
+            self.compression_level,
+        )
+
+    @staticmethod
+    def _loads(value: bytes):
+        return json.loads(zlib.decompress(value).decode("utf-8"))
+
+    @staticmethod
+    def _chunks(keys, size):
+        for start in range(0, len(keys), size):
+            yield keys[start : start + size]
+
+    def get_many(self, keys, count: bool = True) -> dict:
+        keys = list(keys)
+        connection = self._connection()
+        expired_before = self._expired_before()
+        result = {}
+        expired = []
+        for chunk in self._chunks(keys, self._SQLITE_MAX_VARIABLES):
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT key, value, created_at FROM cache WHERE key IN ({placeholders})",
+                chunk,
+            )
+            for key, value, created_at in rows:
+                if created_at < expired_before:
+                    expired.append(key)
+                else:
+                    result[bytes(key)] = self._loads(value)
+
+        if expired:
+            self._delete(connection, expired)
+        if result and self.max_entries is not None:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany(
+                    "UPDATE cache SET accessed_at = ?, hits = hits + 1 WHERE key = ?",
+                    [(time.time(), key) for key in result],
+                )
+
+        if count:
+            self._count(hits=len(result), misses=len(keys) - len(result))
+        self._count(expirations=len(expired))
+        return result
+
+    def _delete(self, connection, keys):
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "DELETE FROM cache WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def put_many(self, items: dict):
+        now = time.time()
+        rows = [(key, self._dumps(value), now, now) for key, value in items.items()]
+        if not rows:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+        self._puts_since_eviction_check += len(rows)
+        if self.max_entries is not None and self._puts_since_eviction_check >= min(
+            self._EVICTION_CHECK_INTERVAL, self.max_entries // 10 + 1
+        ):
+            self._puts_since_eviction_check = 0
+            self.evict()
+
+    def evict(self) -> int:
+        """evict - drop expired entries and shrink cache below max_entries
+
+        Called automatically from put_many, can be called manually,
+        for example from a periodic maintenance job.
+
+        Returns:
+            int - number of removed entries
+        """
+        connection = self._connection()
+        removed = 0
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if self.ttl is not None:
+                removed += connection.execute(
+                    "DELETE FROM cache WHERE created_at < ?", (self._expired_before(),)
+                ).rowcount
+            size = connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if self.max_entries is not None and size > self.max_entries:
+                order = "accessed_at" if self.eviction == "lru" else "hits, accessed_at"
+                evicted = connection.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    f"(SELECT key FROM cache ORDER BY {order} LIMIT ?)",
+                    (size - self._evict_to(),),
+                ).rowcount
+                self._count(evictions=evicted)
+                removed += evicted
+        return removed
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+# None is a valid ttl and max_entries, so defaults are marked by _CONFIG
+_CONFIG = object()
+
+
+def create_cache(
+    backend: str = None,
+    path: str = None,
+    ttl: float = _CONFIG,
+    max_entries: int = _CONFIG,
+    eviction: str = None,
+) -> QueryCache:
+    """create_cache - cache backend by name
+
+    Args:
+        backend: str - "sqlite" or "memory", default config.CACHE_BACKEND
+        path: str - database file for sqlite backend, default in config.DEFAULT_CACHE_PATH
+        ttl, max_entries, eviction - see QueryCache, default config.CACHE_TTL,
+            config.CACHE_MAX_ENTRIES and config.CACHE_EVICTION
+
+    Returns:
+        QueryCache
+    """
+    backend = backend or config.CACHE_BACKEND
+    limits = dict(
+        ttl=config.CACHE_TTL if ttl is _CONFIG else ttl,
+        max_entries=config.CACHE_MAX_ENTRIES if max_entries is _CONFIG else max_entries,
+        eviction=eviction or config.CACHE_EVICTION,
+    )
+    if backend == "sqlite":
+        return SQLiteQueryCache(
+            path or str(Path(config.DEFAULT_CACHE_PATH) / "queries.sqlite"), **limits
+        )
+    if backend == "memory":
+        return MemoryQueryCache(**limits)
+    raise ValueError(f"Wrong cache backend {backend}, supported: sqlite, memory")
+
+
+_lock = threading.Lock()
+_cache = None
+
+
+def get_cache() -> QueryCache:
+    """get_cache - process-wide cache backend, created on first use"""
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = create_cache()
+        return _cache
+
+
+def set_cache(cache: QueryCache):
+    """set_cache - replace process-wide cache backend, None to recreate default one"""
+    global _cache
+    with _lock:
+        _cache = cache
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """get_single_flight - process-wide deduplication of in-flight cache misses
+
+    Keys are cache keys, so callers which compute a missing value on their own
+    (like request_many_to_wikidata) can share it with cached functions.
+    """
+    return _single_flight
+
+
+def cached(namespace: str, normalize: dict = None):
+    """cached - memoize function results in the process-wide cache backend
+
+    Key is built from namespace and all bound arguments, including defaults.
+    Concurrent calls that miss the cache with the same key wait for one
+    execution of the function (single-flight).
+    Hits and misses are counted in metrics under namespace.
+    Decorated function gets key(*args, **kwargs) helper and original
+    function in __wrapped__.
+
+    Args:
+        namespace: str - prefix that separates functions in one cache
+        normalize: dict - argument name -> function applied before hashing
+    """
+    normalize = normalize or {}
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def key(*args, **kwargs) -> bytes:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            parts = [
+                normalize[name](value) if name in normalize else value
+                for name, value in bound.arguments.items()
+            ]
+            return cache_key(namespace, *parts)
+
+        def load(cache, k, args, kwargs):
+            # a call which finished after our cache miss has already stored it,
+            # the miss is counted once, by the wrapper
+            value = cache.get(k, count=False)
+            if value is None:
+                value = wrapper.__wrapped__(*args, **kwargs)
+                cache.put(k, value)
+            return value
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            k = key(*args, **kwargs)
+            value = cache.get(k)
+            hit = value is not None
+            get_metrics().observe_cache(namespace, hits=int(hit), misses=int(not hit))
+            if not hit:
+                value = _single_flight.do(k, load, cache, k, args, kwargs)
+            return value
+
+        wrapper.key = key
+        return wrapper
+
+    return decorator
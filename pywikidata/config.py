@@ -1,8 +1,119 @@
 from pathlib import Path
 import os
 
+
+def _optional_env(name, type_):
+    value = os.environ.get(name)
+    return type_(value) if value else None
+
+
+def _flag_env(name, default: bool) -> bool:
+    value = os.environ.get(name)
+    return value.lower() in ("1", "true", "yes") if value else default
+
+
+def _split(value: str) -> list:
+    return value.split(",")
+
+
+def _user_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return str(Path(base) / "pywikidata")
+
+
 SPARQL_ENDPOINT = os.environ.get("SPARQL_ENDPOINT", "https://query.wikidata.org/sparql")
+# mirrors of SPARQL_ENDPOINT requests are balanced across, comma-separated
+SPARQL_MIRRORS = _optional_env("PYWIKIDATA_SPARQL_MIRRORS", _split)
 WIKIDATA_URI = os.environ.get("WIKIDATA_URI", "https://www.wikidata.org/")
-DEFAULT_CACHE_PATH = str(Path(__file__).parent / ".." / ".cache")
+# $XDG_CACHE_HOME/pywikidata, ~/.cache/pywikidata without it
+DEFAULT_CACHE_PATH = os.environ.get("PYWIKIDATA_CACHE_PATH") or _user_cache_dir()
+CACHE_BACKEND = os.environ.get("PYWIKIDATA_CACHE_BACKEND", "sqlite")
+CACHE_TTL = _optional_env("PYWIKIDATA_CACHE_TTL", float)
+CACHE_MAX_ENTRIES = _optional_env("PYWIKIDATA_CACHE_MAX_ENTRIES", int)
+CACHE_EVICTION = os.environ.get("PYWIKIDATA_CACHE_EVICTION", "lru")
+
+ENTITY_REGISTRY_MODE = os.environ.get("PYWIKIDATA_ENTITY_REGISTRY_MODE", "strong")
+ENTITY_REGISTRY_MAX_SIZE = _optional_env("PYWIKIDATA_ENTITY_REGISTRY_MAX_SIZE", int)
+ENTITY_HYDRATION = os.environ.get("PYWIKIDATA_ENTITY_HYDRATION", "off")
+
+ATTRIBUTES_KEYS = _optional_env("PYWIKIDATA_ATTRIBUTES_KEYS", _split)
+ATTRIBUTES_LANGUAGES = _optional_env("PYWIKIDATA_ATTRIBUTES_LANGUAGES", _split)
+ATTRIBUTES_KEEP_QUALIFIERS = _flag_env("PYWIKIDATA_ATTRIBUTES_KEEP_QUALIFIERS", True)
+ATTRIBUTES_KEEP_REFERENCES = _flag_env("PYWIKIDATA_ATTRIBUTES_KEEP_REFERENCES", True)
+ATTRIBUTES_COMPACT_CLAIMS = _flag_env("PYWIKIDATA_ATTRIBUTES_COMPACT_CLAIMS", False)
+
+# empty PYWIKIDATA_LOG_FILE disables the log file
+LOG_FILENAME = os.environ.get("PYWIKIDATA_LOG_FILE", "log.json") or None
+
+SPARQL_VALUES_CHUNK_SIZE = int(os.environ.get("SPARQL_VALUES_CHUNK_SIZE", 500))
+SPARQL_PAGE_SIZE = int(os.environ.get("PYWIKIDATA_SPARQL_PAGE_SIZE", 10000))
+WBGETENTITIES_BATCH_SIZE = int(
+    os.environ.get("PYWIKIDATA_WBGETENTITIES_BATCH_SIZE", 50)
+)
+
+MAX_WORKERS = int(os.environ.get("PYWIKIDATA_MAX_WORKERS", 5))
+REQUESTS_PER_SECOND = float(os.environ.get("PYWIKIDATA_REQUESTS_PER_SECOND", 10))
+MAX_RETRY_AFTER = float(os.environ.get("PYWIKIDATA_MAX_RETRY_AFTER", 60))
+
+HTTP_TIMEOUT = float(os.environ.get("PYWIKIDATA_HTTP_TIMEOUT", 65))
+HTTP_RETRIES = int(os.environ.get("PYWIKIDATA_HTTP_RETRIES", 3))
+
+OFFLINE_INDEX_PATH = os.environ.get("PYWIKIDATA_OFFLINE_INDEX")
+SNAPSHOT_PATH = os.environ.get("PYWIKIDATA_SNAPSHOT")
+LABEL_INDEX_PATH = os.environ.get("PYWIKIDATA_LABEL_INDEX")
+
+
+_KEEP = object()
+
+
+def configure(
+    sparql_endpoint: str = None,
+    sparql_mirrors=None,
+    wikidata_uri: str = None,
+    cache_backend: str = None,
+    cache_path: str = None,
+    log_file=_KEEP,
+    log_level=None,
+    log_console: bool = None,
+):
+    """configure - set up pywikidata in code instead of environment variables
+
+    Nothing is created here: the cache, HTTP session and log handlers are
+    created on first use with these settings. An already created cache
+    is replaced on the next request.
+
+    Example:
+        pywikidata.configure(cache_backend="memory", log_file=None)
+
+    Args:
+        sparql_endpoint: str - SPARQL endpoint URL
+        sparql_mirrors: list of str - mirrors of the endpoint, [] for none;
+            both reset query backends to the default chain (see backends)
+        wikidata_uri: str - Wikidata URL for the MediaWiki API
+        cache_backend: str - "sqlite" or "memory"
+        cache_path: str - directory of the sqlite cache
+        log_file: str - JSON lines log file, None to not write a file
+        log_level: int or str - level of pywikidata logger, e.g. logging.INFO
+        log_console: bool - print log records to stdout
+    """
+    global SPARQL_ENDPOINT, SPARQL_MIRRORS, WIKIDATA_URI
+    global CACHE_BACKEND, DEFAULT_CACHE_PATH
+    from .backends import set_backends
+    from .cache import set_cache
+    from .logger import configure_logging
 
-LOG_FILENAME = "log.json"
+    if sparql_endpoint is not None:
+        SPARQL_ENDPOINT = sparql_endpoint
+    if sparql_mirrors is not None:
+        SPARQL_MIRRORS = list(sparql_mirrors) or None
+    if sparql_endpoint is not None or sparql_mirrors is not None:
+        set_backends(None)
+    if wikidata_uri is not None:
+        WIKIDATA_URI = wikidata_uri
+    if cache_backend is not None or cache_path is not None:
+        CACHE_BACKEND = cache_backend or CACHE_BACKEND
+        DEFAULT_CACHE_PATH = cache_path or DEFAULT_CACHE_PATH
+        set_cache(None)
+    if log_file is not _KEEP or log_level is not None or log_console is not None:
+        kwargs = {} if log_file is _KEEP else {"filename": log_file}
+        configure_logging(level=log_level, console=log_console, **kwargs)
@@ -0,0 +1,387 @@
+import bz2
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+
+from .logger import get_logger
+
+logger = get_logger()
+
+_ENTITY_ID = re.compile(r"[PQ][0-9]+")
+
+
+def open_dump(path: str):
+    """open_dump - open Wikidata JSON dump as binary stream, .bz2 and .gz are decompressed on the fly
+
+    "-" reads the dump from stdin, for example decompressed by parallel lbzip2.
+    """
+    path = str(path)
+    if path == "-":
+        return open(sys.stdin.fileno(), "rb", closefd=False)
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def parse_dump_line(line: bytes):
+    """parse_dump_line - entity JSON from one line of the dump, None for the array brackets
+
+    Dump is one JSON array with one entity per line:
+    [
+    {"type":"item","id":"Q1",...},
+    {"type":"item","id":"Q8",...}
+    ]
+    """
+    line = line.strip()
+    if line.endswith(b","):
+        line = line[:-1]
+    if not line or line in (b"[", b"]"):
+        return None
+    return json.loads(line)
+
+
+def iter_dump_entities(path: str):
+    """iter_dump_entities - stream entities from Wikidata JSON dump one by one"""
+    with open_dump(path) as dump:
+        for line in dump:
+            entity = parse_dump_line(line)
+            if entity is not None:
+                yield entity
+
+
+def _filter_languages(values: dict, languages) -> dict:
+    if languages is None:
+        return values
+    return {lang: value for lang, value in values.items() if lang in languages}
+
+
+def compact_record(
+    entity: dict,
+    languages=("en",),
+    properties=None,
+    keep_qualifiers: bool = True,
+    keep_references: bool = False,
+) -> dict:
+    """compact_record - shrink entity JSON from the dump
+
+    Sitelinks are dropped, labels, descriptions and aliases are reduced
+    to plain strings of the selected languages, claims are kept
+    in Wikibase JSON format without references.
+
+    Args:
+        entity: dict - entity JSON from the dump or Special:EntityData
+        languages: collection of language codes to keep, None for all
+        properties: collection of property ids to keep in claims, None for all
+        keep_qualifiers: bool - keep qualifiers of statements
+        keep_references: bool - keep references of statements
+
+    Returns:
+        dict - compact record
+    """
+    claims = {}
+    for prop_id, statements in (entity.get("claims") or {}).items():
+        if properties is not None and prop_id not in properties:
+            continue
+        compact_statements = []
+        for statement in statements:
+            statement = dict(statement)
+            statement.pop("id", None)
+            if not keep_references:
+                statement.pop("references", None)
+            if not keep_qualifiers:
+                statement.pop("qualifiers", None)
+                statement.pop("qualifiers-order", None)
+            compact_statements.append(statement)
+        claims[prop_id] = compact_statements
+
+    return {
+        "id": entity["id"],
+        "type": entity.get("type"),
+        "labels": {
+            lang: value["value"]
+            for lang, value in _filter_languages(
+                entity.get("labels") or {}, languages
+            ).items()
+        },
+        "descriptions": {
+            lang: value["value"]
+            for lang, value in _filter_languages(
+                entity.get("descriptions") or {}, languages
+            ).items()
+        },
+        "aliases": {
+            lang: [value["value"] for value in values]
+            for lang, values in _filter_languages(
+                entity.get("aliases") or {}, languages
+            ).items()
+        },
+        "claims": claims,
+    }
+
+
+def truthy_statements(statements: list) -> list:
+    """truthy_statements - statements visible through wdt: properties
+
+    https://www.mediawiki.org/wiki/Wikibase/Indexing/RDF_Dump_Format#Truthy_statements
+
+    Preferred statements if there are any, otherwise normal ones,
+    deprecated statements are never truthy.
+    """
+    preferred = [s for s in statements if s.get("rank") == "preferred"]
+    if preferred:
+        return preferred
+    return [s for s in statements if s.get("rank", "normal") == "normal"]
+
+
+def snak_value(snak: dict):
+    """snak_value - (datatype, value) of main snak, None for somevalue/novalue snaks"""
+    if snak.get("snaktype") != "value":
+        return None
+    datavalue = snak["datavalue"]
+    return datavalue["type"], datavalue["value"]
+
+
+def entity_edges(record: dict):
+    """entity_edges - truthy (property id, entity id) pairs of record claims"""
+    for prop_id, statements in record["claims"].items():
+        for statement in truthy_statements(statements):
+            value = snak_value(statement.get("mainsnak") or {})
+            if value is None or value[0] != "wikibase-entityid":
+                continue
+            target = entity_id_from_value(value[1])
+            if target is not None and _ENTITY_ID.fullmatch(target):
+                yield prop_id, target
+
+
+def entity_id_from_value(value: dict):
+    """entity_id_from_value - id of wikibase-entityid datavalue, old dumps have only numeric-id"""
+    if "id" in value:
+        return value["id"]
+    prefix = {"item": "Q", "property": "P"}.get(value.get("entity-type"))
+    if prefix is None or "numeric-id" not in value:
+        return None
+    return f"{prefix}{value['numeric-id']}"
+
+
+def iter_dump_chunks(stream, chunk_size: int, offset: int = 0):
+    """iter_dump_chunks - split dump stream into line-aligned chunks
+
+    Yields:
+        (offset, chunk) - position of chunk in the decompressed stream and its bytes
+    """
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        if not chunk.endswith(b"\n"):
+            chunk += stream.readline()
+        yield offset, chunk
+        offset += len(chunk)
+
+
+def _skip(stream, offset: int):
+    try:
+        stream.seek(offset)
+    except (OSError, io.UnsupportedOperation):
+        while offset > 0:
+            skipped = len(stream.read(min(offset, 1 << 24)))
+            if skipped == 0:
+                break
+            offset -= skipped
+
+
+def _parse_chunk(chunk: bytes, options: dict):
+    records = []
+    entities = 0
+    for line in chunk.splitlines():
+        entity = parse_dump_line(line)
+        if entity is None:
+            continue
+        entities += 1
+        if entity.get("type") not in options["entity_types"]:
+            continue
+        if options["require_instance_of"] and not (entity.get("claims") or {}).get(
+            "P31"
+        ):
+            continue
+        if options["entity_filter"] is not None and not options["entity_filter"](
+            entity
+        ):
+            continue
+        records.append(
+            compact_record(
+                entity,
+                languages=options["languages"],
+                properties=options["properties"],
+                keep_qualifiers=options["keep_qualifiers"],
+            )
+        )
+    return records, entities
+
+
+class DumpPipeline:
+    """DumpPipeline - parallel streaming parser of Wikidata JSON dump
+
+    The dump is read sequentially and split into line-aligned chunks,
+    chunks are parsed and filtered by a pool of processes, compact records
+    are yielded in dump order. Only a bounded number of chunks is in flight,
+    so memory does not depend on dump size.
+
+    Decompression of .bz2 is single-threaded and slow, for full dumps pipe the
+    output of a parallel decompressor to stdin and pass "-" as path.
+
+    With checkpoint_path the decompressed offset of the last fully consumed chunk
+    is saved after every chunk and a new pipeline with the same checkpoint continues
+    from it, so records of a partially consumed chunk can be yielded twice.
+    A checkpoint of another dump raises ValueError.
+    Throughput of the current run is logged every report_every seconds and
+    available in stats.
+
+    Args:
+        path: str - dump path or "-" for stdin
+        languages: collection of language codes to keep, None for all
+        properties: collection of property ids to keep in claims, None for all
+        require_instance_of: bool - keep only entities with P31 statements
+        entity_types: collection of entity types to keep
+        entity_filter: callable(entity JSON) -> bool, must be picklable (module-level function)
+        keep_qualifiers: bool - keep qualifiers of statements
+        processes: int - number of parser processes, 0 to parse in the current process
+        chunk_size: int - approximate chunk size in bytes
+        checkpoint_path: str - JSON file with progress for resuming
+        report_every: float - seconds between throughput log messages
+    """
+
+    def __init__(
+        self,
+        path: str,
+        languages=("en",),
+        properties=None,
+        require_instance_of: bool = False,
+        entity_types=("item", "property"),
+        entity_filter=None,
+        keep_qualifiers: bool = True,
+        processes: int = None,
+        chunk_size: int = 32 * 1024 * 1024,
+        checkpoint_path: str = None,
+        report_every: float = 60.0,
+    ):
+        self.path = str(path)
+        self.options = {
+            "languages": set(languages) if languages is not None else None,
+            "properties": set(properties) if properties is not None else None,
+            "require_instance_of": require_instance_of,
+            "entity_types": tuple(entity_types),
+            "entity_filter": entity_filter,
+            "keep_qualifiers": keep_qualifiers,
+        }
+        self.processes = os.cpu_count() if processes is None else processes
+        self.chunk_size = chunk_size
+        self.checkpoint_path = checkpoint_path
+        self.report_every = report_every
+        self.entities = 0
+        self.records = 0
+        self.bytes = 0
+        self._started_at = None
+        self._resumed_bytes = 0
+        self._resumed_entities = 0
+
+    @property
+    def stats(self) -> dict:
+        seconds = time.monotonic() - self._started_at if self._started_at else 0.0
+        processed = self.bytes - self._resumed_bytes
+        entities = self.entities - self._resumed_entities
+        return {
+            "entities": self.entities,
+            "records": self.records,
+            "bytes": self.bytes,
+            "seconds": seconds,
+            "entities_per_second": entities / seconds if seconds else 0.0,
+            "mb_per_second": processed / seconds / 2**20 if seconds else 0.0,
+        }
+
+    @staticmethod
+    def _same_dump(a: str, b: str) -> bool:
+        if "-" in (a, b):
+            return a == b
+        return os.path.abspath(a) == os.path.abspath(b)
+
+    def _load_checkpoint(self) -> dict:
+        if self.checkpoint_path is None or not os.path.exists(self.checkpoint_path):
+            return {"offset": 0, "entities": 0, "records": 0}
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if not self._same_dump(checkpoint.get("path", self.path), self.path):
+            raise ValueError(
+                f"Checkpoint {self.checkpoint_path} belongs to dump "
+                f"{checkpoint['path']}, not {self.path}"
+            )
+        return checkpoint
+
+    def _save_checkpoint(self):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        path = self.path if self.path == "-" else os.path.abspath(self.path)
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "path": path,
+                    "offset": self.bytes,
+                    "entities": self.entities,
+                    "records": self.records,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _results(self, chunks):
+        if self.processes <= 1:
+            for _, chunk in chunks:
+                yield len(chunk), _parse_chunk(chunk, self.options)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self.processes) as pool:
+            in_flight = deque()
+            for _, chunk in chunks:
+                in_flight.append(
+                    (len(chunk), pool.submit(_parse_chunk, chunk, self.options))
+                )
+                if len(in_flight) >= 2 * self.processes:
+                    size, future = in_flight.popleft()
+                    yield size, future.result()
+            while in_flight:
+                size, future = in_flight.popleft()
+                yield size, future.result()
+
+    def __iter__(self):
+        checkpoint = self._load_checkpoint()
+        self.bytes = self._resumed_bytes = checkpoint["offset"]
+        self.entities = self._resumed_entities = checkpoint["entities"]
+        self.records = checkpoint["records"]
+        self._started_at = time.monotonic()
+        reported_at = self._started_at
+
+        with open_dump(self.path) as dump:
+            if self.bytes:
+                _skip(dump, self.bytes)
+            chunks = iter_dump_chunks(dump, self.chunk_size, offset=self.bytes)
+            for size, (records, entities) in self._results(chunks):
+                yield from records
+
+                self.bytes += size
+                self.entities += entities
+                self.records += len(records)
+                if self.checkpoint_path is not None:
+                    self._save_checkpoint()
+                if time.monotonic() - reported_at >= self.report_every:
+                    reported_at = time.monotonic()
+                    logger.info({"msg": "Dump processing progress", **self.stats})
+
+        logger.info({"msg": "Dump processing finished", **self.stats})
@@ -1,22 +1,147 @@
+import functools
+import json
 import re
-from .utils import request_to_wikidata
+import threading
+import time
+from array import array
+from collections import namedtuple
+from .utils import (
+    get_many_wd_search_results,
+    iter_request_to_wikidata,
+    request_to_wikidata,
+    request_many_to_wikidata,
+)
 from .attributes import _WikidataAttributes
+from .config import ENTITY_HYDRATION, SPARQL_PAGE_SIZE, SPARQL_VALUES_CHUNK_SIZE
+from .registry import EntityRegistry
+from .dump import compact_record
+from .executor import SingleFlight
+from .offline import decode_id, encode_id, record_field_bindings
+from .snapshot import EntitySnapshot, get_snapshot
+from .backends import SPARQL, route, set_backends
+from .logger import get_logger
+
+logger = get_logger()
+
+_ENTITY_ID = re.compile(r"[PQ][0-9]+")
+
+NeighbourColumns = namedtuple(
+    "NeighbourColumns", ["properties", "neighbours", "instance_of"]
+)
+
+# variables which identify a row of neighbours queries, their pages are keyset ones
+_NEIGHBOUR_ORDER = ("?property", "?object", "?instance_of")
+
+
+@functools.lru_cache(maxsize=2**16)
+def _parse_neighbour_uri(uri: str):
+    """_parse_neighbour_uri - entity id of binding URI, None for other values"""
+    entity_id = uri.split("/")[-1]
+    return entity_id if _ENTITY_ID.fullmatch(entity_id) else None
+
+
+@functools.lru_cache(maxsize=2**16)
+def _neighbour_key(uri: str):
+    """_neighbour_key - encoded entity id of binding URI, None for other values"""
+    entity_id = _parse_neighbour_uri(uri)
+    return encode_id(entity_id) if entity_id is not None else None
+
+
+class _EmptyList(list):
+    """_EmptyList - immutable empty list shared by all entities without values"""
+
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("Shared empty list of Entity field can not be changed")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _immutable
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+
+
+_EMPTY = _EmptyList()
+
+
+def _unshared(value):
+    """_unshared - fresh empty list instead of _EMPTY, for public field access"""
+    return [] if value is _EMPTY else value
+
+
+# loads of one field of one entity are shared by concurrent callers,
+# all writes to entity slots go through one lock
+_field_flights = SingleFlight()
+_slots_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=2**16)
+def _superclass_ids(class_id: str) -> frozenset:
+    """_superclass_ids - class and its P279* ancestors, one cached request per class"""
+    responce = Entity._request_superclasses(class_id)
+    return frozenset(
+        [class_id] + [Entity._entity_uri_to_id(r["class"]["value"]) for r in responce]
+    )
+
+
+def _answered_locally(name: str) -> bool:
+    """_answered_locally - request method name is routed to a backend without SPARQL"""
+    return SPARQL not in route(name).capabilities
+
+
+def _dispatch(request):
+    """_dispatch - answer request by the query backend it is routed to
+
+    Requests routed to a SPARQL backend send their query,
+    the others are answered by method name (see backends.route).
+    """
+
+    @functools.wraps(request)
+    def wrapper(cls, *args):
+        backend = route(request.__name__)
+        if SPARQL in backend.capabilities:
+            return request(cls, *args)
+        return backend.request(request.__name__, *args)
+
+    return wrapper
 
 
 class _WikiDataBase:
+    __slots__ = ()
+
     @staticmethod
     def _entity_uri_to_id(uri):
         return uri.split("/")[-1]
 
     @staticmethod
     def _validate_entity_id(entity_id):
-        return re.fullmatch(r"[P|Q][0-9]+", entity_id) is not None
+        return _ENTITY_ID.fullmatch(entity_id) is not None
+
+    @staticmethod
+    def _values_clause(entity_ids):
+        return " ".join(f"wd:{entity_id}" for entity_id in entity_ids)
+
+    @staticmethod
+    def _literal_values_clause(values, language):
+        # JSON string escapes are valid SPARQL string escapes
+        return " ".join(
+            f"{json.dumps(value, ensure_ascii=False)}@{language}" for value in values
+        )
+
+    @staticmethod
+    def _property_values(property_uris):
+        if property_uris is None:
+            return ""
+        if isinstance(property_uris, str):
+            property_uris = [property_uris]
+        uris = " ".join(f"<{uri}>" for uri in property_uris)
+        return f"VALUES ?property {{ {uris} }}"
 
 
 class _WikiDataSPARQLBase(_WikiDataBase):
+    __slots__ = ()
+
     @staticmethod
-    def _request_one_hop_neighbours(entity_id):
-        query = """
+    def _query_one_hop_neighbours(entity_id):
+        return """
         PREFIX wd: <http://www.wikidata.org/entity/>
         PREFIX schema: <http://schema.org/>
         PREFIX wikibase: <http://wikiba.se/ontology#>
@@ -27,12 +152,14 @@ class _WikiDataSPARQLBase(_WikiDataBase):
             "<ENTITY>", entity_id
         )
 
-        responce = request_to_wikidata(query)
-        return responce
+    @classmethod
+    @_dispatch
+    def _request_one_hop_neighbours(cls, entity_id):
+        return request_to_wikidata(cls._query_one_hop_neighbours(entity_id))
 
     @staticmethod
-    def _request_one_hop_neighbours_with_instance_of(entity_id):
-        query = """
+    def _query_one_hop_neighbours_with_instance_of(entity_id):
+        return """
         PREFIX wd: <http://www.wikidata.org/entity/>
         PREFIX wdt: <http://www.wikidata.org/prop/direct/>
 
@@ -49,46 +176,80 @@ class _WikiDataSPARQLBase(_WikiDataBase):
             "<ENTITY>", entity_id
         )
 
-        responce = request_to_wikidata(query)
-        return responce
+    @classmethod
+    @_dispatch
+    def _request_one_hop_neighbours_with_instance_of(cls, entity_id):
+        return request_to_wikidata(
+            cls._query_one_hop_neighbours_with_instance_of(entity_id)
+        )
 
     @staticmethod
-    def _request_forward_one_hop_neighbours_with_instance_of(entity_id):
-        query = """
+    def _query_forward_one_hop_neighbours_with_instance_of(
+        entity_id, property_uri=None
+    ):
+        return """
         PREFIX wd: <http://www.wikidata.org/entity/>
         PREFIX wdt: <http://www.wikidata.org/prop/direct/>
 
         SELECT DISTINCT ?property ?object ?instance_of WHERE {
+            <PROPERTY_VALUES>
             wd:<ENTITY> ?property ?object .
             ?object wdt:P31 ?instance_of
         }
-        """.replace(
-            "<ENTITY>", entity_id
+        """.replace("<ENTITY>", entity_id).replace(
+            "<PROPERTY_VALUES>", _WikiDataBase._property_values(property_uri)
         )
 
-        responce = request_to_wikidata(query)
-        return responce
+    @classmethod
+    @_dispatch
+    def _request_forward_one_hop_neighbours_with_instance_of(cls, entity_id):
+        query = cls._query_forward_one_hop_neighbours_with_instance_of(entity_id)
+        return list(iter_request_to_wikidata(query, order_by=_NEIGHBOUR_ORDER))
 
     @staticmethod
-    def _request_backward_one_hop_neighbours_with_instance_of(entity_id):
-        query = """
+    def _query_backward_one_hop_neighbours_with_instance_of(
+        entity_id, property_uri=None
+    ):
+        return """
         PREFIX wd: <http://www.wikidata.org/entity/>
         PREFIX wdt: <http://www.wikidata.org/prop/direct/>
 
         SELECT DISTINCT ?property ?object ?instance_of WHERE {
+            <PROPERTY_VALUES>
             ?object ?property wd:<ENTITY> .
             ?object wdt:P31 ?instance_of
         }
+        """.replace("<ENTITY>", entity_id).replace(
+            "<PROPERTY_VALUES>", _WikiDataBase._property_values(property_uri)
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_backward_one_hop_neighbours_with_instance_of(cls, entity_id):
+        query = cls._query_backward_one_hop_neighbours_with_instance_of(entity_id)
+        return list(iter_request_to_wikidata(query, order_by=_NEIGHBOUR_ORDER))
+
+    @staticmethod
+    def _query_one_hop_properties(entity_id, direction):
+        pattern = {
+            "forward": "wd:<ENTITY> ?property ?object .",
+            "backward": "?object ?property wd:<ENTITY> .",
+        }[direction]
+        return """
+        PREFIX wd: <http://www.wikidata.org/entity/>
+
+        SELECT DISTINCT ?property WHERE {
+            <PATTERN>
+        }
         """.replace(
+            "<PATTERN>", pattern
+        ).replace(
             "<ENTITY>", entity_id
         )
 
-        responce = request_to_wikidata(query)
-        return responce
-
     @staticmethod
-    def _request_instance_of(entity_id):
-        query = """
+    def _query_instance_of(entity_id):
+        return """
         PREFIX wd: <http://www.wikidata.org/entity/>
         PREFIX wdt: <http://www.wikidata.org/prop/direct/>
         SELECT DISTINCT ?instance_of WHERE {
@@ -98,11 +259,14 @@ class _WikiDataSPARQLBase(_WikiDataBase):
             "<ENTITY>", entity_id
         )
 
-        return request_to_wikidata(query)
+    @classmethod
+    @_dispatch
+    def _request_instance_of(cls, entity_id):
+        return request_to_wikidata(cls._query_instance_of(entity_id))
 
     @staticmethod
-    def _request_subclass_of(entity_id):
-        query = """
+    def _query_subclass_of(entity_id):
+        return """
         PREFIX wd: <http://www.wikidata.org/entity/>
         PREFIX wdt: <http://www.wikidata.org/prop/direct/>
         SELECT DISTINCT ?subclass_of WHERE {
@@ -112,11 +276,90 @@ class _WikiDataSPARQLBase(_WikiDataBase):
             "<ENTITY>", entity_id
         )
 
-        return request_to_wikidata(query)
+    @classmethod
+    @_dispatch
+    def _request_subclass_of(cls, entity_id):
+        return request_to_wikidata(cls._query_subclass_of(entity_id))
+
+    @staticmethod
+    def _query_edges_batch(pattern, entity_ids, property_uris=None, limit=None):
+        """_query_edges_batch - edges matching pattern of all entity_ids
+
+        With limit every entity gets its own LIMIT subquery, so a hub
+        returns limit rows instead of all its edges.
+        """
+        where = """
+            VALUES ?entity { <ENTITIES> }
+            <PROPERTY_VALUES>
+            <PATTERN>
+            FILTER(STRSTARTS(STR(?property), "http://www.wikidata.org/prop/direct/"))
+            FILTER(STRSTARTS(STR(?object), "http://www.wikidata.org/entity/"))
+        """.replace(
+            "<PROPERTY_VALUES>", _WikiDataBase._property_values(property_uris)
+        ).replace("<PATTERN>", pattern)
+        if limit is None:
+            body = where.replace("<ENTITIES>", _WikiDataBase._values_clause(entity_ids))
+        else:
+            body = " UNION ".join(
+                "{ SELECT ?entity ?property ?object WHERE {"
+                + where.replace("<ENTITIES>", f"wd:{entity_id}")
+                + f"}} LIMIT {limit} }}"
+                for entity_id in entity_ids
+            )
+        return """
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        SELECT ?entity ?property ?object WHERE {<BODY>}
+        """.replace("<BODY>", body)
+
+    @staticmethod
+    def _query_forward_edges_batch(entity_ids, property_uris=None, limit=None):
+        return _WikiDataSPARQLBase._query_edges_batch(
+            "?entity ?property ?object .", entity_ids, property_uris, limit
+        )
+
+    @staticmethod
+    def _query_backward_edges_batch(entity_ids, property_uris=None, limit=None):
+        return _WikiDataSPARQLBase._query_edges_batch(
+            "?object ?property ?entity .", entity_ids, property_uris, limit
+        )
+
+    @staticmethod
+    def _query_superclasses(entity_id):
+        return """
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+        SELECT DISTINCT ?class WHERE {
+            wd:<ENTITY> wdt:P279* ?class
+        }
+        """.replace(
+            "<ENTITY>", entity_id
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_superclasses(cls, entity_id):
+        return request_to_wikidata(cls._query_superclasses(entity_id))
+
+    @staticmethod
+    def _query_type_closure(entity_id):
+        return """
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+        SELECT DISTINCT ?class WHERE {
+            wd:<ENTITY> wdt:P31/wdt:P279* ?class
+        }
+        """.replace(
+            "<ENTITY>", entity_id
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_type_closure(cls, entity_id):
+        return request_to_wikidata(cls._query_type_closure(entity_id))
 
     @staticmethod
-    def _request_label(entity_id):
-        query = """
+    def _query_label(entity_id):
+        return """
         PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
         PREFIX wd: <http://www.wikidata.org/entity/> 
         SELECT DISTINCT ?label
@@ -128,12 +371,14 @@ class _WikiDataSPARQLBase(_WikiDataBase):
             "<ENTITY>", entity_id
         )
 
-        responce = request_to_wikidata(query)
-        return responce
+    @classmethod
+    @_dispatch
+    def _request_label(cls, entity_id):
+        return request_to_wikidata(cls._query_label(entity_id))
 
     @staticmethod
-    def _request_description(entity_id):
-        query = """
+    def _query_description(entity_id):
+        return """
         PREFIX wd: <http://www.wikidata.org/entity/>
         PREFIX schema: <http://schema.org/>
 
@@ -146,12 +391,15 @@ class _WikiDataSPARQLBase(_WikiDataBase):
         """.replace(
             "<ENTITY>", entity_id
         )
-        responce = request_to_wikidata(query)
-        return responce
+
+    @classmethod
+    @_dispatch
+    def _request_description(cls, entity_id):
+        return request_to_wikidata(cls._query_description(entity_id))
 
     @staticmethod
-    def _request_image(entity_id):
-        query = """
+    def _query_image(entity_id):
+        return """
         PREFIX wd: <http://www.wikidata.org/entity/>
 
         SELECT ?image WHERE {
@@ -160,12 +408,56 @@ class _WikiDataSPARQLBase(_WikiDataBase):
         """.replace(
             "<ENTITY>", entity_id
         )
-        responce = request_to_wikidata(query)
-        return responce
+
+    @classmethod
+    @_dispatch
+    def _request_image(cls, entity_id):
+        return request_to_wikidata(cls._query_image(entity_id))
 
     @staticmethod
-    def _request_entity_by_label(label):
-        query = """
+    def _query_card(entity_id):
+        return """
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX schema: <http://schema.org/>
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+
+        SELECT DISTINCT ?field ?value WHERE {
+            {
+                wd:<ENTITY> rdfs:label ?value .
+                FILTER (langMatches( lang(?value), "EN" ) )
+                BIND ("label" AS ?field)
+            } UNION {
+                wd:<ENTITY> schema:description ?value .
+                FILTER ( lang(?value) = "en" )
+                BIND ("description" AS ?field)
+            } UNION {
+                wd:<ENTITY> wdt:P18 ?value .
+                BIND ("image" AS ?field)
+            } UNION {
+                wd:<ENTITY> skos:altLabel ?value .
+                FILTER ( lang(?value) = "en" )
+                BIND ("aliases" AS ?field)
+            } UNION {
+                wd:<ENTITY> wdt:P31 ?value .
+                BIND ("instance_of" AS ?field)
+            } UNION {
+                wd:<ENTITY> wdt:P279 ?value .
+                BIND ("subclass_of" AS ?field)
+            }
+        }
+        """.replace(
+            "<ENTITY>", entity_id
+        )
+
+    @classmethod
+    def _request_card(cls, entity_id):
+        return request_to_wikidata(cls._query_card(entity_id))
+
+    @staticmethod
+    def _query_entity_by_label(label):
+        return """
         PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
         SELECT * WHERE{
             ?item rdfs:label "<LABEL>"@en .
@@ -174,12 +466,31 @@ class _WikiDataSPARQLBase(_WikiDataBase):
             "<LABEL>", label
         )
 
-        responce = request_to_wikidata(query)
-        return responce
+    @classmethod
+    @_dispatch
+    def _request_entity_by_label(cls, label):
+        return request_to_wikidata(cls._query_entity_by_label(label))
 
     @staticmethod
-    def _request_aliases(entity_id):
-        query = """
+    def _query_entity_by_label_batch(labels, language="en"):
+        return """
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        SELECT ?item ?label WHERE {
+            VALUES ?label { <LABELS> }
+            ?item rdfs:label ?label .
+        }
+        """.replace(
+            "<LABELS>", _WikiDataSPARQLBase._literal_values_clause(labels, language)
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_entity_by_label_batch(cls, labels, language="en"):
+        return request_to_wikidata(cls._query_entity_by_label_batch(labels, language))
+
+    @staticmethod
+    def _query_aliases(entity_id):
+        return """
                 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
                 PREFIX wd: <http://www.wikidata.org/entity/> 
                 SELECT DISTINCT ?label
@@ -191,8 +502,122 @@ class _WikiDataSPARQLBase(_WikiDataBase):
             "<ENTITY>", entity_id
         )
 
-        responce = request_to_wikidata(query)
-        return responce
+    @classmethod
+    @_dispatch
+    def _request_aliases(cls, entity_id):
+        return request_to_wikidata(cls._query_aliases(entity_id))
+
+    @staticmethod
+    def _query_label_batch(entity_ids):
+        return """
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        SELECT DISTINCT ?entity ?label
+        WHERE {
+            VALUES ?entity { <ENTITIES> }
+            ?entity rdfs:label ?label .
+            FILTER (langMatches( lang(?label), "EN" ) )
+        }
+        """.replace(
+            "<ENTITIES>", _WikiDataSPARQLBase._values_clause(entity_ids)
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_label_batch(cls, entity_ids):
+        return request_to_wikidata(cls._query_label_batch(entity_ids))
+
+    @staticmethod
+    def _query_description_batch(entity_ids):
+        return """
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        PREFIX schema: <http://schema.org/>
+        SELECT ?entity ?description
+        WHERE {
+            VALUES ?entity { <ENTITIES> }
+            ?entity schema:description ?description.
+            FILTER ( lang(?description) = "en" )
+        }
+        """.replace(
+            "<ENTITIES>", _WikiDataSPARQLBase._values_clause(entity_ids)
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_description_batch(cls, entity_ids):
+        return request_to_wikidata(cls._query_description_batch(entity_ids))
+
+    @staticmethod
+    def _query_image_batch(entity_ids):
+        return """
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        SELECT ?entity ?image WHERE {
+            VALUES ?entity { <ENTITIES> }
+            ?entity wdt:P18 ?image
+        }
+        """.replace(
+            "<ENTITIES>", _WikiDataSPARQLBase._values_clause(entity_ids)
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_image_batch(cls, entity_ids):
+        return request_to_wikidata(cls._query_image_batch(entity_ids))
+
+    @staticmethod
+    def _query_aliases_batch(entity_ids):
+        return """
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        SELECT DISTINCT ?entity ?label
+        WHERE {
+            VALUES ?entity { <ENTITIES> }
+            ?entity skos:altLabel ?label.
+            FILTER ( lang(?label) = "en" )
+        }
+        """.replace(
+            "<ENTITIES>", _WikiDataSPARQLBase._values_clause(entity_ids)
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_aliases_batch(cls, entity_ids):
+        return request_to_wikidata(cls._query_aliases_batch(entity_ids))
+
+    @staticmethod
+    def _query_instance_of_batch(entity_ids):
+        return """
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+        SELECT DISTINCT ?entity ?instance_of WHERE {
+            VALUES ?entity { <ENTITIES> }
+            ?entity wdt:P31 ?instance_of
+        }
+        """.replace(
+            "<ENTITIES>", _WikiDataSPARQLBase._values_clause(entity_ids)
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_instance_of_batch(cls, entity_ids):
+        return request_to_wikidata(cls._query_instance_of_batch(entity_ids))
+
+    @staticmethod
+    def _query_subclass_of_batch(entity_ids):
+        return """
+        PREFIX wd: <http://www.wikidata.org/entity/>
+        PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+        SELECT DISTINCT ?entity ?subclass_of WHERE {
+            VALUES ?entity { <ENTITIES> }
+            ?entity wdt:P279 ?subclass_of
+        }
+        """.replace(
+            "<ENTITIES>", _WikiDataSPARQLBase._values_clause(entity_ids)
+        )
+
+    @classmethod
+    @_dispatch
+    def _request_subclass_of_batch(cls, entity_ids):
+        return request_to_wikidata(cls._query_subclass_of_batch(entity_ids))
 
 
 class Entity(_WikiDataSPARQLBase):
@@ -205,35 +630,243 @@ class Entity(_WikiDataSPARQLBase):
         entity_identifier: str - URI or ID of entity or property, for example: Q90
     """
 
-    __instances = {}
+    __slots__ = (
+        "_key",
+        "_label",
+        "_description",
+        "_image",
+        "_forward_one_hop_neighbours",
+        "_backward_one_hop_neighbours",
+        "_instance_of",
+        "_subclass_of",
+        "_aliases",
+        "_hydrated",
+        "_attributes",
+        "__weakref__",
+    )
+
+    __instances = EntityRegistry()
+    _hydration = ENTITY_HYDRATION
+    _type_hierarchy = None
+    HYDRATION_SOURCES = ("off", "sparql", "entitydata")
 
     def __new__(cls, entity_identifier, *args, **kwargs):
         entity_identifier = Entity.entity_identifier_to_id(entity_identifier)
-        if entity_identifier not in cls.__instances:
-            obj = super(Entity, cls).__new__(cls)
-            cls.__instances[entity_identifier] = obj
-        return cls.__instances[entity_identifier]
+        if not Entity._validate_entity_id(entity_identifier):
+            raise ValueError(
+                f"Wrong entity_identifier, can not be extracted Id for {entity_identifier}"
+            )
+        key = encode_id(entity_identifier)
+        registry = Entity.__instances
+        with registry.lock:
+            obj = registry.get(key)
+            if obj is None:
+                obj = super(Entity, cls).__new__(cls)
+                obj._key = key
+                obj._label = None
+                obj._description = None
+                obj._image = None
+                obj._forward_one_hop_neighbours = None
+                obj._backward_one_hop_neighbours = None
+                obj._instance_of = None
+                obj._subclass_of = None
+                obj._aliases = None
+                obj._hydrated = False
+                obj._attributes = None
+                registry.add(key, obj)
+        return obj
 
     def __init__(self, entity_identifier: str):
-        entity_identifier = Entity.entity_identifier_to_id(entity_identifier)
-        if not hasattr(self, "idx"):
-            if self._validate_entity_id(entity_identifier):
-                self.idx = entity_identifier
-            else:
-                raise ValueError(
-                    f"Wrong entity_identifier, can not be extracted Id for {entity_identifier}"
-                )
+        # the singleton is fully initialized by __new__
+        pass
 
-            self._label = None
-            self._description = None
-            self._image = None
-            self._forward_one_hop_neighbours = None
-            self._backward_one_hop_neighbours = None
-            self._instance_of = None
-            self._subclass_of = None
-            self.is_property = self.idx[0] == "P"
-            self.attributes = _WikidataAttributes(self.idx)
-            self._aliases = None
+    def __reduce__(self):
+        return Entity, (self.idx,)
+
+    @property
+    def idx(self) -> str:
+        return decode_id(self._key)
+
+    @property
+    def is_property(self) -> bool:
+        return bool(self._key & 1)
+
+    @property
+    def attributes(self) -> _WikidataAttributes:
+        if self._attributes is None:
+            self._attributes = _WikidataAttributes(self.idx)
+        return self._attributes
+
+    @staticmethod
+    def configure_registry(mode: str = None, max_size: int = None):
+        """configure_registry - change how Entity singletons are stored
+
+        Already created entities are moved to the new registry.
+        See EntityRegistry for description of modes.
+
+        Args:
+            mode: str - "strong", "weak" or "bounded", default config.ENTITY_REGISTRY_MODE
+            max_size: int - number of recently used entities kept alive in bounded mode,
+                default config.ENTITY_REGISTRY_MAX_SIZE
+        """
+        registry = EntityRegistry(mode, max_size)
+        for obj in Entity.__instances.values():
+            registry.add(obj._key, obj)
+        Entity.__instances = registry
+
+    @staticmethod
+    def registry_stats() -> dict:
+        return Entity.__instances.stats()
+
+    _NEIGHBOUR_FIELDS = ("forward_one_hop_neighbours", "backward_one_hop_neighbours")
+
+    @staticmethod
+    def export_snapshot(path: str, entities=None) -> EntitySnapshot:
+        """export_snapshot - write resolved fields of entities to a snapshot
+
+        Only loaded fields are written, related entities are stored as ids.
+        Workers open the snapshot with snapshot.set_snapshot (or
+        PYWIKIDATA_SNAPSHOT) and read fields from it instead of requesting them.
+
+        Args:
+            path: str - directory of the snapshot, replaced if it exists
+            entities: list of Entity - entities to export, by default all registered
+
+        Returns:
+            EntitySnapshot - opened snapshot
+        """
+        if entities is None:
+            entities = list(Entity.__instances.values())
+        records = (entity._snapshot_record() for entity in entities)
+        return EntitySnapshot.build((r for r in records if r is not None), path)
+
+    def _snapshot_record(self):
+        record = {}
+        for field in self._FIELDS:
+            value = getattr(self, f"_{field}")
+            if value is None:
+                continue
+            if self._FIELDS[field][1] == "entities":
+                value = [entity.idx for entity in value]
+            record[field] = value
+        for field in self._NEIGHBOUR_FIELDS:
+            value = getattr(self, f"_{field}")
+            if value is not None:
+                record[field] = [[p.idx, n.idx] for p, n in value]
+        if not record:
+            return None
+        record["id"] = self.idx
+        return record
+
+    def _restore(self, field) -> bool:
+        """_restore - set field from the snapshot, False when it is not there"""
+        snapshot = get_snapshot()
+        if snapshot is None:
+            return False
+        value = snapshot.get(self.idx, field)
+        if value is None:
+            return False
+        if field in self._NEIGHBOUR_FIELDS:
+            value = [(Entity(p), Entity(n)) for p, n in value]
+        elif self._FIELDS[field][1] == "entities":
+            value = [Entity(idx) for idx in value] or _EMPTY
+        self._set_field(field, value)
+        return True
+
+    @staticmethod
+    def configure_hydration(source: str = "off"):
+        """configure_hydration - choose how scalar fields are loaded on first access
+
+        Sources:
+            off - every field is requested separately when it is accessed
+            sparql - one SPARQL query with a UNION per field fills all fields
+            entitydata - fields are taken from Special:EntityData JSON,
+                which is kept in attributes
+
+        Args:
+            source: str - "off", "sparql" or "entitydata"
+        """
+        if source not in Entity.HYDRATION_SOURCES:
+            raise ValueError(
+                f"Wrong hydration source {source}, supported: {Entity.HYDRATION_SOURCES}"
+            )
+        Entity._hydration = source
+
+    @staticmethod
+    def configure_type_hierarchy(hierarchy=None):
+        """configure_type_hierarchy - answer superclass queries from memory
+
+        Args:
+            hierarchy: hierarchy.ClassHierarchy, None to request superclasses
+        """
+        Entity._type_hierarchy = hierarchy
+        _superclass_ids.cache_clear()
+
+    @staticmethod
+    def configure_backends(backends=None):
+        """configure_backends - choose where requests of all entities are answered
+
+        Example:
+            Entity.configure_backends([
+                TripleStoreBackend.from_ntriples("subset.nt"),
+                SPARQLBackend(["http://localhost:7001/sparql", SPARQL_ENDPOINT]),
+            ])
+
+        Args:
+            backends: list of backends.QueryBackend in the order they are asked,
+                None for the label index, the offline index and SPARQL_ENDPOINT
+        """
+        set_backends(backends)
+        _superclass_ids.cache_clear()
+
+    def superclasses(self) -> frozenset:
+        """superclasses - ids of the class and all its subclass_of (P279*) ancestors
+
+        Closures are cached per class, from the type hierarchy when it is
+        configured, otherwise requested with one property path query.
+        """
+        if Entity._type_hierarchy is not None:
+            return Entity._type_hierarchy.ancestors(self.idx)
+        return _superclass_ids(self.idx)
+
+    def _types_are_local(self) -> bool:
+        return (
+            self._instance_of is not None
+            or Entity._type_hierarchy is not None
+            or self._restore("instance_of")
+        )
+
+    def type_closure(self) -> frozenset:
+        """type_closure - ids of all classes the entity is an instance of (P31/P279*)
+
+        When instance_of is loaded (e.g. by prefetch) or a type hierarchy is
+        configured, the closure is a union of cached closures of its classes,
+        otherwise it is requested with one property path query.
+        """
+        if not self._types_are_local():
+            responce = self._request_type_closure(self.idx)
+            return frozenset(
+                self._entity_uri_to_id(r["class"]["value"]) for r in responce
+            )
+
+        closure = set()
+        for class_ in self.instance_of:
+            closure.update(class_.superclasses())
+        return frozenset(closure)
+
+    def is_a(self, class_) -> bool:
+        """is_a - True when entity is an instance of class_ or of its subclass
+
+        Args:
+            class_: Entity or identifier of the class, e.g. "Q486972" (human settlement)
+        """
+        if isinstance(class_, Entity):
+            class_id = class_.idx
+        else:
+            class_id = Entity.entity_identifier_to_id(class_)
+        if not self._types_are_local():
+            return class_id in self.type_closure()
+        return any(class_id in c.superclasses() for c in self.instance_of)
 
     @classmethod
     def from_label(cls, label: str):
@@ -253,100 +886,483 @@ class Entity(_WikiDataSPARQLBase):
                     f"Wrong label, no one entity with label {label} was found. Attention: Supported only English labels"
                 )
 
+    @classmethod
+    def from_labels(
+        cls,
+        labels,
+        language: str = "en",
+        search: bool = False,
+        chunk_size: int = SPARQL_VALUES_CHUNK_SIZE,
+    ) -> list:
+        """from_labels - entities for many labels at once
+
+        Exact label matches are looked up with one VALUES query per chunk_size
+        labels, chunks are sent concurrently. Like from_label, a label without
+        matches is retried with the first letter in lower case.
+        With search, labels still without matches are resolved with concurrent
+        wbsearchentities requests. Throughput of every call is logged.
+
+        Args:
+            labels: iterable of str - labels, duplicates are resolved once
+            language: str - language of labels
+            search: bool - fall back to wbsearchentities for unmatched labels
+            chunk_size: int - number of labels in one VALUES clause
+
+        Returns:
+            list of lists of Entity - entities for every label, empty when none found
+        """
+        started_at = time.perf_counter()
+        labels = list(labels)
+        variants = {}
+        for label in labels:
+            variants[label] = None
+            variants[label[:1].lower() + label[1:]] = None
+        variants = list(variants)
+
+        chunks = [
+            variants[start : start + chunk_size]
+            for start in range(0, len(variants), chunk_size)
+        ]
+        if _answered_locally("_request_entity_by_label_batch"):
+            responces = [
+                cls._request_entity_by_label_batch(chunk, language) for chunk in chunks
+            ]
+        else:
+            responces = request_many_to_wikidata(
+                cls._query_entity_by_label_batch(chunk, language) for chunk in chunks
+            )
+
+        found = {}
+        for responce in responces:
+            for r in responce:
+                try:
+                    entity = Entity(r["item"]["value"])
+                except ValueError:
+                    continue
+                found.setdefault(r["label"]["value"], {})[entity._key] = entity
+
+        def exact(label):
+            matches = found.get(label) or found.get(label[:1].lower() + label[1:])
+            return list(matches.values()) if matches else []
+
+        results = {label: exact(label) for label in labels}
+        missing = [label for label, entities in results.items() if not entities]
+        if search and missing:
+            ids = get_many_wd_search_results(missing, language=language)
+            for label, label_ids in zip(missing, ids):
+                results[label] = [Entity(idx) for idx in label_ids]
+
+        seconds = time.perf_counter() - started_at
+        logger.info(
+            {
+                "msg": "Labels resolved",
+                "labels": len(results),
+                "exact_queries": len(chunks),
+                "searched": len(missing) if search else 0,
+                "not_found": sum(1 for entities in results.values() if not entities),
+                "seconds": seconds,
+                "labels_per_second": len(results) / seconds if seconds else None,
+            }
+        )
+        return [results[label] for label in labels]
+
+    # field -> (binding variable, how the values are stored)
+    _FIELDS = {
+        "label": ("label", "first"),
+        "description": ("description", "list"),
+        "image": ("image", "list"),
+        "aliases": ("label", "list"),
+        "instance_of": ("instance_of", "entities"),
+        "subclass_of": ("subclass_of", "entities"),
+    }
+
+    @classmethod
+    def _parse_field(cls, field, responce):
+        variable, kind = cls._FIELDS[field]
+        if kind == "entities":
+            values = []
+            for r in responce:
+                try:
+                    values.append(Entity(r[variable]["value"]))
+                except ValueError:
+                    continue
+            return values or _EMPTY
+
+        if len(responce) == 0:
+            return None
+        if kind == "first":
+            return responce[0][variable]["value"]
+        return [r[variable]["value"] for r in responce]
+
+    @classmethod
+    def prefetch(
+        cls,
+        entities,
+        fields=(
+            "label",
+            "description",
+            "image",
+            "aliases",
+            "instance_of",
+            "subclass_of",
+        ),
+        chunk_size: int = SPARQL_VALUES_CHUNK_SIZE,
+    ):
+        """prefetch - load fields for many entities with batched VALUES queries
+
+        Instead of one SPARQL request per entity and field, entities are split
+        into chunks of chunk_size and each chunk is resolved by one request per field.
+        Chunk queries are looked up in the cache together and missing ones
+        are executed concurrently by the process-wide RequestExecutor.
+        Results are stored on the singletons, so later property access is free.
+        Entities with an already resolved field are skipped.
+
+        Args:
+            entities: iterable of Entity or entity identifiers
+            fields: names of properties to load, any of Entity._FIELDS
+            chunk_size: int - number of entities in one VALUES clause
+
+        Returns:
+            list of Entity - requested entities in the same order
+        """
+        entities = [e if isinstance(e, Entity) else Entity(e) for e in entities]
+        cls._validate_fields(fields)
+
+        submitted = []
+        for field in fields:
+            if _answered_locally(f"_request_{field}_batch"):
+                for chunk in cls._pending_chunks(entities, field, chunk_size):
+                    responce = getattr(cls, f"_request_{field}_batch")(
+                        [e.idx for e in chunk]
+                    )
+                    cls._fill_prefetched(chunk, field, responce)
+                continue
+            for chunk in cls._pending_chunks(entities, field, chunk_size):
+                query = getattr(cls, f"_query_{field}_batch")([e.idx for e in chunk])
+                submitted.append((field, chunk, query))
+
+        if submitted:
+            responces = request_many_to_wikidata([q for _, _, q in submitted])
+            for (field, chunk, _), responce in zip(submitted, responces):
+                cls._fill_prefetched(chunk, field, responce)
+
+        return entities
+
+    @staticmethod
+    def load_attributes(entities, props=None, languages=None):
+        """load_attributes - load attributes of many entities with batched wbgetentities
+
+        Up to 50 entities are loaded by one request, entity JSON is cached
+        one by one, so later access to entity.attributes is free.
+        With props or languages attributes contain only the requested parts.
+
+        Args:
+            entities: iterable of Entity or entity identifiers
+            props: collection of wbgetentities props, e.g. ["labels", "claims"]
+            languages: collection of language codes to keep, None for all
+
+        Returns:
+            list of Entity - requested entities in the same order
+        """
+        entities = [e if isinstance(e, Entity) else Entity(e) for e in entities]
+        _WikidataAttributes.load_many(
+            [e.attributes for e in entities], props=props, languages=languages
+        )
+        return entities
+
+    @classmethod
+    def _validate_fields(cls, fields):
+        for field in fields:
+            if field not in cls._FIELDS:
+                raise ValueError(
+                    f"Wrong field {field}, supported fields: {list(cls._FIELDS)}"
+                )
+
+    @staticmethod
+    def _pending_chunks(entities, field, chunk_size):
+        pending = list(
+            {
+                e.idx: e
+                for e in entities
+                if getattr(e, f"_{field}") is None and not e._restore(field)
+            }.values()
+        )
+        for start in range(0, len(pending), chunk_size):
+            yield pending[start : start + chunk_size]
+
+    @classmethod
+    def _fill_prefetched(cls, chunk, field, responce):
+        grouped = {}
+        for r in responce:
+            entity_id = cls._entity_uri_to_id(r["entity"]["value"])
+            grouped.setdefault(entity_id, []).append(r)
+
+        for entity in chunk:
+            value = cls._parse_field(field, grouped.get(entity.idx, []))
+            if value is not None:
+                entity._set_field(field, value)
+
+    @classmethod
+    def _parse_card(cls, responce) -> dict:
+        grouped = {field: [] for field in cls._FIELDS}
+        for r in responce:
+            field = r["field"]["value"]
+            grouped[field].append({cls._FIELDS[field][0]: r["value"]})
+        return {field: cls._parse_field(field, rows) for field, rows in grouped.items()}
+
+    @classmethod
+    def _parse_entity_data(cls, attributes) -> dict:
+        record = compact_record(
+            {
+                "id": attributes.idx,
+                "labels": attributes["labels"],
+                "descriptions": attributes["descriptions"],
+                "aliases": attributes["aliases"],
+                "claims": attributes["claims"],
+            },
+            languages=("en",),
+        )
+        return {
+            field: cls._parse_field(field, record_field_bindings(record, field))
+            for field in cls._FIELDS
+        }
+
+    def _hydrate(self) -> bool:
+        """_hydrate - load all scalar fields at once, False when hydration is off
+
+        Fields already resolved (for example by prefetch) are not overwritten,
+        missing fields stay None and are not requested again.
+        """
+        if Entity._hydration == "off" or _answered_locally("_request_label"):
+            return False
+        if not self._hydrated:
+            _field_flights.do((self._key, "hydration"), self._hydrate_fields)
+        return True
+
+    def _hydrate_fields(self):
+        if self._hydrated:
+            return
+        if Entity._hydration == "sparql":
+            values = self._parse_card(self._request_card(self.idx))
+        else:
+            values = self._parse_entity_data(self.attributes)
+        for field, value in values.items():
+            self._set_field(field, value)
+        self._hydrated = True
+
+    def _set_field(self, field, value):
+        """_set_field - store loaded value unless another thread already did"""
+        with _slots_lock:
+            if getattr(self, f"_{field}") is None:
+                setattr(self, f"_{field}", value)
+
+    def _resolve(self, field):
+        """_resolve - value of field, loaded on first access
+
+        Concurrent first accesses to the same field of the same entity
+        wait for one load instead of sending identical requests.
+        """
+        value = getattr(self, f"_{field}")
+        if value is None:
+            _field_flights.do((self._key, field), self._load_field, field)
+            value = getattr(self, f"_{field}")
+        return value
+
+    def _load_field(self, field):
+        if getattr(self, f"_{field}") is not None or self._restore(field):
+            return
+        if field in self._NEIGHBOUR_FIELDS:
+            responce = getattr(self, f"_request_{field}_with_instance_of")(self.idx)
+            value = Entity._process_one_hop_neighbours_with_instance_of(responce)
+        elif self._hydrate():
+            return
+        else:
+            responce = getattr(self, f"_request_{field}")(self.idx)
+            value = self._parse_field(field, responce)
+        self._set_field(field, value)
+
     @property
     def label(self):
-        if self._label is None:
-            responce = self._request_label(self.idx)
-            if len(responce) > 0:
-                self._label = responce[0]["label"]["value"]
-        return self._label
+        return self._resolve("label")
 
     @property
     def description(self):
-        if self._description is None:
-            responce = self._request_description(self.idx)
-            if len(responce) > 0:
-                self._description = [r["description"]["value"] for r in responce]
-
-        return self._description
+        return self._resolve("description")
 
     @property
     def image(self):
-        if self._image is None:
-            responce = self._request_image(self.idx)
-            if len(responce) > 0:
-                self._image = [r["image"]["value"] for r in responce]
-
-        return self._image
+        return self._resolve("image")
 
     @property
     def forward_one_hop_neighbours(self):
-        if self._forward_one_hop_neighbours is None:
-            responce = self._request_forward_one_hop_neighbours_with_instance_of(
-                self.idx
-            )
-            self._forward_one_hop_neighbours = (
-                Entity._process_one_hop_neighbours_with_instance_of(responce)
-            )
-        return self._forward_one_hop_neighbours
+        return self._resolve("forward_one_hop_neighbours")
 
     @property
     def backward_one_hop_neighbours(self):
-        if self._backward_one_hop_neighbours is None:
-            responce = self._request_backward_one_hop_neighbours_with_instance_of(
-                self.idx
-            )
-            self._backward_one_hop_neighbours = (
-                Entity._process_one_hop_neighbours_with_instance_of(responce)
-            )
-        return self._backward_one_hop_neighbours
+        return self._resolve("backward_one_hop_neighbours")
 
     @property
     def one_hop_neighbours(self):
         return self.forward_one_hop_neighbours + self.backward_one_hop_neighbours
 
+    def iter_one_hop_neighbours(
+        self,
+        direction: str = "backward",
+        page_size: int = SPARQL_PAGE_SIZE,
+        max_rows: int = None,
+        by_property: bool = False,
+    ):
+        """iter_one_hop_neighbours - stream one-hop neighbours of hub entities
+
+        Neighbours query is split into keyset pages (see utils.keyset_query),
+        every page is cached separately, so a walk interrupted by a timeout
+        continues from the first missing page. Nothing is stored on the entity.
+
+        Args:
+            direction: str - "forward" or "backward"
+            page_size: int - rows in one page, None for one streamed request
+            max_rows: int - stop after this number of rows
+            by_property: bool - first request distinct properties of the entity,
+                then page neighbours of every property separately
+
+        Yields:
+            (property id, neighbour id, instance_of id)
+        """
+        if direction not in ("forward", "backward"):
+            raise ValueError(
+                f"Wrong direction {direction}, supported: forward, backward"
+            )
+        name = f"_request_{direction}_one_hop_neighbours_with_instance_of"
+        if _answered_locally(name):
+            bindings = getattr(self, name)(self.idx)
+        else:
+            bindings = self._iter_one_hop_neighbour_bindings(
+                direction, page_size, by_property
+            )
+
+        rows = 0
+        for r in bindings:
+            if max_rows is not None and rows >= max_rows:
+                return
+            row = (
+                _parse_neighbour_uri(r["property"]["value"]),
+                _parse_neighbour_uri(r["object"]["value"]),
+                _parse_neighbour_uri(r["instance_of"]["value"]),
+            )
+            if None in row:
+                continue
+            rows += 1
+            yield row
+
+    def _iter_one_hop_neighbour_bindings(self, direction, page_size, by_property):
+        query = getattr(self, f"_query_{direction}_one_hop_neighbours_with_instance_of")
+        if not by_property:
+            yield from iter_request_to_wikidata(
+                query(self.idx), page_size=page_size, order_by=_NEIGHBOUR_ORDER
+            )
+            return
+
+        properties = [
+            r["property"]["value"]
+            for r in iter_request_to_wikidata(
+                self._query_one_hop_properties(self.idx, direction),
+                page_size=page_size,
+                order_by=("?property",),
+            )
+        ]
+        for property_uri in properties:
+            yield from iter_request_to_wikidata(
+                query(self.idx, property_uri),
+                page_size=page_size,
+                order_by=("?object", "?instance_of"),
+            )
+
+    def one_hop_neighbour_columns(self, direction: str = "forward"):
+        """one_hop_neighbour_columns - one-hop neighbours as columns of ids
+
+        Args:
+            direction: str - "forward" or "backward"
+
+        Returns:
+            NeighbourColumns - parallel array("q") columns of property, neighbour
+                and instance_of ids encoded with offline.encode_id (decode_id
+                gives the ids back), one row per distinct triple.
+                No Entity objects are created, use it for hub entities.
+        """
+        if direction == "forward":
+            request = self._request_forward_one_hop_neighbours_with_instance_of
+        elif direction == "backward":
+            request = self._request_backward_one_hop_neighbours_with_instance_of
+        else:
+            raise ValueError(
+                f"Wrong direction {direction}, supported: forward, backward"
+            )
+        return Entity._process_one_hop_neighbour_columns(request(self.idx))
+
     @staticmethod
-    def _process_one_hop_neighbours_with_instance_of(
+    def _process_one_hop_neighbour_columns(
         one_hop_neighbours_with_instance_of_responce,
-    ):
-        _one_hop_neighbours = []
+    ) -> NeighbourColumns:
+        columns = NeighbourColumns(array("q"), array("q"), array("q"))
+        seen = set()
         for r in one_hop_neighbours_with_instance_of_responce:
-            try:
-                property = Entity(r["property"]["value"])
-                neighbor = Entity(r["object"]["value"])
-            except ValueError:
+            row = (
+                _neighbour_key(r["property"]["value"]),
+                _neighbour_key(r["object"]["value"]),
+                _neighbour_key(r["instance_of"]["value"]),
+            )
+            if None in row or row in seen:
                 continue
+            seen.add(row)
+            columns.properties.append(row[0])
+            columns.neighbours.append(row[1])
+            columns.instance_of.append(row[2])
+        return columns
 
-            try:
-                neighbor_instance_of = Entity(r["instance_of"]["value"])
-                if neighbor._instance_of is None:
-                    neighbor._instance_of = []
-                if neighbor_instance_of not in neighbor._instance_of:
-                    neighbor._instance_of.append(neighbor_instance_of)
-            except ValueError:
-                continue
+    @staticmethod
+    def _process_one_hop_neighbours_with_instance_of(
+        one_hop_neighbours_with_instance_of_responce,
+    ):
+        columns = Entity._process_one_hop_neighbour_columns(
+            one_hop_neighbours_with_instance_of_responce
+        )
+        entities = {}
+
+        def entity(key):
+            obj = entities.get(key)
+            if obj is None:
+                obj = entities[key] = Entity(decode_id(key))
+            return obj
 
-            if (property, neighbor) not in _one_hop_neighbours:
-                _one_hop_neighbours.append((property, neighbor))
-        return _one_hop_neighbours
+        _one_hop_neighbours = {}
+        neighbour_classes = {}
+        for property_key, neighbour_key, instance_of_key in zip(*columns):
+            neighbour_classes.setdefault(neighbour_key, {})[instance_of_key] = None
+            key = (property_key, neighbour_key)
+            if key not in _one_hop_neighbours:
+                _one_hop_neighbours[key] = (entity(property_key), entity(neighbour_key))
+
+        # the slot lock is taken per neighbour, not for the whole response
+        for neighbour_key, class_keys in neighbour_classes.items():
+            neighbor = entity(neighbour_key)
+            classes = [entity(class_key) for class_key in class_keys]
+            with _slots_lock:
+                if neighbor._instance_of is None or neighbor._instance_of is _EMPTY:
+                    neighbor._instance_of = classes
+                else:
+                    known = {e.idx for e in neighbor._instance_of}
+                    neighbor._instance_of.extend(
+                        e for e in classes if e.idx not in known
+                    )
+        return list(_one_hop_neighbours.values())
 
     @property
     def instance_of(self):
-        if self._instance_of is None:
-            self._instance_of = [
-                Entity(r["instance_of"]["value"])
-                for r in self._request_instance_of(self.idx)
-            ]
-        return self._instance_of
+        return _unshared(self._resolve("instance_of"))
 
     @property
     def subclass_of(self):
-        if self._subclass_of is None:
-            self._subclass_of = [
-                Entity(r["subclass_of"]["value"])
-                for r in self._request_subclass_of(self.idx)
-            ]
-        return self._subclass_of
+        return _unshared(self._resolve("subclass_of"))
 
     def __repr__(self):
         if self.is_property:
@@ -376,9 +1392,4 @@ class Entity(_WikiDataSPARQLBase):
 
     @property
     def aliases(self):
-        if self._aliases is None:
-            responce = self._request_aliases(self.idx)
-            if len(responce) > 0:
-                self._aliases = [r['label']['value'] for r in responce]
-
-        return self._aliases
+        return self._resolve("aliases")
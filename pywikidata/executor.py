@@ -0,0 +1,251 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from . import config
+from .session import resize_session
+
+# None is a valid rate, so the default is marked by _CONFIG
+_CONFIG = object()
+
+
+class RateLimiter:
+    """RateLimiter - token bucket shared by all threads of the process
+
+    Every request takes one token, tokens are refilled with constant rate.
+    When the endpoint answers with HTTP 429, pause stops all threads at once
+    until the moment from Retry-After, instead of every caller sleeping on its own.
+
+    Args:
+        rate: float - tokens per second, None or 0 disables limiting,
+            default config.REQUESTS_PER_SECOND
+        capacity: float - maximal burst size, by default equal to rate
+    """
+
+    def __init__(self, rate: float = _CONFIG, capacity: float = None):
+        if rate is _CONFIG:
+            rate = config.REQUESTS_PER_SECOND
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate or 1, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if not self.rate:
+                return 0.0
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """acquire - block until request can be sent
+
+        Returns:
+            float - seconds spent waiting
+        """
+        waited = 0.0
+        to_sleep = self._reserve()
+        while to_sleep > 0:
+            time.sleep(to_sleep)
+            waited += to_sleep
+            to_sleep = self._reserve()
+        return waited
+
+    async def acquire_async(self) -> float:
+        """acquire_async - like acquire, but waits without blocking event loop"""
+        import asyncio
+
+        waited = 0.0
+        to_sleep = self._reserve()
+        while to_sleep > 0:
+            await asyncio.sleep(to_sleep)
+            waited += to_sleep
+            to_sleep = self._reserve()
+        return waited
+
+    def pause(self, seconds: float):
+        """pause - stop all requests for seconds from now
+
+        Overlapping pauses are merged, so concurrent 429 responses
+        with the same Retry-After stop the process only once.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+            self._updated_at = self._paused_until
+
+    @property
+    def paused(self) -> bool:
+        return time.monotonic() < self._paused_until
+
+
+class RequestExecutor:
+    """RequestExecutor - thread pool for concurrent requests to Wikidata
+
+    All workers share one RateLimiter, so the pool keeps the endpoint
+    saturated up to the allowed rate without exceeding it.
+    Work submitted from a worker of the pool (e.g. request_many_to_wikidata
+    called from a submitted job) runs inline in that worker, waiting for it
+    in the pool could take every worker and never finish.
+
+    Args:
+        max_workers: int - number of threads, default config.MAX_WORKERS
+        rate_limiter: RateLimiter - limiter, by default the process-wide one
+    """
+
+    def __init__(self, max_workers: int = None, rate_limiter: RateLimiter = None):
+        if max_workers is None:
+            max_workers = config.MAX_WORKERS
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self._workers = threading.local()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="pywikidata",
+            initializer=self._mark_worker,
+        )
+
+    def _mark_worker(self):
+        self._workers.active = True
+
+    def in_worker(self) -> bool:
+        """in_worker - current thread is a worker of this executor"""
+        return getattr(self._workers, "active", False)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if not self.in_worker():
+            return self._pool.submit(fn, *args, **kwargs)
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+    def map(self, fn, *iterables):
+        """map - like builtin map, but calls are executed concurrently, order is kept"""
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+class SingleFlight:
+    """SingleFlight - concurrent calls with the same key share one execution
+
+    The first caller of do runs the function, callers arriving while it runs
+    wait and get the same result (or exception). Keys are forgotten as soon
+    as the call finishes, so results are not cached here.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "shared": self.shared,
+                "in_flight": len(self._calls),
+            }
+
+
+_lock = threading.Lock()
+_rate_limiter = None
+_executor = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    with _lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(config.REQUESTS_PER_SECOND)
+        return _rate_limiter
+
+
+def get_executor() -> RequestExecutor:
+    global _executor
+    limiter = get_rate_limiter()
+    with _lock:
+        if _executor is None:
+            _executor = RequestExecutor(rate_limiter=limiter)
+        return _executor
+
+
+def configure_executor(
+    max_workers: int = None, requests_per_second: float = None
+) -> RequestExecutor:
+    """configure_executor - replace process-wide executor and rate limiter
+
+    When max_workers is given, the connection pool of the default HTTP session
+    is resized to the same size, a session injected with set_session is kept.
+
+    Args:
+        max_workers: int - number of threads, default from config.MAX_WORKERS
+        requests_per_second: float - allowed request rate, default from config.REQUESTS_PER_SECOND
+
+    Returns:
+        RequestExecutor - new process-wide executor
+    """
+    global _rate_limiter, _executor
+    with _lock:
+        previous = _executor
+        _rate_limiter = RateLimiter(
+            config.REQUESTS_PER_SECOND
+            if requests_per_second is None
+            else requests_per_second
+        )
+        _executor = RequestExecutor(max_workers, rate_limiter=_rate_limiter)
+    if previous is not None:
+        previous.shutdown(wait=False)
+    if max_workers is not None:
+        resize_session(max_workers)
+    return _executor
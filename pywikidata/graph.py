@@ -0,0 +1,356 @@
+import json
+import mmap
+from array import array
+from pathlib import Path
+
+from .dump import DumpPipeline, entity_edges
+from .entity import Entity
+from .offline import decode_id
+
+
+class IdInterner:
+    """IdInterner - bidirectional mapping between Wikidata ids and dense integers"""
+
+    def __init__(self, ids=()):
+        self._ids = []
+        self._index = {}
+        for entity_id in ids:
+            self.intern(entity_id)
+
+    def intern(self, entity_id: str) -> int:
+        number = self._index.get(entity_id)
+        if number is None:
+            number = len(self._ids)
+            self._index[entity_id] = number
+            self._ids.append(entity_id)
+        return number
+
+    def get(self, entity_id: str) -> int:
+        """get - integer of known id, -1 for unknown"""
+        return self._index.get(entity_id, -1)
+
+    def id(self, number: int) -> str:
+        return self._ids[number]
+
+    def ids(self) -> list:
+        return list(self._ids)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class _CSR:
+    """_CSR - compressed sparse rows: edges of node i are offsets[i]:offsets[i + 1]"""
+
+    __slots__ = ("offsets", "targets", "predicates")
+
+    def __init__(self, offsets, targets, predicates):
+        self.offsets = offsets
+        self.targets = targets
+        self.predicates = predicates
+
+    @classmethod
+    def build(cls, n_nodes, sources, targets, predicates) -> "_CSR":
+        # counting sort of edges by source node
+        counts = [0] * (n_nodes + 1)
+        for source in sources:
+            counts[source + 1] += 1
+        for i in range(n_nodes):
+            counts[i + 1] += counts[i]
+        offsets = array("q", counts)
+
+        position = counts[:-1]
+        sorted_targets = array("q", bytes(8 * len(sources)))
+        sorted_predicates = array("q", bytes(8 * len(sources)))
+        for source, target, predicate in zip(sources, targets, predicates):
+            i = position[source]
+            sorted_targets[i] = target
+            sorted_predicates[i] = predicate
+            position[source] = i + 1
+        return cls(offsets, sorted_targets, sorted_predicates)
+
+    def degree(self, node: int) -> int:
+        if node + 1 >= len(self.offsets):
+            return 0
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def edges(self, node: int):
+        if node < 0 or node + 1 >= len(self.offsets):
+            return (), ()
+        start, end = self.offsets[node], self.offsets[node + 1]
+        return self.targets[start:end], self.predicates[start:end]
+
+
+class CSRGraph:
+    """CSRGraph - compact in-memory adjacency store for multi-hop expansion
+
+    Q and P ids are interned to integers, forward and backward edges
+    are kept in CSR arrays (offsets/targets/predicates) of 8-byte integers,
+    about 48 bytes per edge in total instead of two Entity tuples per edge.
+    Frontier expansion works on array slices and sets of integers,
+    without creating Entity objects.
+
+    Graph is immutable, build it with from_edges, from_entities, from_offline_index
+    or from_dump.
+
+    Args:
+        interner: IdInterner - ids of nodes and predicates
+        forward: _CSR - outgoing edges
+        backward: _CSR - incoming edges
+    """
+
+    DIRECTIONS = ("forward", "backward", "both")
+
+    def __init__(self, interner: IdInterner, forward: _CSR, backward: _CSR):
+        self.interner = interner
+        self.forward = forward
+        self.backward = backward
+
+    @classmethod
+    def from_edges(cls, edges) -> "CSRGraph":
+        """from_edges - build graph from iterable of (subject id, predicate id, object id)"""
+        interner = IdInterner()
+        sources, predicates, targets = array("q"), array("q"), array("q")
+        seen = set()
+        for subject, predicate, obj in edges:
+            edge = (
+                interner.intern(subject),
+                interner.intern(predicate),
+                interner.intern(obj),
+            )
+            if edge in seen:
+                continue
+            seen.add(edge)
+            sources.append(edge[0])
+            predicates.append(edge[1])
+            targets.append(edge[2])
+
+        n_nodes = len(interner)
+        return cls(
+            interner,
+            _CSR.build(n_nodes, sources, targets, predicates),
+            _CSR.build(n_nodes, targets, sources, predicates),
+        )
+
+    @classmethod
+    def from_entities(cls, entities, direction: str = "both") -> "CSRGraph":
+        """from_entities - build graph from one-hop neighbours of entities
+
+        Neighbours are requested through Entity, so they come from SPARQL endpoint,
+        the query cache or the offline index, whichever is configured.
+        Entity objects are not created for neighbours.
+
+        Args:
+            entities: iterable of Entity or entity identifiers
+            direction: str - "forward", "backward" or "both"
+        """
+        cls._validate_direction(direction)
+
+        def edges():
+            for entity in entities:
+                if not isinstance(entity, Entity):
+                    entity = Entity(entity)
+                if direction in ("forward", "both"):
+                    columns = entity.one_hop_neighbour_columns("forward")
+                    for prop_key, neighbour_key in zip(
+                        columns.properties, columns.neighbours
+                    ):
+                        yield entity.idx, decode_id(prop_key), decode_id(neighbour_key)
+                if direction in ("backward", "both"):
+                    columns = entity.one_hop_neighbour_columns("backward")
+                    for prop_key, neighbour_key in zip(
+                        columns.properties, columns.neighbours
+                    ):
+                        yield decode_id(neighbour_key), decode_id(prop_key), entity.idx
+
+        return cls.from_edges(edges())
+
+    @classmethod
+    def from_offline_index(cls, index, ids=None) -> "CSRGraph":
+        """from_offline_index - build graph from truthy entity statements of OfflineIndex
+
+        Args:
+            index: OfflineIndex
+            ids: iterable of entity ids to take statements from, all indexed entities by default
+        """
+        return cls.from_edges(
+            (entity_id, prop_id, target)
+            for entity_id in (index.ids() if ids is None else ids)
+            for prop_id, target in index.forward_edges(entity_id)
+        )
+
+    @classmethod
+    def from_dump(cls, dump_path: str, **pipeline_kwargs) -> "CSRGraph":
+        """from_dump - build graph from truthy statements of Wikidata JSON dump
+
+        Args:
+            dump_path: str - dump path or "-" for stdin
+            pipeline_kwargs: arguments of DumpPipeline, e.g. properties or processes
+        """
+        pipeline_kwargs.setdefault("languages", ())
+        return cls.from_edges(
+            (record["id"], prop_id, target)
+            for record in DumpPipeline(dump_path, **pipeline_kwargs)
+            for prop_id, target in entity_edges(record)
+        )
+
+    @classmethod
+    def _validate_direction(cls, direction):
+        if direction not in cls.DIRECTIONS:
+            raise ValueError(
+                f"Wrong direction {direction}, supported: {cls.DIRECTIONS}"
+            )
+
+    def _csrs(self, direction):
+        self._validate_direction(direction)
+        if direction == "forward":
+            return (self.forward,)
+        if direction == "backward":
+            return (self.backward,)
+        return self.forward, self.backward
+
+    def _predicate_numbers(self, predicates):
+        if predicates is None:
+            return None
+        return {self.interner.get(p) for p in predicates} - {-1}
+
+    def _nodes(self, ids) -> set:
+        return {self.interner.get(str(getattr(i, "idx", i))) for i in ids} - {-1}
+
+    def __len__(self) -> int:
+        return len(self.interner)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.forward.targets)
+
+    def degree(self, entity_id: str, direction: str = "both") -> int:
+        node = self.interner.get(entity_id)
+        if node < 0:
+            return 0
+        return sum(csr.degree(node) for csr in self._csrs(direction))
+
+    def _expand(self, frontier, csrs, predicates) -> set:
+        reached = set()
+        for node in frontier:
+            for csr in csrs:
+                targets, node_predicates = csr.edges(node)
+                if predicates is None:
+                    reached.update(targets)
+                else:
+                    reached.update(
+                        t for t, p in zip(targets, node_predicates) if p in predicates
+                    )
+        return reached
+
+    def neighbours(self, entity_id: str, direction: str = "both", predicates=None):
+        """neighbours - (predicate id, neighbour id) pairs of entity"""
+        node = self.interner.get(entity_id)
+        predicate_numbers = self._predicate_numbers(predicates)
+        result = []
+        for csr in self._csrs(direction):
+            targets, node_predicates = csr.edges(node)
+            for target, predicate in zip(targets, node_predicates):
+                if predicate_numbers is None or predicate in predicate_numbers:
+                    result.append(
+                        (self.interner.id(predicate), self.interner.id(target))
+                    )
+        return result
+
+    def k_hop(
+        self,
+        seeds,
+        k: int,
+        direction: str = "both",
+        predicates=None,
+        max_nodes: int = None,
+    ) -> dict:
+        """k_hop - nodes reachable from seeds in at most k hops
+
+        Args:
+            seeds: iterable of entity ids or Entity
+            k: int - number of hops
+            direction: str - "forward", "backward" or "both"
+            predicates: collection of predicate ids to follow, None for all
+            max_nodes: int - stop expansion when this number of nodes is reached
+
+        Returns:
+            dict - entity id -> number of hops from the nearest seed
+        """
+        csrs = self._csrs(direction)
+        predicate_numbers = self._predicate_numbers(predicates)
+        distances = dict.fromkeys(self._nodes(seeds), 0)
+        frontier = set(distances)
+        for hop in range(1, k + 1):
+            if not frontier:
+                break
+            frontier = self._expand(frontier, csrs, predicate_numbers)
+            frontier.difference_update(distances)
+            if max_nodes is not None and len(distances) + len(frontier) > max_nodes:
+                frontier = set(sorted(frontier)[: max(max_nodes - len(distances), 0)])
+            distances.update(dict.fromkeys(frontier, hop))
+        return {self.interner.id(node): hops for node, hops in distances.items()}
+
+    def subgraph(self, ids, predicates=None) -> list:
+        """subgraph - (subject id, predicate id, object id) edges between given nodes"""
+        nodes = self._nodes(ids)
+        predicate_numbers = self._predicate_numbers(predicates)
+        edges = []
+        for node in sorted(nodes):
+            targets, node_predicates = self.forward.edges(node)
+            for target, predicate in zip(targets, node_predicates):
+                if target in nodes and (
+                    predicate_numbers is None or predicate in predicate_numbers
+                ):
+                    edges.append(
+                        (
+                            self.interner.id(node),
+                            self.interner.id(predicate),
+                            self.interner.id(target),
+                        )
+                    )
+        return edges
+
+    def k_hop_subgraph(
+        self, seeds, k: int, direction: str = "both", predicates=None
+    ) -> list:
+        """k_hop_subgraph - edges between nodes of k-hop neighbourhood of seeds"""
+        return self.subgraph(
+            self.k_hop(seeds, k, direction=direction, predicates=predicates),
+            predicates=predicates,
+        )
+
+    def save(self, path: str):
+        """save - write graph to directory, load it back with CSRGraph.load"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / "ids.json", "w") as f:
+            json.dump(self.interner.ids(), f)
+        for name, csr in (("forward", self.forward), ("backward", self.backward)):
+            for field in _CSR.__slots__:
+                with open(path / f"{name}.{field}", "wb") as f:
+                    array("q", getattr(csr, field)).tofile(f)
+
+    @classmethod
+    def load(cls, path: str) -> "CSRGraph":
+        """load - open saved graph, CSR arrays are memory-mapped"""
+        path = Path(path)
+        with open(path / "ids.json") as f:
+            interner = IdInterner(json.load(f))
+
+        def mapped(name):
+            with open(path / name, "rb") as f:
+                if f.seek(0, 2) == 0:
+                    return memoryview(b"").cast("q")
+                return memoryview(
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                ).cast("q")
+
+        forward, backward = (
+            _CSR(*(mapped(f"{name}.{field}") for field in _CSR.__slots__))
+            for name in ("forward", "backward")
+        )
+        return cls(interner, forward, backward)
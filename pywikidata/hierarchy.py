@@ -0,0 +1,88 @@
+from functools import lru_cache
+
+from .graph import CSRGraph
+
+SUBCLASS_OF = "P279"
+
+
+class ClassHierarchy:
+    """ClassHierarchy - subclass_of (P279) graph of classes for in-memory type checks
+
+    Only P279 edges are kept, as CSR arrays of CSRGraph, so the graph of all
+    Wikidata classes fits in memory. Ancestors of a class are found by
+    breadth-first search, which also handles cycles of the class graph,
+    and closures are cached per class, so repeated checks against the same
+    classes cost a set lookup.
+    Use it with Entity.configure_type_hierarchy.
+
+    Args:
+        graph: CSRGraph - graph with P279 edges
+        cache_size: int - number of class closures kept in memory
+    """
+
+    def __init__(self, graph: CSRGraph, cache_size: int = 2**16):
+        self.graph = graph
+        self.ancestors = lru_cache(maxsize=cache_size)(self._ancestors)
+
+    def _ancestors(self, class_id: str) -> frozenset:
+        """ancestors - ids of the class and all its transitive superclasses"""
+        closure = self.graph.k_hop(
+            [class_id], len(self.graph), direction="forward", predicates=[SUBCLASS_OF]
+        )
+        return frozenset(closure).union([class_id])
+
+    def is_subclass(self, class_id: str, superclass_id: str) -> bool:
+        """is_subclass - True when class_id is superclass_id or its subclass"""
+        return superclass_id in self.ancestors(class_id)
+
+    def __len__(self) -> int:
+        return len(self.graph)
+
+    @classmethod
+    def from_edges(cls, edges, **kwargs) -> "ClassHierarchy":
+        """from_edges - hierarchy from iterable of (class id, superclass id)"""
+        return cls(
+            CSRGraph.from_edges(
+                (class_id, SUBCLASS_OF, superclass_id)
+                for class_id, superclass_id in edges
+            ),
+            **kwargs,
+        )
+
+    @classmethod
+    def from_offline_index(cls, index, **kwargs) -> "ClassHierarchy":
+        """from_offline_index - hierarchy of all classes of OfflineIndex"""
+        return cls.from_edges(
+            (
+                (entity_id, target)
+                for entity_id in index.ids()
+                for prop_id, target in index.forward_edges(entity_id)
+                if prop_id == SUBCLASS_OF
+            ),
+            **kwargs,
+        )
+
+    @classmethod
+    def from_dump(
+        cls, dump_path: str, cache_size: int = 2**16, **pipeline_kwargs
+    ) -> "ClassHierarchy":
+        """from_dump - hierarchy from Wikidata JSON dump, only P279 claims are parsed
+
+        Args:
+            dump_path: str - dump path or "-" for stdin
+            cache_size: int - number of class closures kept in memory
+            pipeline_kwargs: arguments of DumpPipeline, e.g. processes
+        """
+        pipeline_kwargs.setdefault("properties", [SUBCLASS_OF])
+        return cls(
+            CSRGraph.from_dump(dump_path, **pipeline_kwargs), cache_size=cache_size
+        )
+
+    def save(self, path: str):
+        """save - write hierarchy to directory, load it back with ClassHierarchy.load"""
+        self.graph.save(path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "ClassHierarchy":
+        """load - open saved hierarchy, CSR arrays are memory-mapped"""
+        return cls(CSRGraph.load(path), **kwargs)
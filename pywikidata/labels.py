@@ -0,0 +1,261 @@
+import json
+import mmap
+import threading
+from array import array
+from pathlib import Path
+
+from .config import LABEL_INDEX_PATH
+from .logger import get_logger
+from .offline import ENTITY_URI, decode_id, encode_id
+
+logger = get_logger()
+
+_SEPARATOR = b"\0"
+
+
+def _fold(label: str) -> str:
+    return label.casefold()
+
+
+class LabelIndex:
+    """LabelIndex - memory-mapped label and alias -> entity index for entity linking
+
+    Entries are sorted byte strings "<case-folded label>\\0<language>\\0<label>",
+    so exact, case-folded and prefix lookups are binary searches over the table.
+    Files of the index directory:
+        labels.bin - entries, one after another
+        labels.offsets - byte offsets of entries, one more than entries
+        labels.keys - encoded entity id * 2 + 1 for aliases, + 0 for labels
+        meta.json - number of entries and languages
+
+    Files are memory-mapped, so opening the index costs nothing and several
+    processes share one copy in page cache.
+
+    Methods named like _WikiDataSPARQLBase label requests return bindings
+    in SPARQL JSON results format, so Entity.from_label and Entity.from_labels
+    use the index without changes (see set_label_index).
+
+    Args:
+        path: str - directory with the index
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._files = []
+        self._entries = self._mmap("labels.bin")
+        self._offsets = memoryview(self._mmap("labels.offsets")).cast("q")
+        self._keys = memoryview(self._mmap("labels.keys")).cast("q")
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+
+    def _mmap(self, name):
+        f = open(self.path / name, "rb")
+        self._files.append(f)
+        if f.seek(0, 2) == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _entry(self, position: int) -> bytes:
+        return self._entries[self._offsets[position] : self._offsets[position + 1]]
+
+    def _lower_bound(self, prefix: bytes) -> int:
+        low, high = 0, len(self._keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _scan(self, prefix: bytes):
+        """_scan - (entry, key) of entries starting with prefix in sorted order"""
+        for position in range(self._lower_bound(prefix), len(self._keys)):
+            entry = self._entry(position)
+            if not entry.startswith(prefix):
+                return
+            yield entry, self._keys[position]
+
+    def lookup(
+        self, label: str, languages=None, casefold: bool = False, aliases: bool = True
+    ) -> list:
+        """lookup - ids of entities with label (or alias)
+
+        Args:
+            label: str - label to find
+            languages: collection of language codes, None for all
+            casefold: bool - compare case-folded labels instead of exact ones
+            aliases: bool - match aliases too
+
+        Returns:
+            list of str - entity ids without duplicates
+        """
+        encoded = label.encode("utf-8")
+        ids = {}
+        for entry, key in self._scan(_fold(label).encode("utf-8") + _SEPARATOR):
+            _, language, original = entry.split(_SEPARATOR, 2)
+            if languages is not None and language.decode() not in languages:
+                continue
+            if (key & 1 and not aliases) or (not casefold and original != encoded):
+                continue
+            ids.setdefault(key >> 1)
+        return [decode_id(key) for key in ids]
+
+    def search(self, text: str, language: str = "en", limit: int = 50) -> list:
+        """search - ids of entities with label or alias starting with text, any case
+
+        Like wbsearchentities, exact matches come first, then longer labels.
+
+        Args:
+            text: str - beginning of label
+            language: str - language of labels, None for all
+            limit: int - maximal number of ids
+
+        Returns:
+            list of str - entity ids without duplicates
+        """
+        ids = {}
+        for entry, key in self._scan(_fold(text).encode("utf-8")):
+            if len(ids) >= limit:
+                break
+            if language is not None:
+                entry_language = entry.split(_SEPARATOR, 2)[1]
+                if entry_language.decode() != language:
+                    continue
+            ids.setdefault(key >> 1)
+        return [decode_id(key) for key in ids]
+
+    def _request_entity_by_label(self, label, language="en"):
+        return [
+            {
+                "item": {"type": "uri", "value": ENTITY_URI + entity_id},
+                "label": {"type": "literal", "xml:lang": language, "value": label},
+            }
+            for entity_id in self.lookup(label, (language,), aliases=False)
+        ]
+
+    def _request_entity_by_label_batch(self, labels, language="en"):
+        bindings = []
+        for label in labels:
+            bindings.extend(self._request_entity_by_label(label, language))
+        return bindings
+
+    def close(self):
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    @classmethod
+    def build(cls, entries, path: str) -> "LabelIndex":
+        """build - write index from (entity id, language, label, is alias) tuples
+
+        Entries are sorted in memory, for the full dump pass only needed languages.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        table = {}
+        languages = set()
+        for entity_id, language, label, is_alias in entries:
+            entry = _SEPARATOR.join(
+                part.encode("utf-8") for part in (_fold(label), language, label)
+            )
+            key = encode_id(entity_id) * 2 + bool(is_alias)
+            # a label is stored once even when it is also an alias
+            table[entry, key >> 1] = min(key, table.get((entry, key >> 1), key))
+            languages.add(language)
+
+        offsets, keys = array("q", [0]), array("q")
+        with open(path / "labels.bin", "wb") as f:
+            for item in sorted(table):
+                f.write(item[0])
+                offsets.append(offsets[-1] + len(item[0]))
+                keys.append(table[item])
+        with open(path / "labels.offsets", "wb") as f:
+            offsets.tofile(f)
+        with open(path / "labels.keys", "wb") as f:
+            keys.tofile(f)
+        with open(path / "meta.json", "w") as f:
+            json.dump({"entries": len(keys), "languages": sorted(languages)}, f)
+
+        logger.info(
+            {"msg": "Label index written", "path": str(path), "entries": len(keys)}
+        )
+        return cls(path)
+
+    @staticmethod
+    def record_entries(records, languages=None, aliases: bool = True):
+        """record_entries - index entries of compact records, see dump.compact_record"""
+        for record in records:
+            for language, label in record["labels"].items():
+                if languages is None or language in languages:
+                    yield record["id"], language, label, False
+            if not aliases:
+                continue
+            for language, values in record["aliases"].items():
+                if languages is None or language in languages:
+                    for alias in values:
+                        yield record["id"], language, alias, True
+
+    @classmethod
+    def from_records(cls, records, path: str, languages=None, aliases: bool = True):
+        """from_records - index of compact records, e.g. of dump.DumpPipeline"""
+        return cls.build(cls.record_entries(records, languages, aliases), path)
+
+    @classmethod
+    def from_offline_index(cls, index, path: str, languages=None, aliases: bool = True):
+        """from_offline_index - index of all entities of OfflineIndex"""
+        records = (index.record(entity_id) for entity_id in index.ids())
+        return cls.from_records(records, path, languages, aliases)
+
+    @classmethod
+    def from_entities(cls, entities, path: str, language: str = "en"):
+        """from_entities - index of already loaded labels and aliases of entities
+
+        For example after Entity.prefetch(entities, fields=["label", "aliases"]).
+        """
+
+        def entries():
+            for entity in entities:
+                if entity._label is not None:
+                    yield entity.idx, language, entity._label, False
+                for alias in entity._aliases or ():
+                    yield entity.idx, language, alias, True
+
+        return cls.build(entries(), path)
+
+
+_lock = threading.Lock()
+_label_index = None
+_label_index_loaded = False
+
+
+def get_label_index():
+    """get_label_index - process-wide label index, None when labels are requested online
+
+    By default opened from PYWIKIDATA_LABEL_INDEX directory.
+    """
+    global _label_index, _label_index_loaded
+    if _label_index_loaded:
+        return _label_index
+    with _lock:
+        if not _label_index_loaded:
+            _label_index = LabelIndex(LABEL_INDEX_PATH) if LABEL_INDEX_PATH else None
+            _label_index_loaded = True
+        return _label_index
+
+
+def set_label_index(index):
+    """set_label_index - resolve labels and searches with the label index
+
+    Args:
+        index: LabelIndex or path to its directory, None to request labels online
+    """
+    global _label_index, _label_index_loaded
+    if index is not None and not isinstance(index, LabelIndex):
+        index = LabelIndex(index)
+    with _lock:
+        _label_index = index
+        _label_index_loaded = True
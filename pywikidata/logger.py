@@ -1,6 +1,11 @@
+import atexit
+import copy
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+import threading
 import json
 import datetime
 from .config import LOG_FILENAME
@@ -20,27 +25,125 @@ class JSONFormatter(logging.Formatter):
             record.msg = {"exception": str(record.msg)}
 
         if "datetime" not in record.msg:
-            record.msg["datetime"] = str(datetime.datetime.now())
+            created = datetime.datetime.fromtimestamp(record.created)
+            record.msg["datetime"] = str(created)
 
         if "process_id" not in record.msg:
-            record.msg["process_id"] = os.getpid()
+            record.msg["process_id"] = record.process
 
         record.msg = json.dumps(record.msg)
         return super().format(record)
 
 
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """RecordQueueHandler - QueueHandler which leaves formatting to the listener
+
+    Records stay in the process, so dict messages are passed as they are
+    (a shallow copy) and JSONFormatter still gets them.
+    File and console handlers are created by the first record,
+    so importing pywikidata opens no files (see configure_logging).
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if isinstance(record.msg, dict):
+            record.msg = dict(record.msg)
+        return record
+
+    def emit(self, record):
+        _start_listener()
+        super().emit(record)
+
+
 logFormatter = logging.Formatter("%(asctime)s [%(levelname)s]: %(message)s")
 main_logger = logging.getLogger("main")
 main_logger.setLevel(logging.WARNING)
 
-fileHandler = logging.FileHandler(LOG_FILENAME)
-fileHandler.setFormatter(JSONFormatter())
-fileHandler.setLevel(logging.INFO)
-main_logger.addHandler(fileHandler)
-
-consoleHandler = logging.StreamHandler(sys.stdout)
-consoleHandler.setFormatter(logFormatter)
-main_logger.addHandler(consoleHandler)
+# file and console writes happen in the listener thread, not in request threads
+log_queue = queue.SimpleQueue()
+queueHandler = RecordQueueHandler(log_queue)
+main_logger.addHandler(queueHandler)
+
+_lock = threading.Lock()
+_settings = {"filename": LOG_FILENAME, "console": True}
+_listener = None
+_KEEP = object()
+
+
+def _handlers() -> list:
+    handlers = []
+    if _settings["filename"]:
+        fileHandler = logging.FileHandler(_settings["filename"])
+        fileHandler.setFormatter(JSONFormatter())
+        fileHandler.setLevel(logging.INFO)
+        handlers.append(fileHandler)
+    if _settings["console"]:
+        consoleHandler = logging.StreamHandler(sys.stdout)
+        consoleHandler.setFormatter(logFormatter)
+        handlers.append(consoleHandler)
+    return handlers
+
+
+def _start_listener():
+    global _listener
+    if _listener is not None:
+        return
+    with _lock:
+        if _listener is None:
+            listener = logging.handlers.QueueListener(
+                queueHandler.queue, *_handlers(), respect_handler_level=True
+            )
+            listener.start()
+            _listener = listener
+
+
+def _stop_listener():
+    """_stop_listener - write queued records and close handlers"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def _forget_listener():
+    # the listener thread is not copied to forked workers, they start their own,
+    # records still queued by the parent are the parent's to write
+    global _listener, _lock
+    _lock = threading.Lock()
+    _listener = None
+    queueHandler.queue = queue.SimpleQueue()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_listener)
+
+
+def configure_logging(filename=_KEEP, level=None, console: bool = None):
+    """configure_logging - where and what pywikidata logs
+
+    Queued records are written with the old settings, handlers with the new
+    ones are created by the next record.
+
+    Args:
+        filename: str - JSON lines log file, None to not write a file,
+            default from PYWIKIDATA_LOG_FILE or log.json in working directory
+        level: int or str - level of the logger, e.g. logging.INFO
+        console: bool - print records to stdout
+    """
+    _stop_listener()
+    with _lock:
+        if filename is not _KEEP:
+            _settings["filename"] = filename
+        if console is not None:
+            _settings["console"] = console
+    if level is not None:
+        main_logger.setLevel(level)
 
 
 def get_logger():
@@ -0,0 +1,264 @@
+import hashlib
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_TEMPLATE_PARTS = re.compile(
+    r'"(?:[^"\\]|\\.)*"(?:@[\w-]+)?'  # string literals with language tags
+    r"|(?:\bwd:)?\b[QL][0-9]+\b"  # item and lexeme ids, property ids are kept
+    r"|\b[0-9]+\b"  # numbers, e.g. LIMIT and OFFSET
+)
+_REPEATED_PLACEHOLDERS = re.compile(r"#(?:\s+#)+")
+
+
+def query_template(query: str) -> str:
+    """query_template - name of SPARQL query without item ids, literals and numbers
+
+    Queries built from the same _query_<name> method get the same name,
+    e.g. label queries of all entities, VALUES blocks of any length.
+    """
+    template = _REPEATED_PLACEHOLDERS.sub("#", _TEMPLATE_PARTS.sub("#", query))
+    template = " ".join(template.split())
+    return "sparql-" + hashlib.sha1(template.encode("utf-8")).hexdigest()[:10]
+
+
+class Histogram:
+    """Histogram - cumulative bucket counts, like Prometheus histograms
+
+    Args:
+        buckets: sorted upper bounds of buckets, +Inf bucket is implicit
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list:
+        """cumulative - (upper bound, number of observations <= bound) pairs"""
+        result, total = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """Metrics - counters of all requests to Wikidata done by the process
+
+    Collected per request template (query_template for SPARQL, API action
+    for MediaWiki API calls): latency histograms, response statuses,
+    bytes received and rows returned. Process-wide: cache hits and misses
+    per cache namespace, HTTP 429 responses and time spent waiting for
+    Retry-After, requests in flight.
+
+    Every observation is also passed to hooks as a dict event, which is
+    the place to forward metrics to StatsD, OpenTelemetry spans and the like.
+
+    Args:
+        buckets: upper bounds of latency histogram buckets, seconds
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._hooks = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = {}
+            self.responses = Counter()
+            self.bytes_received = Counter()
+            self.rows = Counter()
+            self.cache = Counter()
+            self.throttled = 0
+            self.throttled_seconds = 0.0
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+    def add_hook(self, hook):
+        """add_hook - call hook(event: dict) on every observation"""
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks.remove(hook)
+
+    def _emit(self, event: dict):
+        for hook in self._hooks:
+            hook(event)
+
+    def observe_request(
+        self, template: str, seconds: float, status: int, bytes_received: int = 0
+    ):
+        with self._lock:
+            histogram = self.latency.get(template)
+            if histogram is None:
+                histogram = self.latency[template] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            self.responses[template, status] += 1
+            self.bytes_received[template] += bytes_received
+        self._emit(
+            {
+                "event": "request",
+                "template": template,
+                "seconds": seconds,
+                "status": status,
+                "bytes": bytes_received,
+            }
+        )
+
+    def observe_rows(self, template: str, rows: int):
+        with self._lock:
+            self.rows[template] += rows
+        self._emit({"event": "rows", "template": template, "rows": rows})
+
+    def observe_cache(self, namespace: str, hits: int, misses: int):
+        with self._lock:
+            self.cache[namespace, "hit"] += hits
+            self.cache[namespace, "miss"] += misses
+        self._emit(
+            {"event": "cache", "namespace": namespace, "hits": hits, "misses": misses}
+        )
+
+    def observe_throttle(self, seconds: float):
+        """observe_throttle - HTTP 429 received, requests wait for seconds"""
+        with self._lock:
+            self.throttled += 1
+            self.throttled_seconds += seconds
+        self._emit({"event": "throttle", "seconds": seconds})
+
+    @contextmanager
+    def track_in_flight(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def cache_hit_ratio(self, namespace: str = None) -> float:
+        """cache_hit_ratio - share of cache hits, None without lookups"""
+        with self._lock:
+            hits = sum(
+                count
+                for (ns, kind), count in self.cache.items()
+                if kind == "hit" and namespace in (None, ns)
+            )
+            total = sum(
+                count
+                for (ns, _), count in self.cache.items()
+                if namespace in (None, ns)
+            )
+        return hits / total if total else None
+
+    def snapshot(self) -> dict:
+        """snapshot - all metrics as a JSON-serializable dict"""
+        with self._lock:
+            templates = {}
+            for template, histogram in self.latency.items():
+                templates[template] = {
+                    "requests": histogram.count,
+                    "seconds": histogram.sum,
+                    "latency_buckets": [
+                        [bound, count] for bound, count in histogram.cumulative()
+                    ],
+                    "statuses": {
+                        status: count
+                        for (t, status), count in self.responses.items()
+                        if t == template
+                    },
+                    "bytes_received": self.bytes_received[template],
+                    "rows": self.rows[template],
+                }
+            cache = {}
+            for (namespace, kind), count in self.cache.items():
+                cache.setdefault(namespace, {"hit": 0, "miss": 0})[kind] = count
+            return {
+                "templates": templates,
+                "cache": cache,
+                "throttled": self.throttled,
+                "throttled_seconds": self.throttled_seconds,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+            }
+
+    def to_prometheus(self, prefix: str = "pywikidata") -> str:
+        """to_prometheus - metrics in Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        templates = sorted(snapshot["templates"].items())
+        lines = []
+
+        def sample(name, number, **labels):
+            text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+            labels = f"{{{text}}}" if text else ""
+            lines.append(f"{prefix}_{name}{labels} {number}")
+
+        lines.append(f"# TYPE {prefix}_request_seconds histogram")
+        for template, values in templates:
+            for bound, count in values["latency_buckets"]:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                sample("request_seconds_bucket", count, template=template, le=le)
+            sample("request_seconds_sum", values["seconds"], template=template)
+            sample("request_seconds_count", values["requests"], template=template)
+
+        lines.append(f"# TYPE {prefix}_responses_total counter")
+        for template, values in templates:
+            for status, count in sorted(values["statuses"].items()):
+                sample("responses_total", count, template=template, status=status)
+        for name, key in (
+            ("bytes_received_total", "bytes_received"),
+            ("rows_total", "rows"),
+        ):
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for template, values in templates:
+                sample(name, values[key], template=template)
+
+        lines.append(f"# TYPE {prefix}_cache_lookups_total counter")
+        for namespace, counts in sorted(snapshot["cache"].items()):
+            for result, count in sorted(counts.items()):
+                sample("cache_lookups_total", count, namespace=namespace, result=result)
+
+        lines.append(f"# TYPE {prefix}_throttled_total counter")
+        sample("throttled_total", snapshot["throttled"])
+        lines.append(f"# TYPE {prefix}_throttled_seconds_total counter")
+        sample("throttled_seconds_total", snapshot["throttled_seconds"])
+        lines.append(f"# TYPE {prefix}_in_flight gauge")
+        sample("in_flight", snapshot["in_flight"])
+        return "\n".join(lines) + "\n"
+
+
+_lock = threading.Lock()
+_metrics = None
+
+
+def get_metrics() -> Metrics:
+    """get_metrics - process-wide metrics of requests to Wikidata"""
+    global _metrics
+    with _lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+
+def set_metrics(metrics: Metrics):
+    """set_metrics - replace process-wide metrics, e.g. with other histogram buckets"""
+    global _metrics
+    with _lock:
+        _metrics = metrics
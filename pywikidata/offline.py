@@ -0,0 +1,498 @@
+import json
+import mmap
+import threading
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote
+
+from .config import OFFLINE_INDEX_PATH
+from .dump import DumpPipeline, entity_edges, snak_value, truthy_statements
+from .logger import get_logger
+
+logger = get_logger()
+
+ENTITY_URI = "http://www.wikidata.org/entity/"
+DIRECT_PROPERTY_URI = "http://www.wikidata.org/prop/direct/"
+COMMONS_FILE_URI = "http://commons.wikimedia.org/wiki/Special:FilePath/"
+
+
+def encode_id(entity_id: str) -> int:
+    """encode_id - Q90 -> 180, P31 -> 63: items are even, properties are odd"""
+    return int(entity_id[1:]) * 2 + (entity_id[0] == "P")
+
+
+def decode_id(key: int) -> str:
+    return f"{'P' if key & 1 else 'Q'}{key >> 1}"
+
+
+def _uri(entity_id: str) -> dict:
+    return {"type": "uri", "value": ENTITY_URI + entity_id}
+
+
+def _literal(value: str, lang: str = "en") -> dict:
+    return {"type": "literal", "xml:lang": lang, "value": value}
+
+
+def _truthy_targets(record: dict, prop_id: str) -> list:
+    return [target for prop, target in entity_edges(record) if prop == prop_id]
+
+
+def record_field_bindings(record: dict, field: str) -> list:
+    """record_field_bindings - bindings of scalar Entity field computed from compact record
+
+    Bindings are the same as SPARQL endpoint returns for _request_<field>,
+    so they can be parsed by Entity._parse_field.
+
+    Args:
+        record: dict - compact record (see dump.compact_record), None for unknown entity
+        field: str - label, description, aliases, image, instance_of or subclass_of
+    """
+    if record is None:
+        return []
+    if field == "label":
+        if "en" not in record["labels"]:
+            return []
+        return [{"label": _literal(record["labels"]["en"])}]
+    if field == "description":
+        if "en" not in record["descriptions"]:
+            return []
+        return [{"description": _literal(record["descriptions"]["en"])}]
+    if field == "aliases":
+        return [{"label": _literal(alias)} for alias in record["aliases"].get("en", [])]
+    if field == "image":
+        bindings = []
+        for statement in truthy_statements(record["claims"].get("P18", [])):
+            value = snak_value(statement.get("mainsnak") or {})
+            if value is not None:
+                image = COMMONS_FILE_URI + quote(value[1])
+                bindings.append({"image": {"type": "uri", "value": image}})
+        return bindings
+    if field == "instance_of":
+        return [{"instance_of": _uri(t)} for t in _truthy_targets(record, "P31")]
+    if field == "subclass_of":
+        return [{"subclass_of": _uri(t)} for t in _truthy_targets(record, "P279")]
+    raise ValueError(f"Wrong field {field}")
+
+
+class RecordStore:
+    """RecordStore - memory-mapped read-only store of JSON records keyed by entity id
+
+    Files of the store directory:
+        records.jsonl - records, one per line
+        records.keys, records.offsets - sorted encoded ids and byte offsets of records
+
+    Files are memory-mapped, so several processes share one copy in page cache
+    and opening the store costs nothing.
+
+    Args:
+        path: str - directory with the store
+        record_cache_size: int - number of parsed records kept in memory
+    """
+
+    def __init__(self, path: str, record_cache_size: int = 100_000):
+        self.path = Path(path)
+        self._files = []
+        self._records = self._mmap("records.jsonl")
+        self._record_keys = self._array("records.keys")
+        self._record_offsets = self._array("records.offsets")
+        self.record = lru_cache(maxsize=record_cache_size)(self._read_record)
+
+    def _mmap(self, name):
+        f = open(self.path / name, "rb")
+        self._files.append(f)
+        if f.seek(0, 2) == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _array(self, name):
+        return memoryview(self._mmap(name)).cast("q")
+
+    @staticmethod
+    def _find(keys, key: int) -> int:
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            return position
+        return -1
+
+    def _read_record(self, entity_id: str):
+        position = self._find(self._record_keys, encode_id(entity_id))
+        if position < 0:
+            return None
+        start = self._record_offsets[position]
+        end = self._records.find(b"\n", start)
+        return json.loads(self._records[start:end])
+
+    def __contains__(self, entity_id: str) -> bool:
+        return self._find(self._record_keys, encode_id(entity_id)) >= 0
+
+    def __len__(self) -> int:
+        return len(self._record_keys)
+
+    def ids(self):
+        """ids - ids of all stored entities in key order"""
+        for key in self._record_keys:
+            yield decode_id(key)
+
+    @classmethod
+    def _write_records(cls, records, path: Path, on_record=None) -> int:
+        """_write_records - write records with "id" key, returns number of records
+
+        on_record(key, record) is called for every record, e.g. to collect edges.
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        record_keys, record_offsets = array("q"), array("q")
+        with open(path / "records.jsonl", "wb") as f:
+            for record in records:
+                key = encode_id(record["id"])
+                record_keys.append(key)
+                record_offsets.append(f.tell())
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+                f.write(b"\n")
+                if on_record is not None:
+                    on_record(key, record)
+
+        order = sorted(range(len(record_keys)), key=record_keys.__getitem__)
+        cls._write(path / "records.keys", (record_keys[i] for i in order))
+        cls._write(path / "records.offsets", (record_offsets[i] for i in order))
+        return len(record_keys)
+
+    @staticmethod
+    def _write(path, values):
+        with open(path, "wb") as f:
+            array("q", values).tofile(f)
+
+
+class OfflineIndex(RecordStore):
+    """OfflineIndex - local read-only store of Wikidata entities built from a JSON dump
+
+    Files of the index directory, in addition to files of RecordStore
+    with compact records (see dump.compact_record):
+        backward.keys, backward.offsets - sorted encoded ids of edge targets
+            and CSR offsets into backward.props and backward.sources
+        meta.json - build parameters and counters
+
+    Methods named like _WikiDataSPARQLBase requests return bindings
+    in SPARQL JSON results format, so Entity works on top of the index
+    without changes.
+
+    Args:
+        path: str - directory with the index
+    """
+
+    def __init__(self, path: str, record_cache_size: int = 100_000):
+        super().__init__(path, record_cache_size)
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+
+        self._backward_keys = self._array("backward.keys")
+        self._backward_offsets = self._array("backward.offsets")
+        self._backward_props = self._array("backward.props")
+        self._backward_sources = self._array("backward.sources")
+
+    def forward_edges(self, entity_id: str) -> list:
+        """forward_edges - truthy (property id, target id) pairs of entity"""
+        record = self.record(entity_id)
+        if record is None:
+            return []
+        return list(entity_edges(record))
+
+    def backward_edges(self, entity_id: str) -> list:
+        """backward_edges - (property id, source id) pairs of statements pointing to entity"""
+        position = self._find(self._backward_keys, encode_id(entity_id))
+        if position < 0:
+            return []
+        start = self._backward_offsets[position]
+        end = self._backward_offsets[position + 1]
+        return [
+            (decode_id(prop), decode_id(source))
+            for prop, source in zip(
+                self._backward_props[start:end], self._backward_sources[start:end]
+            )
+        ]
+
+    def _truthy_entities(self, entity_id: str, prop_id: str) -> list:
+        record = self.record(entity_id)
+        if record is None:
+            return []
+        return _truthy_targets(record, prop_id)
+
+    def entity_data(self, entity_id: str):
+        """entity_data - record in Special:EntityData JSON format, None for unknown entity"""
+        record = self.record(entity_id)
+        if record is None:
+            return None
+        return {
+            "id": record["id"],
+            "type": record["type"],
+            "labels": {
+                lang: {"language": lang, "value": value}
+                for lang, value in record["labels"].items()
+            },
+            "descriptions": {
+                lang: {"language": lang, "value": value}
+                for lang, value in record["descriptions"].items()
+            },
+            "aliases": {
+                lang: [{"language": lang, "value": value} for value in values]
+                for lang, values in record["aliases"].items()
+            },
+            "claims": record["claims"],
+        }
+
+    def request(self, name: str, *args) -> list:
+        """request - answer _WikiDataSPARQLBase request by its method name
+
+        Batch requests (_request_<field>_batch) are answered by the single
+        request for every id with additional ?entity binding.
+        """
+        if name.endswith("_batch"):
+            single = getattr(self, name[: -len("_batch")], None)
+            if single is not None:
+                bindings = []
+                for entity_id in args[0]:
+                    for binding in single(entity_id):
+                        bindings.append(dict(binding, entity=_uri(entity_id)))
+                return bindings
+
+        method = getattr(self, name, None)
+        if method is None or not name.startswith("_request_"):
+            raise NotImplementedError(f"{name} is not supported by offline index")
+        return method(*args)
+
+    def _request_label(self, entity_id):
+        return record_field_bindings(self.record(entity_id), "label")
+
+    def _request_description(self, entity_id):
+        return record_field_bindings(self.record(entity_id), "description")
+
+    def _request_aliases(self, entity_id):
+        return record_field_bindings(self.record(entity_id), "aliases")
+
+    def _request_image(self, entity_id):
+        return record_field_bindings(self.record(entity_id), "image")
+
+    def _request_instance_of(self, entity_id):
+        return record_field_bindings(self.record(entity_id), "instance_of")
+
+    def _request_subclass_of(self, entity_id):
+        return record_field_bindings(self.record(entity_id), "subclass_of")
+
+    def _closure_bindings(self, class_ids) -> list:
+        """_closure_bindings - ?class bindings of class_ids and their P279 ancestors"""
+        closure = dict.fromkeys(class_ids)
+        queue = list(closure)
+        while queue:
+            for parent in self._truthy_entities(queue.pop(), "P279"):
+                if parent not in closure:
+                    closure[parent] = None
+                    queue.append(parent)
+        return [{"class": _uri(class_id)} for class_id in closure]
+
+    def _request_superclasses(self, entity_id):
+        return self._closure_bindings([entity_id])
+
+    def _request_type_closure(self, entity_id):
+        return self._closure_bindings(self._truthy_entities(entity_id, "P31"))
+
+    def _neighbours_with_instance_of(self, edges) -> list:
+        bindings = []
+        for prop_id, neighbour_id in edges:
+            for instance_of in self._truthy_entities(neighbour_id, "P31"):
+                bindings.append(
+                    {
+                        "property": {
+                            "type": "uri",
+                            "value": DIRECT_PROPERTY_URI + prop_id,
+                        },
+                        "object": _uri(neighbour_id),
+                        "instance_of": _uri(instance_of),
+                    }
+                )
+        return bindings
+
+    def _request_forward_one_hop_neighbours_with_instance_of(self, entity_id):
+        return self._neighbours_with_instance_of(self.forward_edges(entity_id))
+
+    def _request_backward_one_hop_neighbours_with_instance_of(self, entity_id):
+        return self._neighbours_with_instance_of(self.backward_edges(entity_id))
+
+    def _request_one_hop_neighbours_with_instance_of(self, entity_id):
+        return self._request_forward_one_hop_neighbours_with_instance_of(
+            entity_id
+        ) + self._request_backward_one_hop_neighbours_with_instance_of(entity_id)
+
+    def _request_one_hop_neighbours(self, entity_id):
+        return [
+            {
+                "property": {"type": "uri", "value": DIRECT_PROPERTY_URI + prop_id},
+                "object": _uri(neighbour_id),
+            }
+            for prop_id, neighbour_id in self.forward_edges(entity_id)
+            + self.backward_edges(entity_id)
+        ]
+
+    def close(self):
+        self.record.cache_clear()
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    @classmethod
+    def build(
+        cls,
+        dump_path: str,
+        index_path: str,
+        languages=("en",),
+        properties=None,
+        keep_qualifiers: bool = True,
+        require_instance_of: bool = False,
+        processes: int = None,
+    ) -> "OfflineIndex":
+        """build - create index from Wikidata JSON dump in one streaming pass
+
+        The dump is parsed in parallel by DumpPipeline. Record keys and backward
+        edges are sorted in memory, which is fine for filtered subsets of the dump.
+
+        Args:
+            dump_path: str - latest-all.json, .json.bz2 or .json.gz dump, its subset or "-" for stdin
+            index_path: str - directory for the index, created if missing
+            languages: collection of language codes to keep, None for all
+            properties: collection of property ids to keep, None for all
+            keep_qualifiers: bool - keep qualifiers of statements
+            require_instance_of: bool - keep only entities with P31 statements
+            processes: int - number of parser processes, by default number of CPUs
+
+        Returns:
+            OfflineIndex - opened index
+        """
+        pipeline = DumpPipeline(
+            dump_path,
+            languages=languages,
+            properties=properties,
+            require_instance_of=require_instance_of,
+            keep_qualifiers=keep_qualifiers,
+            processes=processes,
+        )
+        index = cls.build_from_records(
+            pipeline,
+            index_path,
+            meta={
+                "dump": str(dump_path),
+                "languages": list(languages) if languages is not None else None,
+                "properties": list(properties) if properties is not None else None,
+            },
+        )
+        logger.info({"msg": "Dump ingestion stats", **pipeline.stats})
+        return index
+
+    @classmethod
+    def build_from_records(
+        cls, records, index_path: str, meta: dict = None
+    ) -> "OfflineIndex":
+        """build_from_records - create index from an iterable of compact records"""
+        index_path = Path(index_path)
+        edge_targets, edge_props, edge_sources = array("q"), array("q"), array("q")
+
+        def collect_edges(key, record):
+            for prop_id, target in entity_edges(record):
+                edge_targets.append(encode_id(target))
+                edge_props.append(encode_id(prop_id))
+                edge_sources.append(key)
+
+        entities = cls._write_records(records, index_path, on_record=collect_edges)
+
+        order = sorted(range(len(edge_targets)), key=edge_targets.__getitem__)
+        backward_keys, backward_offsets = array("q"), array("q")
+        for position, i in enumerate(order):
+            if not backward_keys or backward_keys[-1] != edge_targets[i]:
+                backward_keys.append(edge_targets[i])
+                backward_offsets.append(position)
+        backward_offsets.append(len(order))
+        cls._write(index_path / "backward.keys", backward_keys)
+        cls._write(index_path / "backward.offsets", backward_offsets)
+        cls._write(index_path / "backward.props", (edge_props[i] for i in order))
+        cls._write(index_path / "backward.sources", (edge_sources[i] for i in order))
+
+        meta = dict(meta or {}, entities=entities, edges=len(edge_targets))
+        with open(index_path / "meta.json", "w") as f:
+            json.dump(meta, f)
+
+        logger.info({"msg": "Offline index built", "path": str(index_path), **meta})
+        return cls(index_path)
+
+
+_lock = threading.Lock()
+_index = None
+_index_loaded = False
+
+
+def get_offline_index():
+    """get_offline_index - process-wide offline index, None when Entity works online
+
+    By default opened from PYWIKIDATA_OFFLINE_INDEX directory.
+    """
+    global _index, _index_loaded
+    with _lock:
+        if not _index_loaded:
+            _index = OfflineIndex(OFFLINE_INDEX_PATH) if OFFLINE_INDEX_PATH else None
+            _index_loaded = True
+        return _index
+
+
+def set_offline_index(index):
+    """set_offline_index - switch Entity to offline index
+
+    Args:
+        index: OfflineIndex or path to its directory, None to work with SPARQL endpoint
+    """
+    global _index, _index_loaded
+    if index is not None and not isinstance(index, OfflineIndex):
+        index = OfflineIndex(index)
+    with _lock:
+        _index = index
+        _index_loaded = True
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build pywikidata offline index from Wikidata JSON dump"
+    )
+    parser.add_argument(
+        "dump", help='latest-all.json(.bz2/.gz), its subset or "-" for stdin'
+    )
+    parser.add_argument("index", help="output directory")
+    parser.add_argument(
+        "--languages", nargs="*", default=["en"], help="languages to keep"
+    )
+    parser.add_argument(
+        "--properties",
+        nargs="*",
+        default=None,
+        help="properties to keep, all by default",
+    )
+    parser.add_argument(
+        "--require-instance-of",
+        action="store_true",
+        help="keep only entities with P31 statements",
+    )
+    parser.add_argument(
+        "--processes", type=int, default=None, help="parser processes, CPUs by default"
+    )
+    args = parser.parse_args(argv)
+    index = OfflineIndex.build(
+        args.dump,
+        args.index,
+        languages=args.languages,
+        properties=args.properties,
+        require_instance_of=args.require_instance_of,
+        processes=args.processes,
+    )
+    print(json.dumps(index.meta))
+
+
+if __name__ == "__main__":
+    main()
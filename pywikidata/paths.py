@@ -0,0 +1,246 @@
+import time
+
+from .entity import Entity, _parse_neighbour_uri
+from .logger import get_logger
+from .offline import DIRECT_PROPERTY_URI, get_offline_index
+from .utils import request_many_to_wikidata
+
+logger = get_logger()
+
+
+def _entity_id(entity) -> str:
+    if isinstance(entity, Entity):
+        return entity.idx
+    return Entity.entity_identifier_to_id(entity)
+
+
+class _Side:
+    """_Side - BFS state of one end of the search"""
+
+    def __init__(self, name: str, root: str):
+        self.name = name
+        self.root = root
+        self.hops = 0
+        self.frontier = [root]
+        self.depth = {root: 0}
+        # node -> [(previous node, edge)], only edges from the previous level
+        self.parents = {root: []}
+
+    def walks(self, node):
+        """walks - (nodes, edges) of all shortest walks from root to node"""
+        if node == self.root:
+            yield (node,), ()
+            return
+        for previous, edge in self.parents[node]:
+            for nodes, edges in self.walks(previous):
+                yield nodes + (node,), edges + (edge,)
+
+
+class PathFinder:
+    """PathFinder - relation paths between two entities by bidirectional BFS
+
+    Frontiers grow from both ends, always the smaller one, one level at a time.
+    Edges are followed in both directions, so a path may go against statements.
+    All nodes of a frontier are expanded at once: from the CSRGraph when it is
+    given, from the offline index when it is configured, otherwise with VALUES
+    queries of chunk_size nodes sent concurrently.
+    Nodes with more than max_degree edges (hubs like Q5) are not expanded,
+    they can still be an end of a path. Queries ask for at most max_degree + 1
+    edges of every node, so a hub is recognized without downloading its edges.
+    Every expansion is logged and kept in stats.
+
+    Args:
+        graph: graph.CSRGraph - local adjacency store, None to use Entity backends
+        max_degree: int - nodes with more edges are not expanded, None for no limit
+        chunk_size: int - number of nodes in one VALUES query
+        max_paths: int - maximal number of returned paths
+    """
+
+    def __init__(
+        self,
+        graph=None,
+        max_degree: int = 1000,
+        chunk_size: int = 50,
+        max_paths: int = 100,
+    ):
+        self.graph = graph
+        self.max_degree = max_degree
+        self.chunk_size = chunk_size
+        self.max_paths = max_paths
+        self.stats = []
+        self._degrees = {}
+
+    def find(self, a, b, max_hops: int = 3, predicates=None) -> list:
+        """find - paths between a and b with at most max_hops edges
+
+        Paths are ranked by number of hops, then by total degree of their
+        intermediate nodes, so paths through specific nodes come first.
+        Degrees of intermediate nodes which were not expanded are requested
+        before ranking, degrees above max_degree count as max_degree + 1.
+
+        Args:
+            a, b: Entity or entity identifiers
+            max_hops: int - maximal length of path
+            predicates: collection of property ids to follow, None for all
+
+        Returns:
+            list of paths, every path is a tuple of (subject id, property id, object id)
+            edges from a to b
+        """
+        source, target = _entity_id(a), _entity_id(b)
+        self.stats = []
+        if source == target:
+            return [()]
+
+        forward, backward = _Side("forward", source), _Side("backward", target)
+        while forward.hops + backward.hops < max_hops:
+            sides = [side for side in (forward, backward) if side.frontier]
+            if not sides:
+                break
+            self._expand(min(sides, key=lambda side: len(side.frontier)), predicates)
+
+        paths = {}
+        for node, depth in forward.depth.items():
+            if node not in backward.depth or depth + backward.depth[node] > max_hops:
+                continue
+            for left_nodes, left_edges in forward.walks(node):
+                for right_nodes, right_edges in backward.walks(node):
+                    nodes = left_nodes + right_nodes[-2::-1]
+                    if len(set(nodes)) != len(nodes):
+                        continue
+                    paths[left_edges + right_edges[::-1]] = nodes[1:-1]
+
+        self._fetch_degrees(
+            {node for nodes in paths.values() for node in nodes}, predicates
+        )
+        ranked = sorted(
+            paths,
+            key=lambda path: (
+                len(path),
+                sum(self._degrees.get(node, 0) for node in paths[path]),
+                path,
+            ),
+        )
+        return ranked[: self.max_paths]
+
+    def _expand(self, side: _Side, predicates):
+        started_at = time.perf_counter()
+        adjacency = self._adjacency(side.frontier, predicates)
+        side.hops += 1
+        frontier, edges, hubs = [], 0, 0
+        for node in side.frontier:
+            node_edges = adjacency.get(node, ())
+            self._degrees[node] = len(node_edges)
+            if self._is_hub(node):
+                hubs += 1
+                continue
+            for neighbour, edge in node_edges:
+                edges += 1
+                if neighbour not in side.depth:
+                    side.depth[neighbour] = side.hops
+                    side.parents[neighbour] = []
+                    frontier.append(neighbour)
+                if side.depth[neighbour] == side.hops:
+                    side.parents[neighbour].append((node, edge))
+
+        stats = {
+            "side": side.name,
+            "hop": side.hops,
+            "frontier": len(side.frontier),
+            "edges": edges,
+            "hubs": hubs,
+            "seconds": time.perf_counter() - started_at,
+        }
+        self.stats.append(stats)
+        logger.info(dict(stats, msg="Path search hop"))
+        side.frontier = frontier
+
+    def _is_hub(self, node) -> bool:
+        return self.max_degree is not None and self._degrees[node] > self.max_degree
+
+    def _fetch_degrees(self, nodes, predicates):
+        """_fetch_degrees - degrees of nodes which were not expanded"""
+        nodes = sorted(node for node in nodes if node not in self._degrees)
+        if nodes:
+            for node, node_edges in self._adjacency(nodes, predicates).items():
+                self._degrees[node] = len(node_edges)
+
+    def _adjacency(self, nodes, predicates) -> dict:
+        """_adjacency - node -> [(neighbour, (subject, property, object)) of node edges]"""
+        adjacency = {node: {} for node in nodes}
+
+        def add(node, prop_id, neighbour, forward):
+            edge = (node, prop_id, neighbour) if forward else (neighbour, prop_id, node)
+            adjacency[node][edge] = neighbour
+
+        index = get_offline_index()
+        if self.graph is not None:
+            for node in nodes:
+                for direction in ("forward", "backward"):
+                    for prop_id, neighbour in self.graph.neighbours(
+                        node, direction, predicates
+                    ):
+                        add(node, prop_id, neighbour, direction == "forward")
+        elif index is not None:
+            for node in nodes:
+                for edges, forward in (
+                    (index.forward_edges(node), True),
+                    (index.backward_edges(node), False),
+                ):
+                    for prop_id, neighbour in edges:
+                        if predicates is None or prop_id in predicates:
+                            add(node, prop_id, neighbour, forward)
+        else:
+            self._request_adjacency(list(adjacency), predicates, add)
+
+        return {
+            node: [(neighbour, edge) for edge, neighbour in edges.items()]
+            for node, edges in adjacency.items()
+        }
+
+    def _request_adjacency(self, nodes, predicates, add):
+        property_uris = None
+        if predicates is not None:
+            property_uris = [DIRECT_PROPERTY_URI + prop_id for prop_id in predicates]
+
+        # a full LIMIT subquery of one direction is enough to mark a hub
+        limit = self.max_degree + 1 if self.max_degree is not None else None
+        chunks = [
+            nodes[start : start + self.chunk_size]
+            for start in range(0, len(nodes), self.chunk_size)
+        ]
+        queries = []
+        for chunk in chunks:
+            queries.append(
+                (True, Entity._query_forward_edges_batch(chunk, property_uris, limit))
+            )
+            queries.append(
+                (
+                    False,
+                    Entity._query_backward_edges_batch(chunk, property_uris, limit),
+                )
+            )
+
+        responces = request_many_to_wikidata(query for _, query in queries)
+        for (forward, _), responce in zip(queries, responces):
+            for r in responce:
+                node = _parse_neighbour_uri(r["entity"]["value"])
+                prop_id = _parse_neighbour_uri(r["property"]["value"])
+                neighbour = _parse_neighbour_uri(r["object"]["value"])
+                if None not in (node, prop_id, neighbour):
+                    add(node, prop_id, neighbour, forward)
+
+
+def paths_between(a, b, max_hops: int = 3, predicates=None, **kwargs) -> list:
+    """paths_between - ranked relation paths between two entities
+
+    See PathFinder for the search and its arguments.
+
+    Example:
+        paths_between("Q90", "Q142", max_hops=2)
+        >> [(('Q90', 'P17', 'Q142'),), (('Q90', 'P1376', 'Q142'),), ...]
+
+    Returns:
+        list of tuples of (subject id, property id, object id) edges from a to b
+    """
+    return PathFinder(**kwargs).find(a, b, max_hops=max_hops, predicates=predicates)
@@ -0,0 +1,95 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+from . import config
+
+
+class EntityRegistry:
+    """EntityRegistry - storage of Entity singletons
+
+    Modes:
+        strong - every entity is kept until the end of the process
+        weak - entity is dropped as soon as nobody references it
+        bounded - like weak, but up to max_size recently used entities
+            are kept alive even without outside references
+
+    In weak and bounded modes an entity referenced from anywhere
+    (for example from neighbours of another entity) is never dropped,
+    so two objects with the same id can not exist at the same time.
+    Dropped entities are created again on next request and their fields
+    are re-fetched, usually from the query cache.
+
+    Entities are stored by their encoded id, see offline.encode_id.
+
+    Args:
+        mode: str - "strong", "weak" or "bounded", default config.ENTITY_REGISTRY_MODE
+        max_size: int - number of entities kept alive in bounded mode,
+            default config.ENTITY_REGISTRY_MAX_SIZE
+    """
+
+    MODES = ("strong", "weak", "bounded")
+
+    def __init__(self, mode: str = None, max_size: int = None):
+        mode = mode or config.ENTITY_REGISTRY_MODE
+        max_size = config.ENTITY_REGISTRY_MAX_SIZE if max_size is None else max_size
+        if mode not in self.MODES:
+            raise ValueError(f"Wrong registry mode {mode}, supported: {self.MODES}")
+        if mode == "bounded" and not max_size:
+            raise ValueError("max_size is required for bounded registry")
+
+        self.mode = mode
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        self._instances = {} if mode == "strong" else weakref.WeakValueDictionary()
+        self._recent = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: int):
+        with self.lock:
+            obj = self._instances.get(key)
+            if obj is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            if self.mode == "bounded":
+                self._keep_alive(key, obj)
+            return obj
+
+    def add(self, key: int, obj):
+        with self.lock:
+            self._instances[key] = obj
+            if self.mode == "bounded":
+                self._keep_alive(key, obj)
+
+    def _keep_alive(self, key, obj):
+        self._recent[key] = obj
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_size:
+            self._recent.popitem(last=False)
+
+    def values(self) -> list:
+        with self.lock:
+            return list(self._instances.values())
+
+    def clear(self):
+        with self.lock:
+            self._instances.clear()
+            self._recent.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "mode": self.mode,
+                "size": len(self._instances),
+                "kept_alive": len(self._recent),
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._instances
+
+    def __len__(self) -> int:
+        return len(self._instances)
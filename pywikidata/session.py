@@ -0,0 +1,111 @@
+import threading
+
+from . import config
+
+# responses retried by the session, the async client follows the same policy
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def create_session(
+    pool_size: int = None,
+    retries: int = None,
+    backoff_factor: float = 0.5,
+) -> "requests.Session":
+    """create_session - keep-alive HTTP session for Wikidata endpoints
+
+    Connections are reused between requests, pool is sized for the number of
+    executor workers. Responses 5xx and connection resets are retried with
+    exponential backoff, HTTP 429 is left for the rate limiter.
+    requests is imported here, so importing pywikidata does not pay for it.
+
+    Args:
+        pool_size: int - maximal number of kept connections per host,
+            default config.MAX_WORKERS
+        retries: int - number of retries for 5xx and connection errors,
+            default config.HTTP_RETRIES
+        backoff_factor: float - urllib3 backoff factor between retries
+
+    Returns:
+        requests.Session
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    pool_size = config.MAX_WORKERS if pool_size is None else pool_size
+    retries = config.HTTP_RETRIES if retries is None else retries
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        backoff_factor=backoff_factor,
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+_lock = threading.Lock()
+_session = None
+_injected = False
+_pool_size = None
+
+
+def get_session():
+    """get_session - process-wide session shared by all I/O paths"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = create_session(pool_size=_pool_size)
+        return _session
+
+
+def set_session(session):
+    """set_session - replace process-wide session
+
+    Any object with requests-compatible get(url, params=..., headers=..., timeout=...)
+    can be injected, for example a session with a custom transport adapter
+    or a session pointed to a local stand-in server in tests and benchmarks.
+
+    Args:
+        session: requests.Session or compatible object, None to recreate default session
+    """
+    global _session, _injected
+    with _lock:
+        _session = session
+        _injected = session is not None
+
+
+def resize_session(pool_size: int):
+    """resize_session - size connection pool of the default session
+
+    The default session is recreated on next use, a session injected
+    with set_session is left as it is.
+    """
+    global _session, _pool_size
+    with _lock:
+        _pool_size = pool_size
+        if not _injected:
+            _session = None
+
+
+def http_get(url, params=None, headers=None, timeout=None, **kwargs):
+    """http_get - GET request through the process-wide session
+
+    timeout is config.HTTP_TIMEOUT unless given.
+    """
+    timeout = config.HTTP_TIMEOUT if timeout is None else timeout
+    return get_session().get(
+        url, params=params, headers=headers, timeout=timeout, **kwargs
+    )
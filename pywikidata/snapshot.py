@@ -0,0 +1,121 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from .config import SNAPSHOT_PATH
+from .logger import get_logger
+from .offline import RecordStore
+
+logger = get_logger()
+
+
+class EntitySnapshot(RecordStore):
+    """EntitySnapshot - memory-mapped snapshot of resolved Entity fields
+
+    Written by Entity.export_snapshot from a populated registry, one record
+    per entity with ids of related entities instead of objects, e.g.
+    {"id": "Q90", "label": "Paris", "instance_of": ["Q515"],
+     "forward_one_hop_neighbours": [["P17", "Q142"], ...]}
+
+    Entities read a field from the snapshot on first access instead of
+    requesting it. Nothing is parsed on open and records are read lazily,
+    so a worker starts in milliseconds and all workers on one machine
+    share the snapshot pages in page cache.
+
+    Args:
+        path: str - directory with the snapshot
+        record_cache_size: int - number of parsed records kept in memory
+    """
+
+    def __init__(self, path: str, record_cache_size: int = 100_000):
+        # files of one version, even if the snapshot is replaced meanwhile
+        super().__init__(os.path.realpath(path), record_cache_size)
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+
+    def get(self, entity_id: str, field: str):
+        """get - stored value of entity field, None when it is not in the snapshot"""
+        record = self.record(entity_id)
+        if record is None:
+            return None
+        return record.get(field)
+
+    @classmethod
+    def build(cls, records, path: str) -> "EntitySnapshot":
+        """build - write snapshot from records, existing snapshot is replaced atomically
+
+        path is a symlink to a versioned directory next to it. A new version
+        is written completely and the symlink is swapped with one rename, so
+        readers always open a complete snapshot. The previous version is kept
+        for workers that are opening it, older versions and leftovers of
+        interrupted builds are removed. Builds of one path must not run
+        concurrently.
+        """
+        path = Path(path)
+        version = path.with_name(f"{path.name}.v{time.time_ns()}")
+        entities = cls._write_records(records, version)
+        with open(version / "meta.json", "w") as f:
+            json.dump({"entities": entities}, f)
+
+        if path.exists() and not path.is_symlink():
+            # a plain directory written by older versions is moved aside once
+            os.replace(path, path.with_name(f"{path.name}.v0"))
+        previous = Path(os.readlink(path)).name if path.is_symlink() else None
+        link = path.with_name(f"{path.name}.link{os.getpid()}")
+        if link.is_symlink():
+            link.unlink()
+        os.symlink(version.name, link, target_is_directory=True)
+        os.replace(link, path)
+
+        leftovers = re.compile(re.escape(path.name) + r"\.(?:v|link|tmp|old)\d+")
+        for leftover in path.parent.iterdir():
+            if leftover.name in (version.name, previous):
+                continue
+            if not leftovers.fullmatch(leftover.name):
+                continue
+            if leftover.is_symlink() or not leftover.is_dir():
+                leftover.unlink()
+            else:
+                shutil.rmtree(leftover)
+
+        logger.info(
+            {"msg": "Entity snapshot written", "path": str(path), "entities": entities}
+        )
+        return cls(path)
+
+
+_lock = threading.Lock()
+_snapshot = None
+_snapshot_loaded = False
+
+
+def get_snapshot():
+    """get_snapshot - process-wide entity snapshot, None when it is not used
+
+    By default opened from PYWIKIDATA_SNAPSHOT directory.
+    """
+    global _snapshot, _snapshot_loaded
+    with _lock:
+        if not _snapshot_loaded:
+            if SNAPSHOT_PATH and os.path.exists(SNAPSHOT_PATH):
+                _snapshot = EntitySnapshot(SNAPSHOT_PATH)
+            _snapshot_loaded = True
+        return _snapshot
+
+
+def set_snapshot(snapshot):
+    """set_snapshot - warm-start entities from snapshot
+
+    Args:
+        snapshot: EntitySnapshot or path to its directory, None to stop using it
+    """
+    global _snapshot, _snapshot_loaded
+    if snapshot is not None and not isinstance(snapshot, EntitySnapshot):
+        snapshot = EntitySnapshot(snapshot)
+    with _lock:
+        _snapshot = snapshot
+        _snapshot_loaded = True
@@ -1,44 +1,72 @@
+import codecs
+import json
+import re
 import time
-from functools import lru_cache
-from joblib import Memory
+from concurrent.futures import Future
 
-import requests
-
-from .config import SPARQL_ENDPOINT, DEFAULT_CACHE_PATH
+from .backends import get_endpoint_pool, get_sparql_backend
+from .cache import cached, get_cache, get_single_flight, normalize_query
+from . import config
+from .config import SPARQL_PAGE_SIZE
+from .executor import get_executor, get_rate_limiter
+from .labels import get_label_index
 from .logger import get_logger
+from .metrics import get_metrics, query_template
+from .session import http_get
 
 
 logger = get_logger()
 
-memory = Memory(DEFAULT_CACHE_PATH, verbose=0)
+SPARQL_HEADERS = {
+    "Accept": "application/json",
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36",
+}
 
 
-@memory.cache
-def request_to_wikidata(query, sparql_endpoint=SPARQL_ENDPOINT):
-    params = {"format": "json", "query": query}
-    headers = {
-        "Accept": "application/json",
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36",
-    }
-    logger.info(
-        {
-            "msg": "Send request to Wikidata",
-            "params": params,
-            "endpoint": sparql_endpoint,
-        }
-    )
-    response = requests.get(
-        sparql_endpoint,
-        params=params,
-        headers=headers,
-    )
-    to_sleep = 0.2
+def _retry_after_seconds(response, default: float) -> float:
+    retry_after = response.headers.get("retry-after")
+    try:
+        return min(float(retry_after), config.MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return default
+
+
+def _observed_get(template, url, params=None, headers=None, **kwargs):
+    metrics = get_metrics()
+    with metrics.track_in_flight():
+        started_at = time.perf_counter()
+        response = http_get(url, params=params, headers=headers, **kwargs)
+        seconds = time.perf_counter() - started_at
+
+    size = response.headers.get("content-length")
+    if size is None and not kwargs.get("stream"):
+        size = len(response.content)
+    metrics.observe_request(template, seconds, response.status_code, int(size or 0))
+    return response
+
+
+def get_with_retry(url, params=None, headers=None, template=None, **kwargs):
+    """get_with_retry - GET through the shared rate limiter, 429 responses are retried
+
+    Retry-After is honored (up to MAX_RETRY_AFTER) and pauses the whole process,
+    without it the delay grows exponentially.
+    Every attempt is recorded in metrics (see metrics.get_metrics) under template,
+    by default the API action or the url.
+    """
+    if template is None:
+        template = (params or {}).get("action", url)
+    rate_limiter = get_rate_limiter()
+    rate_limiter.acquire()
+    response = _observed_get(template, url, params, headers, **kwargs)
+    backoff = 0.5
     while response.status_code == 429:
+        to_sleep = _retry_after_seconds(response, default=backoff)
+        get_metrics().observe_throttle(to_sleep)
         logger.warning(
             {
                 "msg": f"Request to wikidata endpoint failed. Retry.",
                 "params": params,
-                "endpoint": sparql_endpoint,
+                "endpoint": url,
                 "response": {
                     "status_code": response.status_code,
                     "headers": dict(response.headers),
@@ -46,40 +74,376 @@ def request_to_wikidata(query, sparql_endpoint=SPARQL_ENDPOINT):
                 "retry_after": to_sleep,
             }
         )
-        if "retry-after" in response.headers:
-            to_sleep += int(response.headers["retry-after"])
-        to_sleep += 0.5
-        time.sleep(to_sleep)
-        response = requests.get(
-            sparql_endpoint,
-            params=params,
-            headers=headers,
-        )
+        # a streamed response holds its connection until it is closed
+        response.close()
+        rate_limiter.pause(to_sleep)
+        backoff = min(backoff * 2, config.MAX_RETRY_AFTER)
+        rate_limiter.acquire()
+        response = _observed_get(template, url, params, headers, **kwargs)
+    return response
+
+
+def sparql_endpoint_or_default(sparql_endpoint: str = None) -> str:
+    """sparql_endpoint_or_default - given endpoint or the configured one at call time
+
+    The configured one is the endpoint of the first backends.SPARQLBackend.
+    """
+    if sparql_endpoint:
+        return sparql_endpoint
+    backend = get_sparql_backend()
+    return backend.endpoint if backend is not None else config.SPARQL_ENDPOINT
+
+
+def _send_sparql(query, sparql_endpoint=None, **kwargs):
+    sparql_endpoint = sparql_endpoint_or_default(sparql_endpoint)
+    pool = get_endpoint_pool(sparql_endpoint)
+    if pool is not None:
+        return _send_sparql_to_pool(pool, query, **kwargs)
+    return _send_sparql_to(sparql_endpoint, query, **kwargs)
+
+
+def _send_sparql_to_pool(pool, query, **kwargs):
+    """_send_sparql_to_pool - send to the best mirror, the next one on failure
+
+    Connection errors and HTTP 5xx responses fail over, the last one
+    is raised or returned when every mirror fails.
+    """
+    error = response = None
+    for endpoint in pool.candidates():
+        with pool.track(endpoint):
+            try:
+                response = _send_sparql_to(endpoint, query, **kwargs)
+            except OSError as e:
+                error, response = e, None
+                pool.failed(endpoint)
+                continue
+        if response.status_code < 500:
+            pool.succeeded(endpoint)
+            return response
+        pool.failed(endpoint)
+    if response is None:
+        raise error
+    return response
+
+
+def _send_sparql_to(sparql_endpoint, query, **kwargs):
+    params = {"format": "json", "query": query}
+    logger.info(
+        {
+            "msg": "Send request to Wikidata",
+            "params": params,
+            "endpoint": sparql_endpoint,
+        }
+    )
+    return get_with_retry(
+        sparql_endpoint,
+        params,
+        SPARQL_HEADERS,
+        template=query_template(query),
+        **kwargs,
+    )
 
+
+def _log_failed_response(e, query, sparql_endpoint, response):
+    logger.error(
+        {
+            "msg": str(e),
+            "params": {"format": "json", "query": query},
+            "endpoint": sparql_endpoint,
+            "response": {
+                "status_code": response.status_code,
+                "headers": dict(response.headers),
+            },
+        }
+    )
+
+
+@cached(
+    "sparql",
+    normalize={
+        "query": normalize_query,
+        "sparql_endpoint": sparql_endpoint_or_default,
+    },
+)
+def request_to_wikidata(query, sparql_endpoint=None):
+    sparql_endpoint = sparql_endpoint_or_default(sparql_endpoint)
+    response = _send_sparql(query, sparql_endpoint)
     try:
-        return response.json()["results"]["bindings"]
+        bindings = response.json()["results"]["bindings"]
     except Exception as e:
-        logger.error(
-            {
-                "msg": str(e),
-                "params": params,
-                "endpoint": sparql_endpoint,
-                "response": {
-                    "status_code": response.status_code,
-                    "headers": dict(response.headers),
-                },
-            }
-        )
+        _log_failed_response(e, query, sparql_endpoint, response)
+        raise e
+    get_metrics().observe_rows(query_template(query), len(bindings))
+    return bindings
+
+
+_BINDINGS_START = re.compile(r'"bindings"\s*:\s*\[')
+
+
+def iter_bindings(chunks):
+    """iter_bindings - incrementally parse bindings of SPARQL JSON response
+
+    Bindings are decoded one by one as soon as they are complete,
+    the whole response is never held in memory.
+
+    Args:
+        chunks: iterable of str - consecutive pieces of response body
+
+    Yields:
+        dict - binding
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        match = _BINDINGS_START.search(buffer)
+        if match is not None:
+            buffer = buffer[match.end() :]
+            break
+    else:
+        raise ValueError("No bindings in SPARQL response")
+
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer):
+            if buffer[position] == "]":
+                return
+            try:
+                binding, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                pass
+            else:
+                yield binding
+                continue
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("SPARQL response is truncated")
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def stream_request_to_wikidata(
+    query, sparql_endpoint=None, chunk_size: int = 2**16
+):
+    """stream_request_to_wikidata - bindings parsed while the response is downloaded
+
+    Result is not cached, use iter_request_to_wikidata with page_size for cached paging.
+
+    Yields:
+        dict - binding
+    """
+    sparql_endpoint = sparql_endpoint_or_default(sparql_endpoint)
+    response = _send_sparql(query, sparql_endpoint, stream=True)
+    rows = 0
+    try:
+        response.raise_for_status()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for binding in iter_bindings(
+            decoder.decode(chunk) for chunk in response.iter_content(chunk_size)
+        ):
+            rows += 1
+            yield binding
+    except Exception as e:
+        _log_failed_response(e, query, sparql_endpoint, response)
         raise e
+    finally:
+        response.close()
+        get_metrics().observe_rows(query_template(query), rows)
+
+
+def paged_query(query: str, limit: int, offset: int, order_by=()) -> str:
+    """paged_query - query with ORDER BY, LIMIT and OFFSET modifiers
+
+    Args:
+        query: str - SELECT query without solution modifiers
+        limit: int - page size
+        offset: int - number of skipped rows
+        order_by: variables to order by for stable pages, e.g. ["?property", "?object"]
+    """
+    modifiers = []
+    if order_by:
+        modifiers.append("ORDER BY " + " ".join(order_by))
+    modifiers.append(f"LIMIT {limit} OFFSET {offset}")
+    return query.rstrip() + "\n" + "\n".join(modifiers)
+
+
+def keyset_query(query: str, limit: int, order_by, after=None) -> str:
+    """keyset_query - page of query which starts after the last row of the previous one
+
+    Rows are ordered by string values of order_by variables and filtered
+    with FILTER(?x > last), so the endpoint does not walk the skipped rows
+    again for every page like with OFFSET.
+
+    Args:
+        query: str - SELECT query without solution modifiers
+        limit: int - page size
+        order_by: variables which identify a row, e.g. ["?property", "?object"]
+        after: values of order_by variables in the last row of the previous page,
+            None for the first page
+    """
+    query = query.rstrip()
+    if after is not None:
+        where = query[: query.rindex("}")].rstrip()
+        query = f"{where}\n    FILTER({_after_filter(order_by, after)})\n}}"
+    order = " ".join(f"STR({variable})" for variable in order_by)
+    return f"{query}\nORDER BY {order}\nLIMIT {limit}"
+
+
+def _after_filter(order_by, after) -> str:
+    # (a, b) > (x, y) is a > x || (a = x && b > y)
+    variable = f"STR({order_by[0]})"
+    value = json.dumps(after[0], ensure_ascii=False)
+    if len(order_by) == 1:
+        return f"{variable} > {value}"
+    rest = _after_filter(order_by[1:], after[1:])
+    return f"{variable} > {value} || ({variable} = {value} && ({rest}))"
+
+
+def last_key(page: list, order_by) -> list:
+    """last_key - values of order_by variables in the last binding of page, see keyset_query"""
+    return [page[-1][variable.lstrip("?")]["value"] for variable in order_by]
+
+
+def iter_request_to_wikidata(
+    query,
+    page_size: int = SPARQL_PAGE_SIZE,
+    max_rows: int = None,
+    order_by=(),
+    sparql_endpoint=None,
+):
+    """iter_request_to_wikidata - bindings of a large query, page by page
+
+    With page_size the query is split into pages, every page is a separate
+    cached request_to_wikidata call, so an interrupted walk resumes
+    from the cache and only missing pages are requested again.
+    With order_by pages are keyset ones (see keyset_query), without it
+    LIMIT/OFFSET ones.
+    Without page_size the query is sent once and bindings are streamed with
+    stream_request_to_wikidata (the cached result is used if it exists).
+
+    Args:
+        query: str - SELECT query without solution modifiers
+        page_size: int - rows in one page, None for one streamed request
+        max_rows: int - stop after this number of bindings
+        order_by: variables bound in every row which together identify it,
+            without them pages are stable only as long as the endpoint
+            returns rows in the same order
+        sparql_endpoint: str - endpoint URL
+
+    Yields:
+        dict - binding
+    """
+    if max_rows is not None and max_rows <= 0:
+        return
+
+    if page_size is None:
+        bindings = get_cache().get(request_to_wikidata.key(query, sparql_endpoint))
+        if bindings is None:
+            bindings = stream_request_to_wikidata(query, sparql_endpoint)
+        for rows, binding in enumerate(bindings, 1):
+            yield binding
+            if rows == max_rows:
+                return
+        return
+
+    rows = 0
+    offset = 0
+    after = None
+    while True:
+        if order_by:
+            page_query = keyset_query(query, page_size, order_by, after)
+        else:
+            page_query = paged_query(query, page_size, offset)
+        page = request_to_wikidata(page_query, sparql_endpoint)
+        for binding in page:
+            yield binding
+            rows += 1
+            if rows == max_rows:
+                return
+        if len(page) < page_size:
+            return
+        offset += page_size
+        if order_by:
+            after = last_key(page, order_by)
+
+
+def request_many_to_wikidata(queries, sparql_endpoint=None) -> list:
+    """request_many_to_wikidata - request_to_wikidata for many queries at once
+
+    All queries are looked up in the cache in one transaction, misses are sent
+    concurrently by the process-wide RequestExecutor and stored in one transaction.
+    A miss which is already being requested by another thread is not sent again.
+
+    Returns:
+        list of lists of bindings in the order of queries
+    """
+    queries = list(queries)
+    cache = get_cache()
+    keys = [request_to_wikidata.key(query, sparql_endpoint) for query in queries]
+    results = cache.get_many(keys)
+    hits = sum(key in results for key in keys)
+    get_metrics().observe_cache("sparql", hits=hits, misses=len(keys) - hits)
+
+    executor = get_executor()
+    single_flight = get_single_flight()
+    futures = {}
+    for key, query in zip(keys, queries):
+        if key not in results and key not in futures:
+            futures[key] = executor.submit(
+                single_flight.do,
+                key,
+                request_to_wikidata.__wrapped__,
+                query,
+                sparql_endpoint,
+            )
+    fetched = {key: future.result() for key, future in futures.items()}
+    cache.put_many(fetched)
+
+    results.update(fetched)
+    return [results[key] for key in keys]
+
+
+def submit_request_to_wikidata(query, sparql_endpoint=None) -> Future:
+    """submit_request_to_wikidata - non-blocking request_to_wikidata
+
+    Query is executed by the process-wide RequestExecutor.
+
+    Returns:
+        concurrent.futures.Future - future with list of bindings
+    """
+    return get_executor().submit(request_to_wikidata, query, sparql_endpoint)
 
 
-@memory.cache
 def get_wd_search_results(
     search_string: str,
     max_results: int = 500,
     language: str = "en",
     mediawiki_api_url: str = "https://www.wikidata.org/w/api.php",
     user_agent: str = None,
+) -> list:
+    """get_wd_search_results - ids of entities found by wbsearchentities
+
+    When a label index is set (see labels.set_label_index) it answers instead.
+    """
+    index = get_label_index()
+    if index is not None:
+        return index.search(search_string, language, max_results)
+    return _request_wd_search_results(
+        search_string, max_results, language, mediawiki_api_url, user_agent
+    )
+
+
+@cached("wbsearchentities")
+def _request_wd_search_results(
+    search_string: str,
+    max_results: int = 500,
+    language: str = "en",
+    mediawiki_api_url: str = "https://www.wikidata.org/w/api.php",
+    user_agent: str = None,
 ) -> list:
     params = {
         "action": "wbsearchentities",
@@ -97,7 +461,7 @@ def get_wd_search_results(
     while cont_count > 0:
         params.update({"continue": 0 if cont_count == 1 else cont_count})
 
-        reply = requests.get(mediawiki_api_url, params=params, headers=headers)
+        reply = get_with_retry(mediawiki_api_url, params=params, headers=headers)
         reply.raise_for_status()
         search_results = reply.json()
 
@@ -116,3 +480,70 @@ def get_wd_search_results(
             break
 
     return results
+
+
+def get_many_wd_search_results(
+    search_strings,
+    max_results: int = 500,
+    language: str = "en",
+    mediawiki_api_url: str = "https://www.wikidata.org/w/api.php",
+    user_agent: str = None,
+) -> list:
+    """get_many_wd_search_results - get_wd_search_results for many strings at once
+
+    Cached results are read in one transaction, the rest are searched
+    concurrently by the process-wide RequestExecutor (its size bounds
+    the parallelism, its rate limiter the request rate) and stored
+    in one transaction. Throughput of the batch is logged.
+    When a label index is set it answers instead.
+
+    Returns:
+        list of lists of entity ids in the order of search_strings
+    """
+    search_strings = list(search_strings)
+    index = get_label_index()
+    if index is not None:
+        return [index.search(s, language, max_results) for s in search_strings]
+
+    started_at = time.perf_counter()
+    cache = get_cache()
+    keys = [
+        _request_wd_search_results.key(
+            search_string, max_results, language, mediawiki_api_url, user_agent
+        )
+        for search_string in search_strings
+    ]
+    results = cache.get_many(keys)
+    hits = sum(key in results for key in keys)
+    get_metrics().observe_cache("wbsearchentities", hits=hits, misses=len(keys) - hits)
+
+    executor = get_executor()
+    single_flight = get_single_flight()
+    futures = {}
+    for key, search_string in zip(keys, search_strings):
+        if key not in results and key not in futures:
+            futures[key] = executor.submit(
+                single_flight.do,
+                key,
+                _request_wd_search_results.__wrapped__,
+                search_string,
+                max_results,
+                language,
+                mediawiki_api_url,
+                user_agent,
+            )
+    fetched = {key: future.result() for key, future in futures.items()}
+    cache.put_many(fetched)
+    results.update(fetched)
+
+    seconds = time.perf_counter() - started_at
+    logger.info(
+        {
+            "msg": "Search batch finished",
+            "search_strings": len(search_strings),
+            "requested": len(fetched),
+            "seconds": seconds,
+            "strings_per_second": len(search_strings) / seconds if seconds else None,
+        }
+    )
+    return [results[key] for key in keys]
@@ -0,0 +1,39 @@
+import pytest
+
+from pywikidata import cache, configure, logger
+from pywikidata.cache import MemoryQueryCache, set_cache
+
+from .fakes import FakeServer
+
+
+@pytest.fixture(autouse=True, scope="session")
+def no_log_file():
+    # throttled requests are logged, keep log.json out of the working directory
+    previous = logger._settings["filename"]
+    configure(log_file=None)
+    yield
+    configure(log_file=previous)
+
+
+@pytest.fixture(autouse=True)
+def memory_cache():
+    # the module global, get_cache() would create the default sqlite cache
+    previous = cache._cache
+    memory = MemoryQueryCache()
+    set_cache(memory)
+    yield memory
+    set_cache(previous)
+
+
+@pytest.fixture
+def local_server():
+    """local_server - start FakeServer with the given arguments"""
+    servers = []
+
+    def start(**kwargs):
+        servers.append(FakeServer(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.stop()
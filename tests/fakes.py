@@ -0,0 +1,82 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None, content=b""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+        self._payload = payload
+        self.closed = False
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeServer:
+    """FakeServer - local HTTP stand-in of a SPARQL endpoint
+
+    Queries are answered with bindings from sparql, an empty list for
+    unknown ones. The first requests get the statuses from errors instead,
+    HTTP 429 with Retry-After: 0.
+
+    Args:
+        errors: list - HTTP statuses of the first requests, e.g. [503]
+    """
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sparql = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def sparql_endpoint(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/sparql"
+
+    def respond(self, path: str):
+        """respond - (status, payload) of GET path"""
+        with self._lock:
+            self.requests += 1
+            if self.requests <= len(self.errors):
+                return self.errors[self.requests - 1], None
+        query = parse_qs(urlparse(path).query).get("query", [""])[0]
+        return 200, {"results": {"bindings": self.sparql.get(query, [])}}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, payload = server.respond(self.path)
+                body = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
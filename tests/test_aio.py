@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from pywikidata import Entity, aio
+from pywikidata.backends import (
+    ENTITY_URI,
+    RDFS_LABEL,
+    SPARQLBackend,
+    TripleStoreBackend,
+    literal,
+)
+from pywikidata.executor import RateLimiter
+
+
+@pytest.fixture
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(aio, "get_rate_limiter", lambda: RateLimiter(rate=0))
+
+
+@pytest.mark.usefixtures("no_rate_limit")
+class TestAsyncClient:
+    def test_retries_after_429(self, local_server):
+        server = local_server(errors=[429])
+        server.sparql["SELECT 1"] = []
+
+        async def main():
+            client = aio.AsyncClient(max_concurrency=2)
+            try:
+                return await client.get_json(
+                    server.sparql_endpoint, params={"query": "SELECT 1"}
+                )
+            finally:
+                await client.close()
+
+        assert asyncio.run(main()) == {"results": {"bindings": []}}
+        assert server.requests == 2
+
+    def test_retries_5xx(self, local_server):
+        server = local_server(errors=[503, 502])
+        client = aio.AsyncClient(retries=2, backoff_factor=0)
+        main = client.get_json(server.sparql_endpoint, params={"query": "SELECT 1"})
+        assert asyncio.run(main) == {"results": {"bindings": []}}
+        assert server.requests == 3
+
+    def test_raises_when_retries_are_exhausted(self, local_server):
+        server = local_server(errors=[503, 503])
+        client = aio.AsyncClient(retries=1, backoff_factor=0)
+        with pytest.raises(aiohttp.ClientResponseError):
+            asyncio.run(client.get_json(server.sparql_endpoint))
+        assert server.requests == 2
+
+    def test_session_is_closed_with_its_loop(self, local_server):
+        server = local_server()
+        client = aio.AsyncClient()
+        asyncio.run(client.get_json(server.sparql_endpoint))
+        session = client._session
+        assert session.closed
+
+        asyncio.run(client.get_json(server.sparql_endpoint))
+        assert client._session is not session
+
+    def test_async_with_closes_session(self, local_server):
+        server = local_server()
+
+        async def main():
+            async with aio.AsyncClient() as client:
+                await client.get_json(server.sparql_endpoint)
+            return client._session
+
+        assert asyncio.run(main()).closed
+
+
+@pytest.mark.usefixtures("no_rate_limit")
+class TestAsyncRequestToWikidata:
+    @pytest.fixture(autouse=True)
+    def client(self, monkeypatch):
+        monkeypatch.setattr(aio, "_client", aio.AsyncClient(retries=0))
+
+    def test_concurrent_identical_queries_are_sent_once(self, local_server):
+        server = local_server()
+        server.sparql["SELECT 1"] = [{"x": {"value": "1"}}]
+
+        async def main():
+            return await asyncio.gather(
+                *(
+                    aio.async_request_to_wikidata("SELECT 1", server.sparql_endpoint)
+                    for _ in range(5)
+                )
+            )
+
+        assert asyncio.run(main()) == [[{"x": {"value": "1"}}]] * 5
+        assert server.requests == 1
+
+    def test_fails_over_to_mirror(self, local_server):
+        down = local_server(errors=[503, 503])
+        up = local_server()
+        up.sparql["SELECT 1"] = up.sparql["SELECT 2"] = [{"x": {"value": "1"}}]
+        Entity.configure_backends(
+            [SPARQLBackend([down.sparql_endpoint, up.sparql_endpoint])]
+        )
+        try:
+            # pool rotates the first candidate, the failing one is tried first once
+            for query in ("SELECT 1", "SELECT 2"):
+                bindings = asyncio.run(aio.async_request_to_wikidata(query))
+                assert bindings == [{"x": {"value": "1"}}]
+        finally:
+            Entity.configure_backends(None)
+        assert down.requests == 1
+        assert up.requests == 2
+
+
+class TestAsyncEntity:
+    def test_aload_fills_shared_singleton(self, monkeypatch):
+        async def fake_request(query):
+            if "rdfs:label" in query:
+                return [{"label": {"value": "Async label"}}]
+            return [{"instance_of": {"value": "http://www.wikidata.org/entity/Q5"}}]
+
+        monkeypatch.setattr(aio, "async_request_to_wikidata", fake_request)
+
+        async def main():
+            entity = await aio.AsyncEntity("Q920001").aload("label", "instance_of")
+            return entity, await entity.label
+
+        entity, label = asyncio.run(main())
+        assert label == "Async label"
+        assert entity.entity is Entity("Q920001")
+        assert Entity("Q920001").label == "Async label"
+        assert Entity("Q920001").instance_of == [Entity("Q5")]
+
+    def test_load_keeps_value_resolved_meanwhile(self, monkeypatch):
+        async def fake_request(query):
+            # a sync thread resolves the field while the request is in flight
+            Entity("Q920002")._set_field("label", "Sync label")
+            return [{"label": {"value": "Async label"}}]
+
+        monkeypatch.setattr(aio, "async_request_to_wikidata", fake_request)
+        assert asyncio.run(aio.AsyncEntity("Q920002").label) == "Sync label"
+
+    def test_local_backend_answers(self, monkeypatch):
+        async def fail(query):
+            raise AssertionError("SPARQL endpoint must not be requested")
+
+        monkeypatch.setattr(aio, "async_request_to_wikidata", fail)
+        store = TripleStoreBackend(
+            [(ENTITY_URI + "Q920003", RDFS_LABEL, literal("Local label"))]
+        )
+        Entity.configure_backends([store])
+        try:
+            assert asyncio.run(aio.AsyncEntity("Q920003").label) == "Local label"
+        finally:
+            Entity.configure_backends(None)
@@ -0,0 +1,132 @@
+import threading
+
+from pywikidata import Entity, attributes, executor, utils
+from pywikidata.executor import RateLimiter, RequestExecutor
+
+from .fakes import FakeResponse
+
+
+class TestLoadAttributes:
+    def test_batched_and_cached(self, monkeypatch):
+        requests = []
+
+        def fake_http_get(url, params=None, headers=None, **kwargs):
+            requests.append(params)
+            if len(requests) == 1:
+                return FakeResponse(429, headers={"retry-after": "0"})
+            ids = params["ids"].split("|")
+            return FakeResponse(
+                200,
+                {
+                    "entities": {
+                        idx: {"id": idx, "labels": {"en": {"value": idx}}}
+                        for idx in ids
+                    }
+                },
+            )
+
+        monkeypatch.setattr(utils, "http_get", fake_http_get)
+        monkeypatch.setattr(utils, "get_rate_limiter", lambda: RateLimiter(rate=0))
+        ids = [f"Q99{i:04d}" for i in range(60)]
+        entities = Entity.load_attributes(ids, props=["labels"], languages=["en"])
+
+        assert len(requests) == 3
+        assert requests[0]["props"] == "labels"
+        assert entities[59].attributes["labels"]["en"]["value"] == "Q990059"
+
+        data = attributes.load_entity_data(ids[:2], props=["labels"], languages=["en"])
+        assert data["Q990000"]["id"] == "Q990000"
+        assert len(requests) == 3
+
+    def test_inside_executor_workers(self, monkeypatch):
+        def fake_http_get(url, params=None, headers=None, **kwargs):
+            ids = params["ids"].split("|")
+            return FakeResponse(200, {"entities": {idx: {"id": idx} for idx in ids}})
+
+        monkeypatch.setattr(utils, "http_get", fake_http_get)
+        monkeypatch.setattr(utils, "get_rate_limiter", lambda: RateLimiter(rate=0))
+        pool = RequestExecutor(max_workers=2, rate_limiter=RateLimiter(rate=0))
+        monkeypatch.setattr(executor, "_executor", pool)
+        entities = [Entity(f"Q99{i:04d}") for i in range(100, 104)]
+        results = []
+
+        thread = threading.Thread(
+            target=lambda: results.extend(pool.map(lambda e: e.attributes, entities)),
+            daemon=True,
+        )
+        thread.start()
+        thread.join(10)
+        pool.shutdown(wait=False)
+        assert not thread.is_alive()
+        assert [a.idx for a in results] == [e.idx for e in entities]
+
+
+ENTITY_JSON = {
+    "id": "Q991001",
+    "type": "item",
+    "labels": {
+        "en": {"language": "en", "value": "Compact"},
+        "de": {"language": "de", "value": "Kompakt"},
+    },
+    "sitelinks": {"enwiki": {"site": "enwiki", "title": "Compact"}},
+    "claims": {
+        "P31": [
+            {
+                "id": "Q991001$1",
+                "type": "statement",
+                "rank": "normal",
+                "mainsnak": {
+                    "snaktype": "value",
+                    "property": "P31",
+                    "hash": "abc",
+                    "datatype": "wikibase-item",
+                    "datavalue": {
+                        "type": "wikibase-entityid",
+                        "value": {"entity-type": "item", "numeric-id": 5, "id": "Q5"},
+                    },
+                },
+                "qualifiers": {"P580": []},
+                "references": [{"snaks": {}}],
+            }
+        ]
+    },
+}
+
+
+class TestAttributesProjection:
+    def test_projection_and_compact_claims(self):
+        projection = attributes.AttributesProjection(
+            keys=["labels", "claims"],
+            languages=["en"],
+            keep_references=False,
+            compact_claims=True,
+        )
+        assert projection.props() == ["claims", "labels"]
+
+        projected = projection.apply(ENTITY_JSON)
+        assert set(projected) == {"id", "type", "labels", "claims"}
+        assert list(projected["labels"]) == ["en"]
+
+        claim = projected["claims"]["P31"][0]
+        assert isinstance(claim, attributes.Claim)
+        assert claim.value == "Q5"
+        assert claim["mainsnak"]["datavalue"]["value"]["numeric-id"] == 5
+        assert claim["qualifiers"] == {"P580": []}
+        assert "references" not in claim
+        assert dict(claim)["rank"] == "normal"
+
+    def test_projection_is_used_on_load(self, monkeypatch):
+        monkeypatch.setattr(
+            attributes,
+            "load_entity_data",
+            lambda ids, props, languages: {idx: ENTITY_JSON for idx in ids},
+        )
+        try:
+            attributes.set_projection(
+                attributes.AttributesProjection(keys=["claims"], compact_claims=True)
+            )
+            entity = Entity("Q991001")
+            assert entity.attributes["labels"] is None
+            assert entity.attributes["claims"]["P31"][0].value == "Q5"
+        finally:
+            attributes.set_projection(None)
@@ -0,0 +1,148 @@
+import pytest
+
+from pywikidata import Entity, utils
+from pywikidata.backends import (
+    DIRECT_PROPERTY_URI,
+    ENTITY_URI,
+    RDFS_LABEL,
+    EndpointPool,
+    OfflineIndexBackend,
+    SPARQLBackend,
+    TripleStoreBackend,
+    literal,
+    route,
+)
+
+from .fakes import FakeResponse
+
+WD, WDT = ENTITY_URI, DIRECT_PROPERTY_URI
+
+TRIPLES = [
+    (WD + "Q960001", RDFS_LABEL, literal("Capital")),
+    (WD + "Q960001", RDFS_LABEL, literal("Hauptstadt", "de")),
+    (WD + "Q960001", WDT + "P31", WD + "Q960002"),
+    (WD + "Q960001", WDT + "P17", WD + "Q960003"),
+    (WD + "Q960002", RDFS_LABEL, literal("City")),
+    (WD + "Q960002", WDT + "P279", WD + "Q960003"),
+    (WD + "Q960003", WDT + "P31", WD + "Q960002"),
+]
+
+
+@pytest.fixture
+def triple_store(monkeypatch):
+    def fail(query, sparql_endpoint=None):
+        raise AssertionError("SPARQL endpoint must not be requested")
+
+    monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", fail)
+    store = TripleStoreBackend(TRIPLES)
+    Entity.configure_backends([store, SPARQLBackend()])
+    yield store
+    Entity.configure_backends(None)
+
+
+class TestTripleStoreBackend:
+    def test_entity_fields(self, triple_store):
+        assert len(triple_store) == len(TRIPLES)
+        entity = Entity("Q960001")
+        assert entity.label == "Capital"
+        assert entity.instance_of == [Entity("Q960002")]
+        assert Entity("Q960002").superclasses() == {"Q960002", "Q960003"}
+        # only neighbours with instance_of are listed
+        assert list(entity.iter_one_hop_neighbours("forward")) == [
+            ("P17", "Q960003", "Q960002")
+        ]
+
+    def test_prefetch_and_labels(self, triple_store):
+        entities = Entity.prefetch(["Q960002", "Q960003"], fields=["label"])
+        assert [e._label for e in entities] == ["City", None]
+        assert Entity.from_labels(["Capital", "Missing"]) == [[Entity("Q960001")], []]
+
+    def test_from_ntriples(self, tmp_path):
+        path = tmp_path / "subset.nt"
+        path.write_text(
+            f'<{WD}Q1> <{RDFS_LABEL}> "Say \\"hi\\""@en .\n'
+            f"<{WD}Q1> <{WDT}P31> <{WD}Q5> .\n"
+            f'<{WD}Q2> <{RDFS_LABEL}> "caf\\U0001F600 \\u00e9\\\'s\\tend"@en .\n'
+            "# comment\n",
+            encoding="utf-8",
+        )
+        store = TripleStoreBackend.from_ntriples(path)
+        assert store.request("_request_label", "Q1") == [
+            {"label": {"type": "literal", "xml:lang": "en", "value": 'Say "hi"'}}
+        ]
+        # non-BMP and ECHAR escapes, one of them must not abort the load
+        assert store.request("_request_label", "Q2")[0]["label"]["value"] == (
+            "caf\U0001f600 \u00e9's\tend"
+        )
+        assert store.request("_request_instance_of_batch", ["Q1"]) == [
+            {
+                "instance_of": {"type": "uri", "value": WD + "Q5"},
+                "entity": {"type": "uri", "value": WD + "Q1"},
+            }
+        ]
+
+
+class TestRoute:
+    def test_capabilities(self, monkeypatch):
+        store = TripleStoreBackend()
+        monkeypatch.setattr(store, "capabilities", frozenset(["fields"]))
+        sparql = SPARQLBackend("http://127.0.0.1:1/sparql")
+        Entity.configure_backends([OfflineIndexBackend(), store, sparql])
+        try:
+            # the offline index is not set, so it is skipped
+            assert route("_request_label") is store
+            assert route("_request_label_batch") is sparql
+            assert route("_request_superclasses") is sparql
+            assert utils.sparql_endpoint_or_default() == "http://127.0.0.1:1/sparql"
+        finally:
+            Entity.configure_backends(None)
+
+    def test_exclusive_backend(self, monkeypatch):
+        backend = OfflineIndexBackend(index=object())
+        Entity.configure_backends([backend, SPARQLBackend()])
+        try:
+            with pytest.raises(NotImplementedError):
+                route("_request_entity_by_label_batch")
+        finally:
+            Entity.configure_backends(None)
+
+
+class TestEndpointPool:
+    def test_failover(self, monkeypatch):
+        sent = []
+
+        def send(endpoint, query, **kwargs):
+            sent.append(endpoint)
+            if endpoint == "http://down":
+                raise ConnectionError("refused")
+            if endpoint == "http://broken":
+                return FakeResponse(503)
+            return FakeResponse(200)
+
+        monkeypatch.setattr(utils, "_send_sparql_to", send)
+        pool = EndpointPool(["http://down", "http://broken", "http://up"])
+        for _ in range(3):
+            assert utils._send_sparql_to_pool(pool, "SELECT 1").status_code == 200
+        # failed endpoints are skipped during cooldown
+        assert sent.count("http://down") == 1
+        assert sent.count("http://broken") == 1
+        stats = pool.stats()
+        assert stats["http://up"]["requests"] == 3
+        assert not stats["http://down"]["healthy"]
+
+    def test_balancing(self):
+        pool = EndpointPool(["http://a", "http://b"])
+        assert {pool.candidates()[0] for _ in range(4)} == {"http://a", "http://b"}
+        with pool.track("http://a"):
+            assert [pool.candidates()[0] for _ in range(2)] == ["http://b"] * 2
+
+    def test_mirrors_share_cache_key(self):
+        backend = SPARQLBackend(["http://primary", "http://mirror"])
+        Entity.configure_backends([backend])
+        try:
+            assert utils.request_to_wikidata.key("SELECT 1") == (
+                utils.request_to_wikidata.key("SELECT 1", "http://primary")
+            )
+            assert utils.get_endpoint_pool("http://primary") is backend.pool
+        finally:
+            Entity.configure_backends(None)
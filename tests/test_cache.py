@@ -0,0 +1,102 @@
+import time
+
+from pywikidata import utils
+from pywikidata.executor import RateLimiter, RequestExecutor
+from pywikidata.cache import (
+    MemoryQueryCache,
+    SQLiteQueryCache,
+    cache_key,
+    cached,
+    normalize_query,
+)
+
+
+class TestSQLiteQueryCache:
+    def test_bulk_roundtrip(self, tmp_path):
+        cache = SQLiteQueryCache(tmp_path / "cache.sqlite")
+        items = {cache_key("test", i): [{"value": i}] for i in range(1000)}
+        cache.put_many(items)
+
+        assert len(cache) == 1000
+        assert cache.get_many(items.keys()) == items
+        assert cache.get(cache_key("test", "missing")) is None
+
+    def test_shared_between_connections(self, tmp_path):
+        SQLiteQueryCache(tmp_path / "cache.sqlite").put(b"key", ["value"])
+        assert SQLiteQueryCache(tmp_path / "cache.sqlite").get(b"key") == ["value"]
+
+
+class TestCachedRequests:
+    def test_query_whitespace_is_normalized(self):
+        assert normalize_query("SELECT *\n   WHERE { }") == "SELECT * WHERE { }"
+        assert utils.request_to_wikidata.key("SELECT *\n WHERE {}") == (
+            utils.request_to_wikidata.key("SELECT * WHERE {}")
+        )
+
+    def test_request_many_sends_only_misses(self, monkeypatch, memory_cache):
+        sent = []
+
+        def fake_request(query, sparql_endpoint=None):
+            sent.append(query)
+            return [{"query": {"value": query}}]
+
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", fake_request)
+        memory_cache.put(utils.request_to_wikidata.key("cached"), [])
+
+        assert utils.request_many_to_wikidata(["cached", "a", "b", "a"]) == [
+            [],
+            [{"query": {"value": "a"}}],
+            [{"query": {"value": "b"}}],
+            [{"query": {"value": "a"}}],
+        ]
+        assert sorted(sent) == ["a", "b"]
+
+    def test_concurrent_misses_send_one_request(self, monkeypatch, memory_cache):
+        sent = []
+
+        def slow_request(query, sparql_endpoint=None):
+            sent.append(query)
+            time.sleep(0.05)
+            return [{"x": {"value": "1"}}]
+
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", slow_request)
+        queries = ["SELECT ?x WHERE {}", "SELECT ?x\n  WHERE {}"] * 4
+        with RequestExecutor(max_workers=8, rate_limiter=RateLimiter(rate=0)) as ex:
+            results = ex.map(utils.request_to_wikidata, queries)
+
+        assert len(sent) == 1
+        assert results == [[{"x": {"value": "1"}}]] * 8
+
+    def test_hits_and_misses_counted_once(self, memory_cache):
+        @cached("test_counts")
+        def square(x):
+            return x * x
+
+        assert [square(1), square(1), square(2)] == [1, 1, 4]
+        stats = memory_cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+class TestCacheLimits:
+    def test_memory_lru_eviction(self):
+        cache = MemoryQueryCache(max_entries=10)
+        cache.put_many({cache_key("k", i): i for i in range(10)})
+        cache.get(cache_key("k", 0))
+        cache.put(cache_key("k", 10), 10)
+
+        assert cache.get(cache_key("k", 0)) == 0
+        assert cache.get(cache_key("k", 1)) is None
+        assert cache.stats()["evictions"] == 2
+
+    def test_sqlite_ttl_and_eviction(self, tmp_path):
+        cache = SQLiteQueryCache(tmp_path / "cache.sqlite", ttl=0.05, max_entries=100)
+        cache.put(b"old", 1)
+        time.sleep(0.1)
+        assert cache.get(b"old") is None
+        assert cache.stats()["expirations"] == 1
+
+        cache.ttl = None
+        cache.put_many({cache_key("k", i): i for i in range(150)})
+        cache.evict()
+        assert len(cache) <= 100
+        assert cache.stats()["misses"] == 1
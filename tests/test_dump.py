@@ -0,0 +1,108 @@
+import gzip
+import json
+
+import pytest
+
+from pywikidata.dump import DumpPipeline
+
+
+def _write_dump(path, count):
+    with gzip.open(path, "wt") as f:
+        f.write("[\n")
+        lines = []
+        for i in range(count):
+            claims = {}
+            if i % 2 == 0:
+                claims["P31"] = [
+                    {
+                        "mainsnak": {
+                            "snaktype": "value",
+                            "property": "P31",
+                            "datavalue": {
+                                "type": "wikibase-entityid",
+                                "value": {"id": "Q5"},
+                            },
+                        },
+                        "rank": "normal",
+                    }
+                ]
+            lines.append(
+                json.dumps(
+                    {
+                        "type": "item",
+                        "id": f"Q{i + 1}",
+                        "labels": {"en": {"language": "en", "value": f"item {i}"}},
+                        "claims": claims,
+                    }
+                )
+            )
+        f.write(",\n".join(lines))
+        f.write("\n]\n")
+
+
+class TestDumpPipeline:
+    def test_parallel_records_keep_order(self, tmp_path):
+        _write_dump(tmp_path / "dump.json.gz", 200)
+        pipeline = DumpPipeline(
+            tmp_path / "dump.json.gz",
+            require_instance_of=True,
+            processes=2,
+            chunk_size=1024,
+        )
+
+        ids = [record["id"] for record in pipeline]
+        assert ids == [f"Q{i + 1}" for i in range(0, 200, 2)]
+        assert pipeline.stats["entities"] == 200
+        assert pipeline.stats["records"] == 100
+
+    def test_resume_from_checkpoint(self, tmp_path):
+        _write_dump(tmp_path / "dump.json.gz", 100)
+        options = dict(
+            processes=0,
+            chunk_size=512,
+            checkpoint_path=str(tmp_path / "checkpoint.json"),
+        )
+
+        first = []
+        for record in DumpPipeline(tmp_path / "dump.json.gz", **options):
+            first.append(record["id"])
+            if len(first) == 30:
+                break
+        checkpoint = json.loads((tmp_path / "checkpoint.json").read_text())
+        rest = [r["id"] for r in DumpPipeline(tmp_path / "dump.json.gz", **options)]
+
+        assert 0 < checkpoint["offset"]
+        assert rest[-1] == "Q100"
+        assert set(first) | set(rest) == {f"Q{i + 1}" for i in range(100)}
+        assert len(rest) < 100
+
+    def test_checkpoint_of_this_run(self, tmp_path):
+        _write_dump(tmp_path / "dump.json.gz", 100)
+        _write_dump(tmp_path / "other.json.gz", 10)
+        checkpoint_path = tmp_path / "checkpoint.json"
+        checkpoint_path.write_text(
+            json.dumps(
+                {
+                    "path": str(tmp_path / "dump.json.gz"),
+                    "offset": 0,
+                    "entities": 10**9,
+                    "records": 0,
+                }
+            )
+        )
+
+        pipeline = DumpPipeline(
+            tmp_path / "dump.json.gz", processes=0, checkpoint_path=checkpoint_path
+        )
+        assert len(list(pipeline)) == 100
+        seconds = pipeline.stats["seconds"]
+        assert pipeline.stats["entities"] == 10**9 + 100
+        # restored entities are not counted in the rate
+        assert pipeline.stats["entities_per_second"] <= 100 / seconds
+
+        with pytest.raises(ValueError):
+            list(
+                DumpPipeline(
+                    tmp_path / "other.json.gz", checkpoint_path=checkpoint_path
+                )
+            )
@@ -1,4 +1,12 @@
-from pywikidata import Entity
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pywikidata import Entity, executor, utils
+from pywikidata.executor import RateLimiter, RequestExecutor
+from pywikidata.offline import decode_id
 
 
 class TestEntity:
@@ -34,3 +42,291 @@ class TestEntity:
     def test_attributes(self):
         entity = Entity("Q90")
         assert len(entity.attributes) > 0
+
+
+class TestEntityPrefetch:
+    def test_prefetch_batches_requests(self, monkeypatch):
+        queries = []
+
+        def fake_request_to_wikidata(query, sparql_endpoint=None):
+            queries.append(query)
+            if "rdfs:label" in query:
+                return [
+                    {
+                        "entity": {"value": "http://www.wikidata.org/entity/Q910001"},
+                        "label": {"value": "First"},
+                    },
+                    {
+                        "entity": {"value": "http://www.wikidata.org/entity/Q910002"},
+                        "label": {"value": "Second"},
+                    },
+                ]
+            return [
+                {
+                    "entity": {"value": "http://www.wikidata.org/entity/Q910001"},
+                    "instance_of": {"value": "http://www.wikidata.org/entity/Q5"},
+                },
+            ]
+
+        monkeypatch.setattr(
+            utils.request_to_wikidata, "__wrapped__", fake_request_to_wikidata
+        )
+        entities = Entity.prefetch(
+            ["Q910001", "Q910002", "Q910003"],
+            fields=["label", "instance_of"],
+            chunk_size=2,
+        )
+
+        assert len(queries) == 4
+        assert "VALUES ?entity { wd:Q910001 wd:Q910002 }" in queries[0]
+        assert [e.label for e in entities[:2]] == ["First", "Second"]
+        assert entities[0].instance_of == [Entity("Q5")]
+        assert entities[2].instance_of == []
+
+    def test_prefetch_wrong_field(self):
+        with pytest.raises(ValueError):
+            Entity.prefetch(["Q910001"], fields=["population"])
+
+
+class TestEntityFromLabels:
+    def test_values_batches_and_search_fallback(self, monkeypatch):
+        queries = []
+        searched = []
+        items = {
+            '"Paris"@en': "Q993201",
+            '"berlin"@en': "Q993202",
+            '"Say \\"hi\\""@en': "Q993203",
+        }
+
+        def fake_request_to_wikidata(query, sparql_endpoint=None):
+            queries.append(query)
+            return [
+                {
+                    "item": {"value": f"http://www.wikidata.org/entity/{idx}"},
+                    "label": {"value": json.loads(literal[: -len("@en")])},
+                }
+                for literal, idx in items.items()
+                if literal in query
+            ]
+
+        def fake_search(search_string, *args):
+            searched.append(search_string)
+            return ["Q993204"]
+
+        monkeypatch.setattr(
+            utils.request_to_wikidata, "__wrapped__", fake_request_to_wikidata
+        )
+        monkeypatch.setattr(
+            utils._request_wd_search_results, "__wrapped__", fake_search
+        )
+        labels = ["Paris", "Berlin", 'Say "hi"', "Nowhere", "Paris"]
+
+        assert Entity.from_labels(labels, chunk_size=4) == [
+            [Entity("Q993201")],
+            [Entity("Q993202")],
+            [Entity("Q993203")],
+            [],
+            [Entity("Q993201")],
+        ]
+        # 8 label variants, 4 in one VALUES clause
+        assert len(queries) == 2
+        assert Entity.from_labels(labels, search=True)[3] == [Entity("Q993204")]
+        assert searched == ["Nowhere"]
+
+    def test_inside_executor_workers(self, monkeypatch):
+        monkeypatch.setattr(
+            utils.request_to_wikidata, "__wrapped__", lambda q, e=None: []
+        )
+        monkeypatch.setattr(
+            utils._request_wd_search_results,
+            "__wrapped__",
+            lambda search_string, *args: [f"Q99330{search_string[-1]}"],
+        )
+        pool = RequestExecutor(max_workers=2, rate_limiter=RateLimiter(rate=0))
+        monkeypatch.setattr(executor, "_executor", pool)
+        results = []
+
+        def resolve(n):
+            return Entity.from_labels([f"Lost {n}", f"Gone {n}"], search=True)
+
+        thread = threading.Thread(
+            target=lambda: results.extend(pool.map(resolve, range(4))), daemon=True
+        )
+        thread.start()
+        thread.join(10)
+        pool.shutdown(wait=False)
+        assert not thread.is_alive()
+        assert results[3] == [[Entity("Q993303")], [Entity("Q993303")]]
+
+
+class TestEntityRegistry:
+    def test_weak_registry_keeps_singletons(self):
+        try:
+            Entity.configure_registry("bounded", max_size=2)
+            entity = Entity("Q930001")
+            entity._label = "kept"
+            for idx in range(930002, 930010):
+                Entity(f"Q{idx}")
+
+            assert Entity("Q930001") is entity
+            assert Entity.registry_stats()["kept_alive"] == 2
+        finally:
+            Entity.configure_registry("strong")
+
+
+class TestEntityNeighbours:
+    @staticmethod
+    def _binding(prop_id, object_id, instance_of_id):
+        entity_uri = "http://www.wikidata.org/entity/"
+        return {
+            "property": {"value": f"http://www.wikidata.org/prop/direct/{prop_id}"},
+            "object": {"value": entity_uri + object_id},
+            "instance_of": {"value": entity_uri + instance_of_id},
+        }
+
+    def test_process_neighbours_dedup(self):
+        responce = [
+            self._binding("P31", "Q960001", "Q960002"),
+            self._binding("P31", "Q960001", "Q960003"),
+            self._binding("P31", "Q960001", "Q960003"),
+            self._binding("P17", "Q960004", "Q960002"),
+            {
+                "property": {"value": "http://www.w3.org/2000/01/rdf-schema#label"},
+                "object": {"value": "http://www.wikidata.org/entity/Q960005"},
+                "instance_of": {"value": "http://www.wikidata.org/entity/Q960002"},
+            },
+        ]
+
+        columns = Entity._process_one_hop_neighbour_columns(responce)
+        assert columns.properties.typecode == "q"
+        assert [decode_id(k) for k in columns.properties] == ["P31", "P31", "P17"]
+        assert [decode_id(k) for k in columns.neighbours] == [
+            "Q960001",
+            "Q960001",
+            "Q960004",
+        ]
+        assert [decode_id(k) for k in columns.instance_of] == [
+            "Q960002",
+            "Q960003",
+            "Q960002",
+        ]
+
+        neighbours = Entity._process_one_hop_neighbours_with_instance_of(responce)
+        assert neighbours == [
+            (Entity("P31"), Entity("Q960001")),
+            (Entity("P17"), Entity("Q960004")),
+        ]
+        assert Entity("Q960001").instance_of == [Entity("Q960002"), Entity("Q960003")]
+
+
+class TestEntityHydration:
+    @pytest.fixture
+    def hydration(self):
+        yield Entity.configure_hydration
+        Entity.configure_hydration("off")
+
+    def test_sparql_card(self, monkeypatch, hydration):
+        queries = []
+
+        def fake_request_to_wikidata(query, sparql_endpoint=None):
+            queries.append(query)
+            return [
+                {"field": {"value": "label"}, "value": {"value": "Card"}},
+                {"field": {"value": "aliases"}, "value": {"value": "card"}},
+                {
+                    "field": {"value": "instance_of"},
+                    "value": {"value": "http://www.wikidata.org/entity/Q5"},
+                },
+            ]
+
+        monkeypatch.setattr(
+            utils.request_to_wikidata, "__wrapped__", fake_request_to_wikidata
+        )
+        hydration("sparql")
+        entity = Entity("Q980001")
+        assert entity.label == "Card"
+        assert entity.aliases == ["card"]
+        assert entity.instance_of == [Entity("Q5")]
+        assert entity.description is None
+        assert entity.subclass_of == []
+        assert len(queries) == 1
+
+    def test_entity_data(self, hydration):
+        hydration("entitydata")
+        entity = Entity("Q980002")
+        entity.attributes._attributes = {
+            "id": "Q980002",
+            "labels": {"en": {"language": "en", "value": "Data"}},
+            "descriptions": {"en": {"language": "en", "value": "From JSON"}},
+            "aliases": {},
+            "claims": {
+                "P31": [
+                    {
+                        "mainsnak": {
+                            "snaktype": "value",
+                            "datavalue": {
+                                "type": "wikibase-entityid",
+                                "value": {"id": "Q5"},
+                            },
+                        },
+                        "rank": "normal",
+                    }
+                ]
+            },
+        }
+        assert entity.label == "Data"
+        assert entity.description == ["From JSON"]
+        assert entity.instance_of == [Entity("Q5")]
+        assert entity.image is None
+
+        with pytest.raises(ValueError):
+            hydration("everything")
+
+
+class TestEntityConcurrency:
+    def test_first_access_is_loaded_once(self, monkeypatch):
+        sent = []
+
+        def slow_request(query, sparql_endpoint=None):
+            sent.append(query)
+            time.sleep(0.05)
+            return [{"label": {"value": "Shared"}}]
+
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", slow_request)
+        entity = Entity("Q993101")
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            labels = list(ex.map(lambda _: entity.label, range(8)))
+
+        assert labels == ["Shared"] * 8
+        assert len(sent) == 1
+
+
+class TestEntityLayout:
+    def test_slots_and_lazy_attributes(self):
+        entity = Entity("http://www.wikidata.org/entity/Q992001")
+        assert not hasattr(entity, "__dict__")
+        assert entity.idx == "Q992001"
+        assert Entity("q992001") is entity
+        assert Entity("P992001").is_property and not entity.is_property
+        assert entity._attributes is None
+        assert entity.attributes is entity.attributes
+        with pytest.raises(ValueError):
+            Entity("X992001")
+
+    def test_pickle_returns_singleton(self):
+        import pickle
+
+        entity = Entity("Q992002")
+        assert pickle.loads(pickle.dumps(entity)) is entity
+
+    def test_shared_empty_list(self):
+        empty = Entity._parse_field("instance_of", [])
+        assert empty == [] and empty is Entity._parse_field("subclass_of", [])
+        with pytest.raises(TypeError):
+            empty.append(Entity("Q5"))
+
+        entity = Entity("Q992003")
+        entity._instance_of = empty
+        # public fields do not expose the shared list
+        entity.instance_of.append(Entity("Q5"))
+        assert entity.instance_of == [] and entity._instance_of is empty
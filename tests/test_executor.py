@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from pywikidata import executor, session, utils
+from pywikidata.executor import RateLimiter, RequestExecutor, SingleFlight
+
+from .fakes import FakeResponse
+
+
+class TestRateLimiter:
+    def test_burst_then_limited(self):
+        limiter = RateLimiter(rate=50, capacity=2)
+        assert limiter.acquire() == 0
+        assert limiter.acquire() == 0
+        assert limiter.acquire() > 0
+
+    def test_pause_is_shared(self):
+        limiter = RateLimiter(rate=0)
+        limiter.pause(0.05)
+        limiter.pause(0.01)
+        assert limiter.paused
+        start = time.monotonic()
+        limiter.acquire()
+        assert time.monotonic() - start >= 0.04
+
+
+class TestRequestExecutor:
+    def test_map_keeps_order(self):
+        with RequestExecutor(max_workers=4, rate_limiter=RateLimiter(rate=0)) as ex:
+            assert ex.map(lambda x: x * 2, range(10)) == [x * 2 for x in range(10)]
+
+    def test_bulk_helper_inside_worker(self, monkeypatch):
+        monkeypatch.setattr(
+            utils.request_to_wikidata, "__wrapped__", lambda q, e=None: [{"q": q}]
+        )
+        pool = RequestExecutor(max_workers=2, rate_limiter=RateLimiter(rate=0))
+        monkeypatch.setattr(executor, "_executor", pool)
+        results = []
+
+        def run():
+            results.extend(
+                pool.map(
+                    lambda n: utils.request_many_to_wikidata([f"{n}a", f"{n}b"]),
+                    range(4),
+                )
+            )
+
+        # every worker waits for nested requests, they must not queue behind it
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(10)
+        pool.shutdown(wait=False)
+        assert not thread.is_alive()
+        assert results[3] == [[{"q": "3a"}], [{"q": "3b"}]]
+
+    def test_configure_keeps_injected_session(self, monkeypatch):
+        injected = object()
+        monkeypatch.setattr(session, "_session", None)
+        monkeypatch.setattr(session, "_injected", False)
+        monkeypatch.setattr(session, "_pool_size", None)
+        session.set_session(injected)
+        executor.configure_executor(max_workers=3)
+        assert session.get_session() is injected
+        session.set_session(None)
+        executor.configure_executor()
+
+    def test_request_retries_after_429(self, monkeypatch):
+        throttled = FakeResponse(429, headers={"retry-after": "0"})
+        responses = [
+            throttled,
+            FakeResponse(200, payload={"results": {"bindings": [{"x": 1}]}}),
+        ]
+        monkeypatch.setattr(utils, "http_get", lambda *a, **kw: responses.pop(0))
+        monkeypatch.setattr(utils, "get_rate_limiter", lambda: RateLimiter(rate=0))
+
+        assert utils.request_to_wikidata.__wrapped__("SELECT 1") == [{"x": 1}]
+        assert responses == []
+        assert throttled.closed
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        def slow(value):
+            calls.append(value)
+            time.sleep(0.05)
+            return [value]
+
+        with RequestExecutor(max_workers=8, rate_limiter=RateLimiter(rate=0)) as ex:
+            results = ex.map(lambda _: flight.do("key", slow, 1), range(8))
+
+        assert calls == [1]
+        assert all(result is results[0] for result in results)
+        assert flight.stats() == {"executed": 1, "shared": 7, "in_flight": 0}
+
+    def test_exception_is_shared_and_forgotten(self):
+        flight = SingleFlight()
+        started = threading.Event()
+
+        def failing():
+            started.set()
+            time.sleep(0.05)
+            raise RuntimeError("endpoint is down")
+
+        waiter_errors = []
+
+        def waiter():
+            started.wait()
+            try:
+                flight.do("key", failing)
+            except RuntimeError as e:
+                waiter_errors.append(e)
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        with pytest.raises(RuntimeError):
+            flight.do("key", failing)
+        thread.join()
+
+        assert len(waiter_errors) == 1
+        assert flight.do("key", lambda: "retried") == "retried"
@@ -0,0 +1,79 @@
+import pytest
+
+from pywikidata.graph import CSRGraph
+from pywikidata.offline import OfflineIndex
+
+EDGES = [
+    ("Q950001", "P31", "Q950002"),
+    ("Q950002", "P279", "Q950003"),
+    ("Q950003", "P279", "Q950004"),
+    ("Q950005", "P17", "Q950001"),
+    ("Q950001", "P31", "Q950002"),
+]
+
+
+class TestCSRGraph:
+    def test_neighbours(self):
+        graph = CSRGraph.from_edges(EDGES)
+        assert graph.n_edges == 4
+        assert graph.neighbours("Q950001", direction="forward") == [("P31", "Q950002")]
+        assert graph.neighbours("Q950001", direction="backward") == [("P17", "Q950005")]
+        assert graph.degree("Q950001") == 2
+        assert graph.neighbours("Q0") == []
+
+    def test_k_hop(self):
+        graph = CSRGraph.from_edges(EDGES)
+        assert graph.k_hop(["Q950001"], 2, direction="forward") == {
+            "Q950001": 0,
+            "Q950002": 1,
+            "Q950003": 2,
+        }
+        assert graph.k_hop(["Q950001"], 1) == {
+            "Q950001": 0,
+            "Q950002": 1,
+            "Q950005": 1,
+        }
+        assert graph.k_hop(["Q950001"], 3, predicates=["P31", "P17"]) == {
+            "Q950001": 0,
+            "Q950002": 1,
+            "Q950005": 1,
+        }
+        with pytest.raises(ValueError):
+            graph.k_hop(["Q950001"], 1, direction="up")
+
+    def test_subgraph(self):
+        graph = CSRGraph.from_edges(EDGES)
+        assert graph.k_hop_subgraph(["Q950002"], 1, direction="forward") == [
+            ("Q950002", "P279", "Q950003")
+        ]
+        assert graph.subgraph(["Q950001", "Q950002", "Q950005"], ["P17"]) == [
+            ("Q950005", "P17", "Q950001")
+        ]
+
+    def test_save_load(self, tmp_path):
+        graph = CSRGraph.from_edges(EDGES)
+        graph.save(tmp_path / "graph")
+        loaded = CSRGraph.load(tmp_path / "graph")
+        assert loaded.k_hop(["Q950004"], 3) == graph.k_hop(["Q950004"], 3)
+        assert loaded.subgraph(graph.interner.ids()) == graph.subgraph(
+            graph.interner.ids()
+        )
+
+    def test_from_offline_index(self, tmp_path):
+        records = [
+            {"id": "Q950001", "claims": {"P31": [_statement("Q950002")]}},
+            {"id": "Q950002", "claims": {}},
+        ]
+        index = OfflineIndex.build_from_records(records, tmp_path / "index")
+        graph = CSRGraph.from_offline_index(index)
+        assert graph.neighbours("Q950002", direction="backward") == [("P31", "Q950001")]
+
+
+def _statement(target):
+    return {
+        "mainsnak": {
+            "snaktype": "value",
+            "datavalue": {"type": "wikibase-entityid", "value": {"id": target}},
+        },
+        "rank": "normal",
+    }
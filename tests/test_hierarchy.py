@@ -0,0 +1,134 @@
+import json
+
+from pywikidata import Entity, utils
+from pywikidata.hierarchy import ClassHierarchy
+from pywikidata.offline import OfflineIndex
+
+ENTITY_URI = "http://www.wikidata.org/entity/"
+
+# city -> human settlement -> geographic location, with a cycle at the top
+EDGES = [
+    ("Q996002", "Q996003"),
+    ("Q996003", "Q996004"),
+    ("Q996004", "Q996005"),
+    ("Q996005", "Q996004"),
+    ("Q996006", "Q996004"),
+]
+
+
+class TestClassHierarchy:
+    def test_ancestors_with_cycle(self, tmp_path):
+        hierarchy = ClassHierarchy.from_edges(EDGES)
+
+        assert hierarchy.ancestors("Q996002") == {
+            "Q996002",
+            "Q996003",
+            "Q996004",
+            "Q996005",
+        }
+        assert hierarchy.is_subclass("Q996005", "Q996004")
+        assert not hierarchy.is_subclass("Q996006", "Q996003")
+        assert hierarchy.ancestors("Q996099") == {"Q996099"}
+
+        hierarchy.save(tmp_path / "hierarchy")
+        loaded = ClassHierarchy.load(tmp_path / "hierarchy")
+        assert loaded.ancestors("Q996002") == hierarchy.ancestors("Q996002")
+
+    def test_cache_size(self, tmp_path):
+        records = [
+            {
+                "type": "item",
+                "id": class_id,
+                "claims": {
+                    "P279": [
+                        {
+                            "mainsnak": {
+                                "snaktype": "value",
+                                "property": "P279",
+                                "datavalue": {
+                                    "type": "wikibase-entityid",
+                                    "value": {"id": superclass_id},
+                                },
+                            },
+                            "rank": "normal",
+                        }
+                    ]
+                },
+            }
+            for class_id, superclass_id in EDGES[:2]
+        ]
+        dump = tmp_path / "dump.json"
+        dump.write_text("[\n" + ",\n".join(map(json.dumps, records)) + "\n]\n")
+        index = OfflineIndex.build_from_records(records, tmp_path / "index")
+
+        for hierarchy in (
+            ClassHierarchy.from_offline_index(index, cache_size=8),
+            ClassHierarchy.from_dump(dump, cache_size=8, processes=1),
+        ):
+            assert hierarchy.ancestors.cache_info().maxsize == 8
+            assert hierarchy.ancestors("Q996002") == {
+                "Q996002",
+                "Q996003",
+                "Q996004",
+            }
+
+    def test_entity_is_a_in_memory(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("type checks must not send requests")
+
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", fail)
+        entity = Entity("Q996001")
+        entity._instance_of = [Entity("Q996002"), Entity("Q996006")]
+        try:
+            Entity.configure_type_hierarchy(ClassHierarchy.from_edges(EDGES))
+            assert entity.is_a("Q996003")
+            assert entity.is_a(Entity("Q996005"))
+            assert not entity.is_a("Q5")
+            assert entity.type_closure() == {
+                "Q996002",
+                "Q996003",
+                "Q996004",
+                "Q996005",
+                "Q996006",
+            }
+        finally:
+            Entity.configure_type_hierarchy(None)
+
+
+class TestTypeClosureRequests:
+    @staticmethod
+    def _fake_request(queries, closures):
+        def fake_request_to_wikidata(query, sparql_endpoint=None):
+            queries.append(query)
+            for entity_id, classes in closures.items():
+                if f"wd:{entity_id} " in query:
+                    return [{"class": {"value": ENTITY_URI + c}} for c in classes]
+            return []
+
+        return fake_request_to_wikidata
+
+    def test_one_property_path_query(self, monkeypatch):
+        queries = []
+        fake = self._fake_request(queries, {"Q996101": ["Q996102", "Q996103"]})
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", fake)
+
+        entity = Entity("Q996101")
+        assert entity.type_closure() == {"Q996102", "Q996103"}
+        assert entity.is_a("Q996103")
+        assert len(queries) == 1
+        assert "wdt:P31/wdt:P279*" in queries[0]
+        assert entity._instance_of is None
+
+    def test_closures_cached_per_class(self, monkeypatch):
+        queries = []
+        fake = self._fake_request(queries, {"Q996202": ["Q996203"]})
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", fake)
+
+        entities = [Entity(f"Q99621{i}") for i in range(5)]
+        for entity in entities:
+            entity._instance_of = [Entity("Q996202")]
+
+        assert all(entity.is_a("Q996203") for entity in entities)
+        assert not any(entity.is_a("Q5") for entity in entities)
+        assert len(queries) == 1
+        assert "wdt:P279*" in queries[0]
@@ -0,0 +1,99 @@
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pywikidata
+from pywikidata import config, executor, logger, session
+from pywikidata.attributes import AttributesProjection
+from pywikidata.registry import EntityRegistry
+from pywikidata.cache import MemoryQueryCache, create_cache, get_cache, set_cache
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class TestImport:
+    def test_import_is_side_effect_free(self, tmp_path):
+        code = (
+            "import sys, pywikidata; "
+            "print(sorted(m for m in ('requests', 'asyncio') if m in sys.modules))"
+        )
+        completed = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=tmp_path,
+            env=dict(os.environ, PYTHONPATH=str(ROOT)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert completed.stdout.strip() == "[]"
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestConfigure:
+    def test_settings_are_used_on_first_use(self, tmp_path):
+        previous = get_cache()
+        endpoint, backend = config.SPARQL_ENDPOINT, config.CACHE_BACKEND
+        previous_log_file = logger._settings["filename"]
+        log_file = tmp_path / "pywikidata.json"
+        try:
+            pywikidata.configure(
+                sparql_endpoint="http://127.0.0.1:1/sparql",
+                cache_backend="memory",
+                log_file=str(log_file),
+                log_console=False,
+            )
+            assert isinstance(get_cache(), MemoryQueryCache)
+            assert config.SPARQL_ENDPOINT == "http://127.0.0.1:1/sparql"
+
+            logger.get_logger().warning({"msg": "configured"})
+            logger.configure_logging()
+            assert '"msg": "configured"' in log_file.read_text()
+        finally:
+            pywikidata.configure(
+                sparql_endpoint=endpoint,
+                cache_backend=backend,
+                log_file=previous_log_file,
+                log_console=True,
+                log_level=logging.WARNING,
+            )
+            set_cache(previous)
+
+    def test_settings_are_read_at_use_time(self, monkeypatch):
+        monkeypatch.setattr(config, "HTTP_TIMEOUT", 7.0)
+        monkeypatch.setattr(config, "CACHE_TTL", 60.0)
+        monkeypatch.setattr(config, "MAX_WORKERS", 3)
+        monkeypatch.setattr(config, "REQUESTS_PER_SECOND", 2.0)
+        monkeypatch.setattr(config, "ENTITY_REGISTRY_MODE", "weak")
+        monkeypatch.setattr(config, "ATTRIBUTES_LANGUAGES", ["en"])
+        timeouts = []
+
+        class FakeSession:
+            def get(self, url, timeout=None, **kwargs):
+                timeouts.append(timeout)
+
+        monkeypatch.setattr(session, "get_session", FakeSession)
+        session.http_get("http://127.0.0.1:1/")
+        assert timeouts == [7.0]
+        assert create_cache("memory").ttl == 60.0
+        with executor.RequestExecutor() as pool:
+            assert pool.max_workers == 3
+        assert executor.RateLimiter().rate == 2.0
+        assert executor.RateLimiter(None).rate is None
+        assert EntityRegistry().mode == "weak"
+        assert AttributesProjection().languages == {"en"}
+        assert AttributesProjection(languages=None).languages is None
+
+    def test_default_cache_path_is_user_cache_dir(self, tmp_path):
+        code = "from pywikidata import config; print(config.DEFAULT_CACHE_PATH)"
+        env = dict(os.environ, PYTHONPATH=str(ROOT), XDG_CACHE_HOME=str(tmp_path))
+        env.pop("PYWIKIDATA_CACHE_PATH", None)
+        completed = subprocess.run(
+            [sys.executable, "-c", code],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert completed.stdout.strip() == str(tmp_path / "pywikidata")
@@ -0,0 +1,78 @@
+import time
+
+from pywikidata import Entity, utils
+from pywikidata.labels import LabelIndex, set_label_index
+
+RECORDS = [
+    {
+        "id": "Q994001",
+        "labels": {"en": "Paris", "fr": "Paris"},
+        "aliases": {"en": ["City of Light"]},
+    },
+    {"id": "Q994002", "labels": {"en": "Paris Hilton"}, "aliases": {}},
+    {"id": "Q994003", "labels": {"en": "paris"}, "aliases": {"de": ["Paris"]}},
+    {"id": "Q994004", "labels": {"de": "Köln"}, "aliases": {"en": ["Cologne"]}},
+]
+
+
+def _index(tmp_path):
+    return LabelIndex.from_records(RECORDS, tmp_path / "labels")
+
+
+class TestLabelIndex:
+    def test_exact_and_casefolded(self, tmp_path):
+        index = _index(tmp_path)
+
+        assert sorted(index.lookup("Paris")) == ["Q994001", "Q994003"]
+        assert index.lookup("Paris", languages=["en"]) == ["Q994001"]
+        assert index.lookup("paris", languages=["en"], casefold=True) == [
+            "Q994001",
+            "Q994003",
+        ]
+        assert index.lookup("city of light") == []
+        assert index.lookup("city of light", casefold=True) == ["Q994001"]
+        assert index.lookup("City of Light", aliases=False) == []
+        assert index.lookup("KÖLN", casefold=True) == ["Q994004"]
+
+    def test_prefix_search(self, tmp_path):
+        index = _index(tmp_path)
+
+        assert index.search("par") == ["Q994001", "Q994003", "Q994002"]
+        assert index.search("par", limit=1) == ["Q994001"]
+        assert index.search("Paris ") == ["Q994002"]
+        assert index.search("köl", language="de") == ["Q994004"]
+        assert index.search("nowhere") == []
+
+    def test_backend_of_from_label_and_search(self, tmp_path, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("label index must answer without requests")
+
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", fail)
+        monkeypatch.setattr(utils._request_wd_search_results, "__wrapped__", fail)
+        set_label_index(_index(tmp_path))
+        try:
+            assert Entity.from_label("Paris") == [Entity("Q994001")]
+            assert Entity.from_labels(["Paris Hilton", "Cologne", "Paris"]) == [
+                [Entity("Q994002")],
+                [],
+                [Entity("Q994001")],
+            ]
+            assert utils.get_wd_search_results("cologne") == ["Q994004"]
+            assert utils.get_many_wd_search_results(["köln", "paris h"]) == [
+                [],
+                ["Q994002"],
+            ]
+        finally:
+            set_label_index(None)
+
+    def test_lookup_is_fast(self, tmp_path):
+        records = (
+            {"id": f"Q{995000000 + i}", "labels": {"en": f"label {i}"}, "aliases": {}}
+            for i in range(100_000)
+        )
+        index = LabelIndex.from_records(records, tmp_path / "large")
+
+        started_at = time.perf_counter()
+        for i in range(0, 100_000, 100):
+            assert index.lookup(f"label {i}") == [f"Q{995000000 + i}"]
+        assert (time.perf_counter() - started_at) / 1000 < 0.001
@@ -0,0 +1,92 @@
+import pytest
+
+from pywikidata import utils
+from pywikidata.cache import cached
+from pywikidata.executor import RateLimiter
+from pywikidata.metrics import Metrics, get_metrics, query_template, set_metrics
+
+from .fakes import FakeResponse
+
+
+class TestMetrics:
+    def test_query_template(self):
+        assert query_template('SELECT ?x { wd:Q1 rdfs:label "A"@en } LIMIT 10') == (
+            query_template('SELECT ?x {\n  wd:Q42 rdfs:label "B b"@fr } LIMIT 5')
+        )
+        assert query_template("VALUES ?e { wd:Q1 wd:Q2 }") == query_template(
+            "VALUES ?e { wd:Q3 }"
+        )
+        assert query_template("SELECT ?x { wd:Q1 wdt:P31 ?x }") != query_template(
+            "SELECT ?x { wd:Q1 wdt:P279 ?x }"
+        )
+
+    def test_histogram_and_prometheus(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.observe_request("label", 0.05, 200, 100)
+        metrics.observe_request("label", 0.5, 200, 50)
+        metrics.observe_request("label", 5.0, 500)
+        metrics.observe_rows("label", 3)
+
+        template = metrics.snapshot()["templates"]["label"]
+        assert template["latency_buckets"] == [[0.1, 1], [1.0, 2], [float("inf"), 3]]
+        assert template["statuses"] == {200: 2, 500: 1}
+        assert template["bytes_received"] == 150
+
+        text = metrics.to_prometheus()
+        assert 'pywikidata_request_seconds_bucket{template="label",le="+Inf"} 3' in text
+        assert 'pywikidata_responses_total{template="label",status="500"} 1' in text
+        assert 'pywikidata_rows_total{template="label"} 3' in text
+
+
+@pytest.fixture
+def metrics():
+    previous = get_metrics()
+    metrics = Metrics()
+    set_metrics(metrics)
+    yield metrics
+    set_metrics(previous)
+
+
+class TestInstrumentation:
+    def test_throttled_requests_are_counted(self, monkeypatch, metrics):
+        query = "SELECT ?x { wd:Q994001 ?p ?x }"
+        events = []
+        metrics.add_hook(events.append)
+        responses = [
+            FakeResponse(429, headers={"retry-after": "0"}, content=b"{}"),
+            FakeResponse(
+                200,
+                payload={"results": {"bindings": [{"x": 1}, {"x": 2}]}},
+                content=b"{}",
+            ),
+        ]
+        monkeypatch.setattr(utils, "http_get", lambda *a, **kw: responses.pop(0))
+        monkeypatch.setattr(utils, "get_rate_limiter", lambda: RateLimiter(rate=0))
+        utils.request_to_wikidata.__wrapped__(query)
+
+        template = metrics.snapshot()["templates"][query_template(query)]
+        assert metrics.throttled == 1
+        assert template["statuses"] == {429: 1, 200: 1}
+        assert template["rows"] == 2
+        assert template["bytes_received"] == 4
+        assert [e["event"] for e in events] == [
+            "request",
+            "throttle",
+            "request",
+            "rows",
+        ]
+
+    def test_cache_hits_and_misses(self, metrics):
+        calls = []
+
+        @cached("test-metrics")
+        def square(x):
+            calls.append(x)
+            return x * x
+
+        assert [square(2), square(2), square(3)] == [4, 4, 9]
+
+        assert calls == [2, 3]
+        assert metrics.snapshot()["cache"]["test-metrics"] == {"hit": 1, "miss": 2}
+        assert metrics.cache_hit_ratio("test-metrics") == 1 / 3
+        assert metrics.cache_hit_ratio("other") is None
@@ -0,0 +1,105 @@
+import bz2
+import json
+
+import pytest
+
+from pywikidata import Entity
+from pywikidata.offline import OfflineIndex, decode_id, encode_id, set_offline_index
+
+
+def _statement(prop_id, target, rank="normal"):
+    return {
+        "mainsnak": {
+            "snaktype": "value",
+            "property": prop_id,
+            "datavalue": {
+                "type": "wikibase-entityid",
+                "value": {"entity-type": "item", "id": target},
+            },
+        },
+        "rank": rank,
+        "references": [{"snaks": {}}],
+    }
+
+
+def _entity(idx, label, claims):
+    return {
+        "type": "item",
+        "id": idx,
+        "labels": {
+            "en": {"language": "en", "value": label},
+            "de": {"language": "de", "value": label + " (de)"},
+        },
+        "descriptions": {"en": {"language": "en", "value": f"{label} description"}},
+        "aliases": {"en": [{"language": "en", "value": label.lower()}]},
+        "claims": {
+            prop_id: [_statement(prop_id, *target) for target in targets]
+            for prop_id, targets in claims.items()
+        },
+        "sitelinks": {"enwiki": {"title": label}},
+    }
+
+
+@pytest.fixture
+def offline_index(tmp_path):
+    entities = [
+        _entity("Q940002", "City", {"P31": [("Q940003",)]}),
+        _entity("Q940003", "Class", {"P279": [("Q940002",)]}),
+        _entity(
+            "Q940001",
+            "Capital",
+            {
+                "P31": [("Q940002",), ("Q940003", "deprecated")],
+                "P17": [("Q940003",)],
+            },
+        ),
+    ]
+    dump = tmp_path / "dump.json.bz2"
+    with bz2.open(dump, "wt") as f:
+        f.write("[\n")
+        f.write(",\n".join(json.dumps(e) for e in entities))
+        f.write("\n]\n")
+
+    index = OfflineIndex.build(dump, tmp_path / "index")
+    set_offline_index(index)
+    yield index
+    set_offline_index(None)
+
+
+class TestOfflineIndex:
+    def test_id_encoding(self):
+        assert decode_id(encode_id("Q90")) == "Q90"
+        assert decode_id(encode_id("P31")) == "P31"
+
+    def test_records(self, offline_index):
+        assert len(offline_index) == 3
+        assert "Q940001" in offline_index
+        record = offline_index.record("Q940001")
+        assert record["labels"] == {"en": "Capital"}
+        assert "references" not in record["claims"]["P31"][0]
+        assert offline_index.backward_edges("Q940003") == [
+            ("P31", "Q940002"),
+            ("P17", "Q940001"),
+        ]
+
+    def test_entity_served_offline(self, offline_index):
+        entity = Entity("Q940001")
+        assert entity.label == "Capital"
+        assert entity.description == ["Capital description"]
+        assert entity.aliases == ["capital"]
+        assert entity.instance_of == [Entity("Q940002")]
+        assert Entity("Q940003").subclass_of == [Entity("Q940002")]
+        assert entity.forward_one_hop_neighbours == [
+            (Entity("P31"), Entity("Q940002")),
+        ]
+        assert Entity("Q940002").backward_one_hop_neighbours == [
+            (Entity("P31"), Entity("Q940001")),
+        ]
+        assert entity.attributes["labels"]["en"]["value"] == "Capital"
+
+    def test_type_closure_offline(self, offline_index):
+        entity = Entity("Q940001")
+        assert entity.type_closure() == {"Q940002"}
+        assert entity.is_a("Q940002")
+        assert not entity.is_a("Q940003")
+        assert Entity("Q940003").superclasses() == {"Q940003", "Q940002"}
@@ -0,0 +1,128 @@
+import json
+import re
+
+import pytest
+
+from pywikidata import Entity, utils
+
+
+def _rows(n):
+    return [{"n": {"value": str(i).zfill(2)}} for i in range(n)]
+
+
+class TestIterBindings:
+    def test_incremental_parsing(self):
+        body = json.dumps(
+            {"head": {"vars": ["bindings"]}, "results": {"bindings": _rows(50)}}
+        )
+        chunks = [body[i : i + 7] for i in range(0, len(body), 7)]
+        assert list(utils.iter_bindings(chunks)) == _rows(50)
+
+    def test_truncated_response(self):
+        body = json.dumps({"results": {"bindings": _rows(5)}})
+        with pytest.raises(ValueError):
+            list(utils.iter_bindings([body[:-20]]))
+
+
+class TestPagedRequests:
+    @pytest.fixture
+    def fake_endpoint(self, monkeypatch):
+        sent = []
+        rows = _rows(25)
+
+        def fake_request(query, sparql_endpoint=None):
+            sent.append(query)
+            if len(sent) == 3:
+                raise TimeoutError
+            after = re.search(r'FILTER\(STR\(\?n\) > "(\d+)"\)', query)
+            offset = re.search(r"OFFSET (\d+)", query)
+            page = [r for r in rows if after is None or r["n"]["value"] > after[1]]
+            if offset is not None:
+                page = page[int(offset[1]) :]
+            return page[: int(re.search(r"LIMIT (\d+)", query)[1])]
+
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", fake_request)
+        return sent
+
+    def test_pages_are_cached_and_resumed(self, fake_endpoint):
+        with pytest.raises(TimeoutError):
+            list(utils.iter_request_to_wikidata("SELECT ?n {}", page_size=10))
+        assert len(fake_endpoint) == 3
+
+        assert list(utils.iter_request_to_wikidata("SELECT ?n {}", page_size=10)) == (
+            _rows(25)
+        )
+        assert len(fake_endpoint) == 4
+        assert "ORDER BY" not in fake_endpoint[0]
+
+    def test_max_rows(self, fake_endpoint):
+        bindings = utils.iter_request_to_wikidata(
+            "SELECT ?n {}", page_size=10, max_rows=5, order_by=["?n"]
+        )
+        assert list(bindings) == _rows(5)
+        assert fake_endpoint == ["SELECT ?n {}\nORDER BY STR(?n)\nLIMIT 10"]
+
+    def test_keyset_pages_are_cached_and_resumed(self, fake_endpoint):
+        query = "SELECT ?n { ?n ?p ?o }"
+        with pytest.raises(TimeoutError):
+            list(utils.iter_request_to_wikidata(query, page_size=10, order_by=["?n"]))
+
+        bindings = utils.iter_request_to_wikidata(query, page_size=10, order_by=["?n"])
+        assert list(bindings) == _rows(25)
+        assert len(fake_endpoint) == 4
+        assert "OFFSET" not in fake_endpoint[1]
+        assert fake_endpoint[1] == (
+            'SELECT ?n { ?n ?p ?o\n    FILTER(STR(?n) > "09")\n}'
+            "\nORDER BY STR(?n)\nLIMIT 10"
+        )
+
+    def test_keyset_filter_of_several_variables(self):
+        query = utils.keyset_query("SELECT ?a ?b {}", 5, ["?a", "?b"], ['x"', "y"])
+        assert 'STR(?a) > "x\\"" || (STR(?a) = "x\\"" && (STR(?b) > "y"))' in query
+        assert query.endswith("ORDER BY STR(?a) STR(?b)\nLIMIT 5")
+
+    def test_neighbours_by_property(self, monkeypatch):
+        entity_uri = "http://www.wikidata.org/entity/"
+        property_uri = "http://www.wikidata.org/prop/direct/"
+        sent = []
+
+        def fake_request(query, sparql_endpoint=None):
+            sent.append(query)
+            if "SELECT DISTINCT ?property WHERE" in query:
+                return [{"property": {"value": property_uri + "P31"}}]
+            return [
+                {
+                    "property": {"value": property_uri + "P31"},
+                    "object": {"value": entity_uri + f"Q97000{i}"},
+                    "instance_of": {"value": entity_uri + "Q5"},
+                }
+                for i in range(3)
+            ]
+
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", fake_request)
+        rows = Entity("Q970000").iter_one_hop_neighbours(
+            "backward", page_size=100, max_rows=2, by_property=True
+        )
+        assert list(rows) == [("P31", "Q970000", "Q5"), ("P31", "Q970001", "Q5")]
+        assert len(sent) == 2
+        assert f"VALUES ?property {{ <{property_uri}P31> }}" in sent[1]
+
+    def test_neighbours_property_is_paged(self, monkeypatch):
+        entity_uri = "http://www.wikidata.org/entity/"
+        sent = []
+
+        def fake_request(query, sparql_endpoint=None):
+            sent.append(query)
+            return [
+                {
+                    "property": {"value": "http://www.wikidata.org/prop/direct/P31"},
+                    "object": {"value": entity_uri + "Q970101"},
+                    "instance_of": {"value": entity_uri + "Q5"},
+                }
+            ]
+
+        monkeypatch.setattr(utils.request_to_wikidata, "__wrapped__", fake_request)
+        neighbours = Entity("Q970100").backward_one_hop_neighbours
+        assert neighbours == [(Entity("P31"), Entity("Q970101"))]
+        assert len(sent) == 1
+        assert "ORDER BY STR(?property) STR(?object) STR(?instance_of)" in sent[0]
@@ -0,0 +1,116 @@
+import re
+
+from pywikidata import utils
+from pywikidata.graph import CSRGraph
+from pywikidata.paths import PathFinder, paths_between
+
+ENTITY_URI = "http://www.wikidata.org/entity/"
+PROPERTY_URI = "http://www.wikidata.org/prop/direct/"
+
+# question entity Q997001, answer Q997005
+EDGES = [
+    ("Q997001", "P17", "Q997002"),
+    ("Q997002", "P36", "Q997005"),
+    ("Q997005", "P1376", "Q997002"),
+    ("Q997001", "P131", "Q997003"),
+    ("Q997003", "P131", "Q997004"),
+    ("Q997004", "P150", "Q997005"),
+    ("Q997006", "P31", "Q997001"),
+]
+
+
+class TestPathFinder:
+    def test_ranked_paths_from_graph(self):
+        finder = PathFinder(CSRGraph.from_edges(EDGES))
+        paths = finder.find("Q997001", "Q997005", max_hops=3)
+
+        assert paths == [
+            (("Q997001", "P17", "Q997002"), ("Q997002", "P36", "Q997005")),
+            (("Q997001", "P17", "Q997002"), ("Q997005", "P1376", "Q997002")),
+            (
+                ("Q997001", "P131", "Q997003"),
+                ("Q997003", "P131", "Q997004"),
+                ("Q997004", "P150", "Q997005"),
+            ),
+        ]
+        assert [(s["side"], s["hop"]) for s in finder.stats] == [
+            ("forward", 1),
+            ("backward", 1),
+            ("backward", 2),
+        ]
+        assert paths_between(
+            "Q997001",
+            "Q997005",
+            max_hops=2,
+            predicates=["P17", "P36"],
+            graph=CSRGraph.from_edges(EDGES),
+        ) == [(("Q997001", "P17", "Q997002"), ("Q997002", "P36", "Q997005"))]
+
+    def test_hubs_are_not_expanded(self):
+        graph = CSRGraph.from_edges(EDGES)
+        assert PathFinder(graph, max_degree=2).find("Q997001", "Q997005") == []
+
+    @staticmethod
+    def _fake_request(queries, edges):
+        def fake_request_to_wikidata(query, sparql_endpoint=None):
+            queries.append(query)
+            forward = "?object ?property ?entity" not in query
+            limit = re.search(r"LIMIT (\d+)", query)
+            bindings = []
+            for values in re.findall(r"VALUES \?entity \{ (.*) \}", query):
+                nodes = values.split()
+                rows = [
+                    {
+                        "entity": {"value": ENTITY_URI + node},
+                        "property": {"value": PROPERTY_URI + prop_id},
+                        "object": {"value": ENTITY_URI + neighbour},
+                    }
+                    for subject, prop_id, obj in edges
+                    for node, neighbour in [
+                        (subject, obj) if forward else (obj, subject)
+                    ]
+                    if f"wd:{node}" in nodes
+                ]
+                bindings.extend(rows[: int(limit[1])] if limit else rows)
+            return bindings
+
+        return fake_request_to_wikidata
+
+    def test_batched_requests(self, monkeypatch):
+        queries = []
+        monkeypatch.setattr(
+            utils.request_to_wikidata, "__wrapped__", self._fake_request(queries, EDGES)
+        )
+        paths = paths_between("Q997001", "Q997005", max_hops=3, chunk_size=2)
+
+        assert len(paths) == 3
+        # forward and backward query per chunk of 2 frontier nodes, frontiers
+        # of 1, 1 and 2 nodes, then degrees of not expanded midpoint Q997003
+        assert len(queries) == 8
+        assert all("LIMIT 1001" in query for query in queries)
+
+    def test_hub_edges_are_limited(self, monkeypatch):
+        hub_edges = [(f"Q99{i:04}", "P31", "Q997005") for i in range(10)]
+        queries = []
+        monkeypatch.setattr(
+            utils.request_to_wikidata,
+            "__wrapped__",
+            self._fake_request(queries, EDGES + hub_edges),
+        )
+        finder = PathFinder(max_degree=3)
+        assert finder.find("Q997005", "Q997001", max_hops=1) == []
+        assert finder.stats[0]["hubs"] == 1
+        # 4 of 12 backward edges and the forward P1376 edge
+        assert finder._degrees["Q997005"] == 5
+
+    def test_unexpanded_midpoints_are_ranked_by_degree(self):
+        # both midpoints meet the frontiers without being expanded
+        edges = [
+            ("Q997001", "P17", "Q997002"),
+            ("Q997002", "P36", "Q997005"),
+            ("Q997001", "P131", "Q997003"),
+            ("Q997003", "P150", "Q997005"),
+        ] + [(f"Q99{i:04}", "P31", "Q997002") for i in range(5)]
+        finder = PathFinder(CSRGraph.from_edges(edges))
+        paths = finder.find("Q997001", "Q997005", max_hops=2)
+        assert [path[0][2] for path in paths] == ["Q997003", "Q997002"]
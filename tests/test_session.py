@@ -0,0 +1,19 @@
+from pywikidata import utils
+from pywikidata.session import create_session, get_session, set_session
+
+
+class TestSession:
+    def test_injected_session_retries_5xx(self, local_server):
+        server = local_server(errors=[503])
+        server.sparql["SELECT 1"] = [{"ok": True}]
+        previous = get_session()
+        set_session(create_session(pool_size=2, retries=2, backoff_factor=0))
+        try:
+            bindings = utils.request_to_wikidata.__wrapped__(
+                "SELECT 1", server.sparql_endpoint
+            )
+        finally:
+            set_session(previous)
+
+        assert bindings == [{"ok": True}]
+        assert server.requests == 2
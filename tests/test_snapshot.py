@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from pywikidata import Entity
+from pywikidata.snapshot import EntitySnapshot, get_snapshot, set_snapshot
+
+FIELDS = ("label", "description", "image", "aliases", "instance_of", "subclass_of")
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    yield tmp_path / "snapshot"
+    set_snapshot(None)
+
+
+def _populate():
+    paris, france, city, country = (
+        Entity(idx) for idx in ("Q993001", "Q993002", "Q993003", "Q993004")
+    )
+    paris._label = "Paris"
+    paris._aliases = ["City of Light"]
+    paris._instance_of = [city]
+    paris._forward_one_hop_neighbours = [(Entity("P17"), france)]
+    france._label = "France"
+    france._instance_of = [country]
+    return paris, france
+
+
+def _forget(*entities):
+    for entity in entities:
+        for field in FIELDS + Entity._NEIGHBOUR_FIELDS:
+            setattr(entity, f"_{field}", None)
+
+
+class TestEntitySnapshot:
+    def test_export_only_resolved(self, snapshot_path):
+        paris, france = _populate()
+        unresolved = Entity("Q993009")
+        snapshot = Entity.export_snapshot(snapshot_path, [paris, france, unresolved])
+
+        assert len(snapshot) == 2
+        assert "Q993009" not in snapshot
+        assert snapshot.record("Q993001") == {
+            "id": "Q993001",
+            "label": "Paris",
+            "aliases": ["City of Light"],
+            "instance_of": ["Q993003"],
+            "forward_one_hop_neighbours": [["P17", "Q993002"]],
+        }
+
+    def test_restore_on_access(self, snapshot_path):
+        paris, france = _populate()
+        Entity.export_snapshot(snapshot_path, [paris, france])
+        _forget(paris, france)
+
+        set_snapshot(snapshot_path)
+        assert isinstance(get_snapshot(), EntitySnapshot)
+        assert paris.label == "Paris"
+        assert paris.instance_of == [Entity("Q993003")]
+        assert paris.forward_one_hop_neighbours == [(Entity("P17"), Entity("Q993002"))]
+        assert paris.forward_one_hop_neighbours[0][1].label == "France"
+        # fields which are not in the snapshot are left to requests
+        assert paris._description is None
+
+    def test_reexport_keeps_open_snapshot(self, snapshot_path):
+        paris, france = _populate()
+        old = Entity.export_snapshot(snapshot_path, [paris])
+        new = Entity.export_snapshot(snapshot_path, [paris, france])
+
+        assert old.get("Q993001", "label") == "Paris"
+        assert len(new) == 2
+        # the symlink, the new and the previous version
+        assert snapshot_path.is_symlink()
+        assert len(os.listdir(snapshot_path.parent)) == 3
+
+    def test_leftovers_are_removed(self, snapshot_path):
+        paris, france = _populate()
+        # a plain directory of the older layout and an interrupted build
+        Entity.export_snapshot(snapshot_path.with_name("plain"), [paris])
+        os.replace(os.path.realpath(snapshot_path.with_name("plain")), snapshot_path)
+        os.unlink(snapshot_path.with_name("plain"))
+        (snapshot_path.parent / "snapshot.tmp123").mkdir()
+        (snapshot_path.parent / "snapshot.json").write_text("{}")
+
+        for _ in range(3):
+            snapshot = Entity.export_snapshot(snapshot_path, [paris, france])
+        assert len(snapshot) == 2
+        names = sorted(os.listdir(snapshot_path.parent))
+        assert [n for n in names if not n.startswith("snapshot.v")] == [
+            "snapshot",
+            "snapshot.json",
+        ]
+        assert len(names) == 4
+
+    def test_worker_process(self, snapshot_path):
+        paris, france = _populate()
+        Entity.export_snapshot(snapshot_path, [paris, france])
+
+        code = (
+            "from pywikidata import Entity;"
+            "print(Entity('Q993001').label, Entity('Q993002').instance_of[0].idx)"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYWIKIDATA_SNAPSHOT=str(snapshot_path), PYTHONPATH=root)
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            env=env,
+            cwd=snapshot_path.parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        assert output.split() == ["Paris", "Q993004"]